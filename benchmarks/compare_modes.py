@@ -0,0 +1,107 @@
+"""
+Compare the execution modes of the orchestrator
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import requests
+from fake_gateway import GatewayBehaviour, start_fake_gateway
+from load_driver import add_load_arguments, check_thresholds, format_summary, run_load
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Script et variables d'environnement de chaque mode comparé
+MODES = {
+    "threaded": ("saga_orchestrator.py", {}),
+    "async": ("saga_asgi.py", {}),
+    "bulk": ("saga_orchestrator.py", {"STOCK_BULK_UPDATE_ENABLED": "true"}),
+    "async-bulk": ("saga_asgi.py", {"STOCK_BULK_UPDATE_ENABLED": "true"}),
+    "parallel": ("saga_orchestrator.py", {"SAGA_PARALLEL_STOCK_AND_PAYMENT": "true"}),
+}
+
+def start_orchestrator(script, env_overrides, port, gateway_port, extra_env):
+    """ Start the orchestrator in a subprocess and wait until /health-check answers """
+    journal_path = os.path.join(tempfile.mkdtemp(prefix="saga-bench-"), "saga_journal.db")
+    env = {
+        **os.environ,
+        "FLASK_PORT": str(port),
+        "API_GATEWAY_URL": f"http://127.0.0.1:{gateway_port}",
+        "SAGA_JOURNAL_PATH": journal_path,
+        **env_overrides,
+        **extra_env,
+    }
+    process = subprocess.Popen([sys.executable, script], cwd=SRC_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{script} s'est arrêté au démarrage (code {process.returncode})")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health-check", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{script} ne répond pas sur le port {port}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare les modes de l'orchestrateur (threads, async, mise à jour groupée du stock...) contre un faux API Gateway")
+    parser.add_argument("--modes", default="threaded,async,bulk", help=f"modes à comparer, parmi : {', '.join(MODES)}")
+    parser.add_argument("--port", type=int, default=5199, help="port de l'orchestrateur pendant le test")
+    parser.add_argument("--gateway-port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "exponential", "lognormal"], default="fixed")
+    parser.add_argument("--stock-error-rate", type=float, default=0.0)
+    parser.add_argument("--payment-error-rate", type=float, default=0.0)
+    parser.add_argument("--env", action="append", default=[], metavar="NOM=VALEUR", help="variable d'environnement de l'orchestrateur (répétable)")
+    parser.add_argument("--warmup", type=int, default=20, help="requêtes envoyées avant chaque mesure")
+    add_load_arguments(parser)
+    args = parser.parse_args()
+
+    extra_env = dict(pair.split("=", 1) for pair in args.env)
+    behaviour = GatewayBehaviour(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        error_rates={"stock": args.stock_error_rate, "payment": args.payment_error_rate},
+        bulk_enabled=True,
+        seed=args.seed,
+    )
+    gateway = start_fake_gateway(args.gateway_port, behaviour)
+    url = f"http://127.0.0.1:{args.port}/saga/order"
+
+    summaries = {}
+    has_failed = False
+    try:
+        for mode in args.modes.split(","):
+            script, env_overrides = MODES[mode]
+            process = start_orchestrator(script, env_overrides, args.port, args.gateway_port, extra_env)
+            try:
+                # Préchauffage : connexions du pool, imports paresseux, JIT des regex...
+                run_load(url, concurrency=min(args.concurrency, args.warmup or 1), total_requests=args.warmup, items_range=args.items)
+                result = run_load(url, args.concurrency, args.requests, args.duration, args.items, args.products, args.users, seed=args.seed)
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+
+            summaries[mode] = result.get_summary()
+            failures = check_thresholds(summaries[mode], args.max_p95_ms, args.max_p99_ms, args.min_throughput, args.max_error_rate)
+            for failure in failures:
+                print(f"{mode} : seuil dépassé : {failure}", file=sys.stderr)
+            has_failed = has_failed or bool(failures)
+            if not args.json:
+                print(format_summary(mode, summaries[mode]), flush=True)
+    finally:
+        gateway.shutdown()
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    sys.exit(1 if has_failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Fake API Gateway for benchmarks
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class GatewayBehaviour:
+    """ Latency and error rates of the fake services, and counters of the requests received """
+
+    def __init__(self, latency_ms=5.0, latency_distribution="fixed", error_rates=None, error_status=500, bulk_enabled=False, seed=None,
+                 catalog_size=1000, stock_quantity=1000000):
+        """ Constructor method """
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        # Taux d'erreur par service : order, stock, payment, catalog (lectures des produits et des stocks)
+        self.error_rates = {"order": 0.0, "stock": 0.0, "payment": 0.0, "catalog": 0.0, **(error_rates or {})}
+        self.error_status = error_status
+        self.bulk_enabled = bulk_enabled
+        # Les produits 1 à catalog_size existent, chacun avec stock_quantity unités en stock
+        self.catalog_size = catalog_size
+        self.stock_quantity = stock_quantity
+        self.random = random.Random(seed)
+        self.ids = itertools.count(1)
+        self.counts = {}
+        # Réservations de stock : id -> (articles, échéance time.time(), confirmée)
+        self.reservations = {}
+        self.lock = threading.Lock()
+
+    def get_latency(self):
+        """ Return a latency in seconds drawn from the configured distribution (mean latency_ms) """
+        with self.lock:
+            if self.latency_distribution == "uniform":
+                latency_ms = self.random.uniform(0, 2 * self.latency_ms)
+            elif self.latency_distribution == "exponential":
+                latency_ms = self.random.expovariate(1 / self.latency_ms) if self.latency_ms > 0 else 0
+            elif self.latency_distribution == "lognormal":
+                # Queue longue : la plupart des réponses sont rapides, quelques-unes très lentes (sigma = 1, même moyenne)
+                latency_ms = self.random.lognormvariate(0, 1) * self.latency_ms / 1.6487 if self.latency_ms > 0 else 0
+            else:
+                latency_ms = self.latency_ms
+        return latency_ms / 1000
+
+    def is_error(self, service):
+        """ Return True if this request to the service must fail """
+        with self.lock:
+            return self.random.random() < self.error_rates[service]
+
+    def count(self, route, status):
+        """ Count a response """
+        with self.lock:
+            key = f"{route} {status}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def next_id(self):
+        """ Return a new order or payment id """
+        with self.lock:
+            return next(self.ids)
+
+    def reserve(self, reservation_id, items, ttl_seconds):
+        """
+        Hold stock_quantity units of each product, minus the reservations not expired yet. Return (status, body).
+        Sending the same reservation again does not hold the stock twice.
+        """
+        now = time.time()
+        with self.lock:
+            if reservation_id in self.reservations:
+                return 201, {"reservation_id": reservation_id, "expires_at": self.reservations[reservation_id][1]}
+            held = {}
+            for reserved_items, expires_at, is_committed in self.reservations.values():
+                if is_committed or expires_at > now:
+                    for item in reserved_items:
+                        held[item["product_id"]] = held.get(item["product_id"], 0) + item["quantity"]
+            for item in items:
+                if item["quantity"] > self.stock_quantity - held.get(item["product_id"], 0):
+                    return 409, {"error": f"Stock insuffisant pour le produit {item['product_id']}"}
+            self.reservations[reservation_id] = (items, now + ttl_seconds, False)
+            return 201, {"reservation_id": reservation_id, "expires_at": now + ttl_seconds}
+
+    def commit(self, reservation_id):
+        """ Commit a reservation that has not expired. Return (status, body). """
+        with self.lock:
+            reservation = self.reservations.get(reservation_id)
+            if reservation is None:
+                return 404, {"error": f"Réservation {reservation_id} introuvable"}
+            items, expires_at, is_committed = reservation
+            if not is_committed and expires_at <= time.time():
+                return 410, {"error": f"Réservation {reservation_id} expirée"}
+            self.reservations[reservation_id] = (items, expires_at, True)
+            return 200, {"reservation_id": reservation_id, "status": "committed"}
+
+def create_handler_class(behaviour):
+    """ Build the request handler class serving the store and payment routes with the given behaviour """
+
+    class FakeGatewayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # En-têtes et corps sont envoyés séparément : sans TCP_NODELAY, l'ACK retardé ajoute ~40 ms par requête keep-alive
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/__stats":
+                with behaviour.lock:
+                    counts = dict(behaviour.counts)
+                return self._send("GET /__stats", 200, counts)
+            if re.fullmatch(r"/store-api/orders/\d+", self.path):
+                return self._respond("GET /store-api/orders/<id>", "order", 200, {"order_id": int(self.path.rsplit("/", 1)[1]), "total_amount": 100.0})
+            if re.fullmatch(r"/store-api/(products|stocks)/\d+", self.path):
+                return self._respond_catalog()
+            self._send("GET ?", 404, {"error": "Not found"})
+
+        def do_POST(self):
+            body = self._read_json()
+            if self.path == "/store-api/orders":
+                items = body.get("items", []) if isinstance(body, dict) else []
+                return self._respond("POST /store-api/orders", "order", 201, {"order_id": behaviour.next_id(), "total_amount": 10.0 * len(items)})
+            if self.path == "/store-api/stocks":
+                return self._respond("POST /store-api/stocks", "stock", 201, {"status": "ok"})
+            if self.path == "/store-api/stocks/bulk" and behaviour.bulk_enabled:
+                return self._respond("POST /store-api/stocks/bulk", "stock", 200, {"status": "ok"})
+            if self.path == "/payments-api/payments":
+                return self._respond("POST /payments-api/payments", "payment", 201, {"payment_id": behaviour.next_id()})
+            if self.path == "/store-api/stock-reservations" and isinstance(body, dict):
+                return self._respond_reservation("POST /store-api/stock-reservations", behaviour.reserve,
+                                                 body.get("reservation_id"), body.get("items", []), body.get("ttl_seconds", 60))
+            if re.fullmatch(r"/store-api/stock-reservations/[\w-]+/commit", self.path):
+                return self._respond_reservation("POST /store-api/stock-reservations/<id>/commit", behaviour.commit, self.path.split("/")[3])
+            self._send(f"POST {self.path}", 404, {"error": "Not found"})
+
+        def do_DELETE(self):
+            if re.fullmatch(r"/store-api/orders/\d+", self.path):
+                return self._respond("DELETE /store-api/orders/<id>", "order", 200, {"status": "deleted"})
+            if re.fullmatch(r"/payments-api/payments/\d+", self.path):
+                return self._respond("DELETE /payments-api/payments/<id>", "payment", 200, {"status": "deleted"})
+            self._send("DELETE ?", 404, {"error": "Not found"})
+
+        def _respond(self, route, service, status, data):
+            time.sleep(behaviour.get_latency())
+            # Les compensations (DELETE, remise en stock) échouent au même taux que les autres requêtes du service
+            if behaviour.is_error(service):
+                return self._send(route, behaviour.error_status, {"error": "Erreur simulée"})
+            self._send(route, status, data)
+
+        def _respond_reservation(self, route, operation, *args):
+            time.sleep(behaviour.get_latency())
+            if behaviour.is_error("stock"):
+                return self._send(route, behaviour.error_status, {"error": "Erreur simulée"})
+            self._send(route, *operation(*args))
+
+        def _respond_catalog(self):
+            resource, product_id = self.path.split("/")[2:4]
+            route = f"GET /store-api/{resource}/<id>"
+            if int(product_id) > behaviour.catalog_size:
+                time.sleep(behaviour.get_latency())
+                return self._send(route, 404, {"error": f"Produit {product_id} introuvable"})
+            if resource == "products":
+                return self._respond(route, "catalog", 200, {"product_id": int(product_id), "name": f"Produit {product_id}", "price": 10.0})
+            self._respond(route, "catalog", 200, {"product_id": int(product_id), "quantity": behaviour.stock_quantity})
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                return json.loads(self.rfile.read(length) or b"null")
+            except ValueError:
+                return None
+
+        def _send(self, route, status, data):
+            behaviour.count(route, status)
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return FakeGatewayHandler
+
+class FakeGatewayServer(ThreadingHTTPServer):
+    """ Threaded HTTP server with a backlog large enough for the benchmark concurrency """
+    daemon_threads = True
+    request_queue_size = 1024
+
+def start_fake_gateway(port, behaviour):
+    """ Start the fake gateway in a background thread and return the server (call shutdown() to stop it) """
+    server = FakeGatewayServer(("127.0.0.1", port), create_handler_class(behaviour))
+    threading.Thread(target=server.serve_forever, name="fake-gateway", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux API Gateway (store-api, payments-api) pour les tests de charge de l'orchestrateur")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="latence moyenne de chaque réponse (ms)")
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "exponential", "lognormal"], default="fixed")
+    parser.add_argument("--order-error-rate", type=float, default=0.0)
+    parser.add_argument("--stock-error-rate", type=float, default=0.0)
+    parser.add_argument("--payment-error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500, help="code HTTP des erreurs simulées (502/503/504 déclenchent les nouvelles tentatives)")
+    parser.add_argument("--bulk", action="store_true", help="exposer POST /store-api/stocks/bulk")
+    parser.add_argument("--catalog-size", type=int, default=1000, help="les produits 1 à N existent (GET /store-api/products/<id>, /store-api/stocks/<id>)")
+    parser.add_argument("--stock-quantity", type=int, default=1000000, help="stock de chaque produit")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    behaviour = GatewayBehaviour(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        error_rates={"order": args.order_error_rate, "stock": args.stock_error_rate, "payment": args.payment_error_rate},
+        error_status=args.error_status,
+        bulk_enabled=args.bulk,
+        seed=args.seed,
+        catalog_size=args.catalog_size,
+        stock_quantity=args.stock_quantity,
+    )
+    server = FakeGatewayServer(("127.0.0.1", args.port), create_handler_class(behaviour))
+    print(f"Faux API Gateway sur http://127.0.0.1:{args.port} (compteurs : GET /__stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Load driver for /saga/order
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+def parse_range(value):
+    """ Parse "N" or "MIN-MAX" into (min, max) """
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+def percentile(sorted_values, ratio):
+    """ Return the nearest-rank percentile of an already sorted list (0 if empty) """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(ratio * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class LoadResult:
+    """ Latencies and outcomes of the requests sent by the load driver """
+
+    def __init__(self):
+        """ Constructor method """
+        self.latencies = []
+        self.status_counts = {}
+        self.compensated_count = 0
+        self.transport_errors = 0
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, latency, status, body):
+        """ Record one response (status None for a transport error) """
+        with self.lock:
+            self.latencies.append(latency)
+            key = str(status) if status is not None else "error"
+            self.status_counts[key] = self.status_counts.get(key, 0) + 1
+            if status is None:
+                self.transport_errors += 1
+            elif isinstance(body, dict) and body.get("compensations"):
+                self.compensated_count += 1
+
+    def get_summary(self):
+        """ Return throughput, latency percentiles (ms), error and compensation rates """
+        latencies = sorted(self.latencies)
+        total = len(latencies)
+        ok_count = self.status_counts.get("200", 0) + self.status_counts.get("202", 0)
+        return {
+            "requests": total,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "throughput_rps": round(total / self.elapsed, 2) if self.elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 0.50) * 1000, 2),
+                "p95": round(percentile(latencies, 0.95) * 1000, 2),
+                "p99": round(percentile(latencies, 0.99) * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            },
+            "status_counts": dict(sorted(self.status_counts.items())),
+            "error_rate": round((total - ok_count) / total, 4) if total else 0.0,
+            "compensation_rate": round(self.compensated_count / total, 4) if total else 0.0,
+        }
+
+def build_payload(rng, items_range, product_count, user_count):
+    """ Return a random order: number of lines drawn uniformly in items_range """
+    item_count = rng.randint(*items_range)
+    return {
+        "user_id": rng.randint(1, user_count),
+        "items": [{"product_id": rng.randint(1, product_count), "quantity": rng.randint(1, 3)} for _ in range(item_count)],
+    }
+
+def run_load(url, concurrency=10, total_requests=None, duration=None, items_range=(1, 5), product_count=100, user_count=50, timeout=30.0, seed=None):
+    """
+    Send POST requests to url from `concurrency` threads, each waiting for its response before sending the next one (closed loop).
+    Stop after total_requests requests or after duration seconds. Return a LoadResult.
+    """
+    if total_requests is None and duration is None:
+        total_requests = concurrency * 20
+    result = LoadResult()
+    sent = iter(range(total_requests)) if total_requests is not None else None
+    sent_lock = threading.Lock()
+    start = time.perf_counter()
+    end = start + duration if duration is not None else None
+
+    def worker(worker_index):
+        rng = random.Random(None if seed is None else seed + worker_index)
+        session = requests.Session()
+        while True:
+            if end is not None and time.perf_counter() >= end:
+                return
+            if sent is not None:
+                with sent_lock:
+                    if next(sent, None) is None:
+                        return
+            payload = build_payload(rng, items_range, product_count, user_count)
+            request_start = time.perf_counter()
+            try:
+                response = session.post(url, json=payload, timeout=timeout)
+                body = response.json() if response.content else None
+                result.record(time.perf_counter() - request_start, response.status_code, body)
+            except (requests.RequestException, ValueError):
+                result.record(time.perf_counter() - request_start, None, None)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, i) for i in range(concurrency)]:
+            future.result()
+    result.elapsed = time.perf_counter() - start
+    return result
+
+def check_thresholds(summary, max_p95_ms=None, max_p99_ms=None, min_throughput=None, max_error_rate=None):
+    """ Return the list of thresholds exceeded by the summary (empty if none) """
+    failures = []
+    if max_p95_ms is not None and summary["latency_ms"]["p95"] > max_p95_ms:
+        failures.append(f"p95 {summary['latency_ms']['p95']} ms > {max_p95_ms} ms")
+    if max_p99_ms is not None and summary["latency_ms"]["p99"] > max_p99_ms:
+        failures.append(f"p99 {summary['latency_ms']['p99']} ms > {max_p99_ms} ms")
+    if min_throughput is not None and summary["throughput_rps"] < min_throughput:
+        failures.append(f"débit {summary['throughput_rps']} req/s < {min_throughput} req/s")
+    if max_error_rate is not None and summary["error_rate"] > max_error_rate:
+        failures.append(f"taux d'erreur {summary['error_rate']} > {max_error_rate}")
+    return failures
+
+def format_summary(name, summary):
+    """ Return a one-line, human readable summary """
+    latency = summary["latency_ms"]
+    return (f"{name:<12} {summary['requests']:>7} req  {summary['throughput_rps']:>9.1f} req/s  "
+            f"p50 {latency['p50']:>8.1f} ms  p95 {latency['p95']:>8.1f} ms  p99 {latency['p99']:>8.1f} ms  "
+            f"erreurs {summary['error_rate']:>6.1%}  compensations {summary['compensation_rate']:>6.1%}")
+
+def add_load_arguments(parser):
+    """ Add the load options shared by the benchmark scripts """
+    parser.add_argument("--concurrency", type=int, default=10, help="nombre de clients simultanés")
+    parser.add_argument("--requests", type=int, default=None, help="nombre total de requêtes (défaut : 20 par client)")
+    parser.add_argument("--duration", type=float, default=None, help="durée du test (secondes), à la place de --requests")
+    parser.add_argument("--items", type=parse_range, default=(1, 5), help="nombre d'articles par commande : N ou MIN-MAX")
+    parser.add_argument("--products", type=int, default=100, help="nombre de produits différents")
+    parser.add_argument("--users", type=int, default=50, help="nombre d'utilisateurs différents")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="échec (code 1) si le p95 dépasse cette valeur")
+    parser.add_argument("--max-p99-ms", type=float, default=None)
+    parser.add_argument("--min-throughput", type=float, default=None, help="échec (code 1) si le débit est plus bas (req/s)")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="échec (code 1) si la proportion de réponses non 2xx est plus haute")
+    parser.add_argument("--json", action="store_true", help="afficher le résultat en JSON")
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de POST /saga/order")
+    parser.add_argument("--url", default="http://127.0.0.1:5123/saga/order")
+    add_load_arguments(parser)
+    args = parser.parse_args()
+
+    result = run_load(args.url, args.concurrency, args.requests, args.duration, args.items, args.products, args.users, seed=args.seed)
+    summary = result.get_summary()
+    print(json.dumps(summary, indent=2) if args.json else format_summary("saga", summary))
+
+    failures = check_thresholds(summary, args.max_p95_ms, args.max_p99_ms, args.min_throughput, args.max_error_rate)
+    for failure in failures:
+        print(f"Seuil dépassé : {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Startup time of the orchestrator
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import requests
+from fake_gateway import GatewayBehaviour, start_fake_gateway
+from load_driver import build_payload
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Module et script de chaque application mesurée
+APPS = {
+    "wsgi": ("saga_orchestrator", "saga_orchestrator.py"),
+    "asgi": ("saga_asgi", "saga_asgi.py"),
+}
+
+# Exécuté dans un nouvel interpréteur : temps d'import du module, puis de create_app (ms)
+IMPORT_SCRIPT = """
+import importlib, json, sys, time
+start = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+module.create_app()
+created = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "create_app_ms": (created - imported) * 1000}))
+"""
+
+def build_env(port, gateway_port, extra_env):
+    """ Return the environment of the orchestrator: fake gateway, own journal, and the variables given with --env """
+    journal_path = os.path.join(tempfile.mkdtemp(prefix="saga-startup-"), "saga_journal.db")
+    return {
+        **os.environ,
+        "FLASK_PORT": str(port),
+        "API_GATEWAY_URL": f"http://127.0.0.1:{gateway_port}",
+        "SAGA_JOURNAL_PATH": journal_path,
+        **extra_env,
+    }
+
+def measure_import(module, env):
+    """ Import the module and call create_app in a new interpreter, return their durations (ms) """
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT, module], cwd=SRC_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure_startup(script, env, port, payload, warm_requests, timeout=30.0):
+    """ Start the orchestrator, then return the time until /health-check answers, the latency of the first saga and the median latency of the next ones (ms) """
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, script], cwd=SRC_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"{script} s'est arrêté au démarrage (code {process.returncode})")
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"{script} ne répond pas sur le port {port}")
+            try:
+                if requests.get(f"{base_url}/health-check", timeout=1).ok:
+                    break
+            except requests.RequestException:
+                time.sleep(0.01)
+        ready_ms = (time.perf_counter() - start) * 1000
+
+        latencies = []
+        for _ in range(1 + warm_requests):
+            request_start = time.perf_counter()
+            response = requests.post(f"{base_url}/saga/order", json=payload, timeout=timeout)
+            latencies.append((time.perf_counter() - request_start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"POST /saga/order a répondu {response.status_code} : {response.text[:200]}")
+        return {
+            "ready_ms": ready_ms,
+            "first_request_ms": latencies[0],
+            "warm_request_ms": statistics.median(latencies[1:]) if warm_requests else None,
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def summarize(runs):
+    """ Return the median of each measure over the runs (ms) """
+    return {name: round(statistics.median(run[name] for run in runs), 1) if runs[0][name] is not None else None for name in runs[0]}
+
+def check_startup_thresholds(summary, max_import_ms=None, max_ready_ms=None, max_first_request_ms=None):
+    """ Return the list of thresholds exceeded by the summary (empty if none) """
+    failures = []
+    if max_import_ms is not None and summary["import_ms"] > max_import_ms:
+        failures.append(f"import {summary['import_ms']} ms > {max_import_ms} ms")
+    if max_ready_ms is not None and summary["ready_ms"] > max_ready_ms:
+        failures.append(f"démarrage {summary['ready_ms']} ms > {max_ready_ms} ms")
+    if max_first_request_ms is not None and summary["first_request_ms"] > max_first_request_ms:
+        failures.append(f"première saga {summary['first_request_ms']} ms > {max_first_request_ms} ms")
+    return failures
+
+def format_startup_summary(name, summary):
+    """ Return a one-line, human readable summary """
+    warm = f"{summary['warm_request_ms']:>7.1f} ms" if summary["warm_request_ms"] is not None else "      -"
+    return (f"{name:<6} import {summary['import_ms']:>7.1f} ms  create_app {summary['create_app_ms']:>6.1f} ms  "
+            f"prêt {summary['ready_ms']:>7.1f} ms  première saga {summary['first_request_ms']:>7.1f} ms  sagas suivantes {warm}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure le temps d'import, de démarrage et de la première saga de l'orchestrateur contre un faux API Gateway")
+    parser.add_argument("--apps", default="wsgi,asgi", help=f"applications à mesurer, parmi : {', '.join(APPS)}")
+    parser.add_argument("--runs", type=int, default=5, help="nombre de démarrages par application (le résultat est la médiane)")
+    parser.add_argument("--warm-requests", type=int, default=10, help="sagas envoyées après la première, pour comparer")
+    parser.add_argument("--port", type=int, default=5199, help="port de l'orchestrateur pendant le test")
+    parser.add_argument("--gateway-port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--items", type=int, default=3, help="nombre d'articles de chaque commande")
+    parser.add_argument("--env", action="append", default=[], metavar="NOM=VALEUR", help="variable d'environnement de l'orchestrateur (répétable)")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="échec (code 1) si l'import du module dépasse cette valeur")
+    parser.add_argument("--max-ready-ms", type=float, default=None, help="échec (code 1) si /health-check répond plus tard")
+    parser.add_argument("--max-first-request-ms", type=float, default=None, help="échec (code 1) si la première saga est plus lente")
+    parser.add_argument("--json", action="store_true", help="afficher le résultat en JSON")
+    args = parser.parse_args()
+
+    extra_env = dict(pair.split("=", 1) for pair in args.env)
+    gateway = start_fake_gateway(args.gateway_port, GatewayBehaviour(latency_ms=args.latency_ms))
+    # Toujours la même commande : seules les valeurs de démarrage varient d'une mesure à l'autre
+    payload = build_payload(random.Random(0), (args.items, args.items), 100, 50)
+
+    summaries = {}
+    has_failed = False
+    try:
+        for name in args.apps.split(","):
+            module, script = APPS[name]
+            runs = []
+            for _ in range(args.runs):
+                env = build_env(args.port, args.gateway_port, extra_env)
+                runs.append({**measure_import(module, env), **measure_startup(script, env, args.port, payload, args.warm_requests)})
+
+            summaries[name] = summarize(runs)
+            failures = check_startup_thresholds(summaries[name], args.max_import_ms, args.max_ready_ms, args.max_first_request_ms)
+            for failure in failures:
+                print(f"{name} : seuil dépassé : {failure}", file=sys.stderr)
+            has_failed = has_failed or bool(failures)
+            if not args.json:
+                print(format_startup_summary(name, summaries[name]), flush=True)
+    finally:
+        gateway.shutdown()
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    sys.exit(1 if has_failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Admission control
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+import config
+import saga_metrics
+from logger import Logger
+
+# Réponses indiquant qu'un service en aval est surchargé (en plus des requêtes sans réponse)
+OVERLOAD_STATUS_CODES = (429, 502, 503, 504)
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limit of sagas running at the same time, adapted to the latency of the downstream requests (AIMD):
+    every fast request raises the limit by 1/limit (about +1 per round of requests), while it is being used;
+    a request slower than latency_target, without response or answered 429/502/503/504 multiplies it by decrease_factor,
+    at most once per latency_target, so that one burst of slow responses counts as one signal.
+    """
+
+    def __init__(self, initial_limit, min_limit, max_limit, latency_target, decrease_factor):
+        """ Constructor method """
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.in_flight_count = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        saga_metrics.set_admission_limit(int(self.limit))
+
+    def try_acquire(self):
+        """ Take a slot without waiting. Return False if the limit is reached. """
+        with self._lock:
+            if self.in_flight_count >= int(self.limit):
+                return False
+            self.in_flight_count += 1
+            return True
+
+    def release(self):
+        """ Give back a slot taken by try_acquire """
+        with self._lock:
+            self.in_flight_count -= 1
+
+    def record_request(self, duration, status_code):
+        """ Adapt the limit to one downstream request (status_code is None if no response was received) """
+        is_overloaded = status_code is None or status_code in OVERLOAD_STATUS_CODES or duration > self.latency_target
+        with self._lock:
+            previous_limit = int(self.limit)
+            if is_overloaded:
+                now = time.monotonic()
+                if now - self._last_decrease < self.latency_target:
+                    return
+                self._last_decrease = now
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            elif self.in_flight_count * 2 >= self.limit:
+                # Augmenter une limite que le trafic n'atteint pas ne prouverait rien sur la capacité des services
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            new_limit = int(self.limit)
+        if new_limit != previous_limit:
+            saga_metrics.set_admission_limit(new_limit)
+
+class UserRateLimiter:
+    """ Token bucket per user_id: rate tokens per second, at most burst tokens. The least recently seen users are forgotten beyond max_entries. """
+
+    def __init__(self, rate, burst, max_entries):
+        """ Constructor method """
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        # user_id -> (jetons, instant de la dernière mise à jour), du moins au plus récemment vu
+        self.buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_take(self, user_id):
+        """ Take one token from the bucket of the user. Return 0 if it was taken, otherwise the seconds until the next token. """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self.buckets.get(user_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / self.rate
+            self.buckets[user_id] = (tokens, now)
+            self.buckets.move_to_end(user_id)
+            if len(self.buckets) > self.max_entries:
+                self.buckets.popitem(last=False)
+            return retry_after
+
+class AdmissionController:
+    """
+    Admission of POST /saga/order, checked before any work: a client that sends too many orders gets 429, and the process gets 503
+    when the sagas in progress reach the adaptive concurrency limit. Both answers are immediate and carry a Retry-After header,
+    so that the requests are not queued until they time out. Each order of a batch (POST /saga/orders:batch) is admitted the same way.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        """ Constructor method """
+        self.logger = Logger.get_instance('AdmissionController')
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter(
+            config.ADMISSION_INITIAL_LIMIT, config.ADMISSION_MIN_LIMIT, config.ADMISSION_MAX_LIMIT,
+            config.ADMISSION_LATENCY_TARGET_MS / 1000, config.ADMISSION_DECREASE_FACTOR,
+        )
+        self.user_rate_limiter = UserRateLimiter(
+            config.ADMISSION_USER_RATE_PER_SECOND, config.ADMISSION_USER_BURST, config.ADMISSION_USER_MAX_ENTRIES
+        ) if config.ADMISSION_USER_RATE_PER_SECOND > 0 else None
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide controller, creating it on first use. None if ADMISSION_CONTROL_ENABLED is false. """
+        if not config.ADMISSION_CONTROL_ENABLED:
+            return None
+        if AdmissionController._instance is None:
+            with AdmissionController._instance_lock:
+                if AdmissionController._instance is None:
+                    AdmissionController._instance = AdmissionController()
+        return AdmissionController._instance
+
+    def try_admit(self, user_id):
+        """
+        Admit an order of user_id. Return None if it is admitted (call release once the saga is done), otherwise the response (body, status code, headers).
+        A user_id that is not an integer is not rate limited: the request is rejected later by normalize_order_request.
+        """
+        # 1.0 est accepté comme 1 par normalize_order_request : même compteur, sinon un float contournerait la limite
+        if isinstance(user_id, float) and user_id.is_integer():
+            user_id = int(user_id)
+        if self.user_rate_limiter is not None and isinstance(user_id, int) and not isinstance(user_id, bool):
+            retry_after = self.user_rate_limiter.try_take(user_id)
+            if retry_after > 0:
+                saga_metrics.record_admission_rejected("rate_limited")
+                return {'error': "Trop de commandes pour cet utilisateur, veuillez réessayer plus tard"}, 429, {'Retry-After': str(math.ceil(retry_after))}
+
+        if not self.concurrency_limiter.try_acquire():
+            saga_metrics.record_admission_rejected("overloaded")
+            self.logger.debug("Commande refusée : %s sagas en cours (limite %s)", self.concurrency_limiter.in_flight_count, int(self.concurrency_limiter.limit))
+            return {'error': "Le service est surchargé, veuillez réessayer plus tard"}, 503, {'Retry-After': str(config.ADMISSION_RETRY_AFTER_SECONDS)}
+        return None
+
+    def release(self):
+        """ Release the slot of an admitted order """
+        self.concurrency_limiter.release()
+
+def record_downstream_request(duration, status_code):
+    """ Report the latency of a downstream request to the concurrency limiter, if admission control is enabled """
+    if config.ADMISSION_CONTROL_ENABLED:
+        AdmissionController.get_instance().concurrency_limiter.record_request(duration, status_code)
@@ -0,0 +1,134 @@
+"""
+Shared asynchronous HTTP client
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+import time
+import httpx
+import config
+from opentelemetry import trace
+from admission_control import record_downstream_request
+from circuit_breaker import CircuitBreakerRegistry, CircuitOpenError, is_failure_status
+from http_response import is_request_sent
+from retry_policy import RetryPolicy, get_remaining_time, parse_retry_after, record_retries, record_retry
+from saga_profiler import get_current_profile
+
+class AsyncHttpClient:
+    """ Non-blocking HTTP client shared by the async saga handlers. Uses the same pool limits and timeouts as HttpClient. """
+
+    _instance = None
+
+    def __init__(self, pool_maxsize=None, pool_timeout=None, connect_timeout=None, read_timeout=None):
+        """ Constructor method """
+        pool_maxsize = config.HTTP_POOL_MAXSIZE if pool_maxsize is None else pool_maxsize
+        self.timeout = httpx.Timeout(
+            read_timeout if read_timeout is not None else config.HTTP_READ_TIMEOUT,
+            connect=connect_timeout if connect_timeout is not None else config.HTTP_CONNECT_TIMEOUT,
+            pool=pool_timeout if pool_timeout is not None else config.HTTP_POOL_TIMEOUT,
+        )
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize),
+            timeout=self.timeout,
+        )
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide client, creating it on first use. Must be called from the event loop that will use it. """
+        if AsyncHttpClient._instance is None or AsyncHttpClient._instance.client.is_closed:
+            AsyncHttpClient._instance = AsyncHttpClient()
+        return AsyncHttpClient._instance
+
+    @staticmethod
+    async def close_instance():
+        """ Close the process-wide client and its pooled connections """
+        if AsyncHttpClient._instance is not None:
+            await AsyncHttpClient._instance.client.aclose()
+            AsyncHttpClient._instance = None
+
+    async def request(self, method, url, retry_policy=None, deadline=None, fail_fast=True, **kwargs):
+        """ Send a request through the pooled client. Same retry_policy, deadline and circuit breaker handling as HttpClient.request, with non-blocking waits. """
+        breaker = CircuitBreakerRegistry.get_instance().get_breaker(url)
+        if retry_policy is None and deadline is None:
+            return await self._send(breaker, fail_fast, method, url, **kwargs)
+
+        retry_policy = retry_policy or RetryPolicy(max_attempts=1)
+        attempt = 1
+        backoff_total = 0.0
+        while True:
+            remaining = get_remaining_time(deadline)
+            timeout = self.timeout if remaining is None else httpx.Timeout(
+                min(self.timeout.read, remaining),
+                connect=min(self.timeout.connect, remaining),
+                pool=min(self.timeout.pool, remaining),
+            )
+            try:
+                response = await self._send(breaker, fail_fast, method, url, timeout=timeout, **kwargs)
+            except httpx.TransportError as e:
+                # Une connexion qui n'a pas pu s'établir n'a rien envoyé : on peut la retenter même pour un POST
+                delay = retry_policy.get_retry_delay(attempt, method, kwargs.get("headers"), is_sent=is_request_sent(e), deadline=deadline)
+                if delay is None:
+                    record_retries(attempt, backoff_total)
+                    raise
+                record_retry(attempt, delay, type(e).__name__)
+            else:
+                delay = retry_policy.get_retry_delay(attempt, method, kwargs.get("headers"), status_code=response.status_code,
+                                                     retry_after=parse_retry_after(response.headers.get("Retry-After")), deadline=deadline)
+                if delay is None:
+                    record_retries(attempt, backoff_total)
+                    return response
+                record_retry(attempt, delay, str(response.status_code))
+                await response.aclose()
+            await asyncio.sleep(delay)
+            backoff_total += delay
+            attempt += 1
+
+    async def _send(self, breaker, fail_fast, method, url, **kwargs):
+        """ Send one request, after checking the circuit breaker of the service, and report the outcome to it """
+        if breaker is None:
+            return await self._request(method, url, **kwargs)
+        if fail_fast and not breaker.allow_request():
+            trace.get_current_span().set_attribute("circuit_breaker_rejected", breaker.name)
+            raise CircuitOpenError(f"Disjoncteur {breaker.name} ouvert : requête {method} {url} non envoyée")
+        try:
+            response = await self._request(method, url, **kwargs)
+        except httpx.TransportError:
+            breaker.record_failure()
+            raise
+        if is_failure_status(response.status_code):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def _request(self, method, url, **kwargs):
+        """
+        Send the request. Its duration is reported to the admission controller (ADMISSION_CONTROL_ENABLED),
+        and to the timeline of the saga if it is profiled (SAGA_PROFILER_ENABLED).
+        """
+        profile = get_current_profile()
+        if profile is None and not config.ADMISSION_CONTROL_ENABLED:
+            return await self.client.request(method, url, **kwargs)
+        start = time.perf_counter()
+        status_code = None
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            duration = time.perf_counter() - start
+            record_downstream_request(duration, status_code)
+            if profile is not None:
+                profile.record_request(method, url, start, duration, status_code)
+
+    async def get(self, url, **kwargs):
+        """ Send a GET request """
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        """ Send a POST request """
+        return await self.request("POST", url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        """ Send a DELETE request """
+        return await self.request("DELETE", url, **kwargs)
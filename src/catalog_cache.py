@@ -0,0 +1,207 @@
+"""
+Catalog cache
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import config
+import saga_metrics
+from opentelemetry import context, trace
+from http_client import HttpClient
+from logger import Logger
+
+# Réponse 404 de store-api : le produit (ou son stock) n'existe pas
+MISSING = object()
+
+class ReadThroughCache:
+    """
+    TTL and LRU cache filled by calling loader(key) on a miss. Concurrent misses on the same key share one call.
+    A loader returning None (ex. store-api unavailable) is not cached. MISSING is cached for negative_ttl_seconds.
+    """
+
+    def __init__(self, name, loader, ttl_seconds, negative_ttl_seconds, max_entries):
+        """ Constructor method """
+        self.name = name
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        # Clé -> (valeur, lue à, expire à), du moins au plus récemment utilisé
+        self.entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get_cached(self, key):
+        """ Return the value if it is cached and fresh, or None (without loading it) """
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[2] <= now:
+                return None
+            self.entries.move_to_end(key)
+        saga_metrics.record_cache_lookup(self.name, True, now - entry[1])
+        return entry[0]
+
+    def get(self, key):
+        """ Return the cached value, or load it. Return None if it cannot be loaded. """
+        now = time.monotonic()
+        # Lecture et enregistrement du chargement sous le même verrou : un chargement qui se termine entre les deux ne serait pas vu, et la clé serait lue deux fois
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] > now:
+                self.entries.move_to_end(key)
+            else:
+                entry = None
+                future = self._loading.get(key)
+                is_loader = future is None
+                if is_loader:
+                    future = self._loading[key] = Future()
+        if entry is not None:
+            saga_metrics.record_cache_lookup(self.name, True, now - entry[1])
+            return entry[0]
+        saga_metrics.record_cache_lookup(self.name, False)
+        if not is_loader:
+            return future.result()
+
+        value = None
+        try:
+            value = self.loader(key)
+        finally:
+            now = time.monotonic()
+            with self._lock:
+                del self._loading[key]
+                if value is not None:
+                    ttl = self.negative_ttl_seconds if value is MISSING else self.ttl_seconds
+                    self.entries[key] = (value, now, now + ttl)
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            future.set_result(value)
+        return value
+
+    def invalidate(self, key):
+        """ Remove a key from the cache """
+        with self._lock:
+            self.entries.pop(key, None)
+
+class CatalogCache:
+    """
+    Products and stock snapshots read from store-api, cached to validate orders before the saga creates them.
+    Unknown products and quantities above the cached stock are rejected; when store-api cannot answer, the order is not rejected.
+    A stock snapshot can be up to CATALOG_STOCK_TTL_SECONDS old: the saga still fails (and compensates) if the stock ran out in the meantime.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, http_client=None):
+        """ Constructor method """
+        self.http_client = http_client or HttpClient.get_instance()
+        self.logger = Logger.get_instance('CatalogCache')
+        self.timeout = (min(config.HTTP_CONNECT_TIMEOUT, config.CATALOG_TIMEOUT_SECONDS), config.CATALOG_TIMEOUT_SECONDS)
+        self.products = ReadThroughCache("product", self._load_product, config.CATALOG_PRODUCT_TTL_SECONDS,
+                                         config.CATALOG_NEGATIVE_TTL_SECONDS, config.CATALOG_MAX_ENTRIES)
+        self.stocks = ReadThroughCache("stock", self._load_stock, config.CATALOG_STOCK_TTL_SECONDS,
+                                       config.CATALOG_NEGATIVE_TTL_SECONDS, config.CATALOG_MAX_ENTRIES)
+        self.executor = ThreadPoolExecutor(max_workers=config.CATALOG_FETCH_CONCURRENCY, thread_name_prefix="catalog-cache")
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide cache, creating it on first use """
+        if CatalogCache._instance is None:
+            with CatalogCache._instance_lock:
+                if CatalogCache._instance is None:
+                    CatalogCache._instance = CatalogCache()
+        return CatalogCache._instance
+
+    def _fetch(self, path):
+        """ GET a store-api resource. Return its JSON body, MISSING on 404, or None if store-api did not answer. """
+        url = config.API_GATEWAY_URL + path
+        try:
+            response = self.http_client.get(url, timeout=self.timeout)
+        except Exception as e:
+            self.logger.warning("Lecture de %s impossible : %s", url, e)
+            return None
+        if response.status_code == 404:
+            return MISSING
+        if not response.ok:
+            self.logger.warning("Lecture de %s impossible : erreur %s", url, response.status_code)
+            return None
+        try:
+            return response.json() or {}
+        except ValueError:
+            return {}
+
+    def _load_product(self, product_id):
+        return self._fetch(config.CATALOG_PRODUCT_PATH.format(product_id=product_id))
+
+    def _load_stock(self, product_id):
+        data = self._fetch(config.CATALOG_STOCK_PATH.format(product_id=product_id))
+        if data is None or data is MISSING:
+            return data
+        quantity = data.get("quantity", data.get("stock")) if isinstance(data, dict) else None
+        # Réponse sans quantité exploitable : on ne vérifie pas le stock de ce produit
+        return quantity if isinstance(quantity, (int, float)) and not isinstance(quantity, bool) else MISSING
+
+    def _get_all(self, cache, keys):
+        """ Return {key: value} for all keys; the keys missing from the cache are loaded in parallel """
+        values = {key: cache.get_cached(key) for key in keys}
+        misses = [key for key, value in values.items() if value is None]
+        if len(misses) == 1:
+            values[misses[0]] = cache.get(misses[0])
+        elif misses:
+            # Les threads du pool ne partagent pas le contexte courant : on le transmet pour garder les spans imbriqués
+            parent_context = context.get_current()
+            futures = {key: self.executor.submit(self._get_in_context, cache, key, parent_context) for key in misses}
+            for key, future in futures.items():
+                values[key] = future.result()
+        return values
+
+    @staticmethod
+    def _get_in_context(cache, key, parent_context):
+        token = context.attach(parent_context)
+        try:
+            return cache.get(key)
+        finally:
+            context.detach(token)
+
+    def validate_order(self, items):
+        """
+        Check the items of an order (already validated by normalize_order_request) against the catalog.
+        Return the list of errors ({"product_id", "error", "reason"}), empty if the order may be created.
+        """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("validate_order") as span:
+            # Les lignes d'un même produit sont déjà fusionnées
+            deltas = items
+            products = self._get_all(self.products, [delta["product_id"] for delta in deltas])
+            errors = [
+                {"product_id": delta["product_id"], "error": f"Produit {delta['product_id']} inconnu", "reason": "unknown_product"}
+                for delta in deltas if products[delta["product_id"]] is MISSING
+            ]
+
+            if config.CATALOG_CHECK_STOCK:
+                known_deltas = [delta for delta in deltas if products[delta["product_id"]] is not MISSING]
+                stocks = self._get_all(self.stocks, [delta["product_id"] for delta in known_deltas])
+                for delta in known_deltas:
+                    stock = stocks[delta["product_id"]]
+                    if stock is not None and stock is not MISSING and delta["quantity"] > stock:
+                        errors.append({
+                            "product_id": delta["product_id"],
+                            "error": f"Stock insuffisant pour le produit {delta['product_id']} : {delta['quantity']} demandé(s), {stock} disponible(s)",
+                            "reason": "insufficient_stock",
+                        })
+            return self._reject(span, errors) if errors else errors
+
+    def _reject(self, span, errors):
+        """ Count the rejected order and describe it on the span """
+        reason = errors[0]["reason"]
+        saga_metrics.record_order_rejected(reason)
+        span.set_attribute("rejected", True)
+        span.set_attribute("rejection_reason", reason)
+        self.logger.debug("Commande refusée avant la saga : %s", errors)
+        return errors
@@ -0,0 +1,199 @@
+"""
+Circuit breakers
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+import config
+from logger import Logger
+
+def is_failure_status(status_code):
+    """ Return True if a response shows that the service is failing or overloaded (5xx, 429) """
+    return status_code >= 500 or status_code == 429
+
+class CircuitOpenError(Exception):
+    """ Raised instead of sending a request to a service whose circuit breaker is open """
+    pass
+
+class CircuitBreaker:
+    """
+    Circuit breaker of one downstream service, based on the error rate of its recent requests.
+    - CLOSED: requests are sent. If at least min_requests were sent in the last window_seconds and the failure rate reaches failure_rate_threshold, the breaker opens.
+    - OPEN: requests are rejected (CircuitOpenError) during open_seconds.
+    - HALF_OPEN: up to half_open_max_calls probe requests are sent. If they all succeed the breaker closes, at the first failure it opens again.
+    A failure is a connection error, a timeout or a 5xx/429 response (see is_failure_status).
+    """
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, name, window_seconds=None, min_requests=None, failure_rate_threshold=None, open_seconds=None, half_open_max_calls=None):
+        """ Constructor method """
+        self.name = name
+        self.window_seconds = config.CIRCUIT_BREAKER_WINDOW_SECONDS if window_seconds is None else window_seconds
+        self.min_requests = config.CIRCUIT_BREAKER_MIN_REQUESTS if min_requests is None else min_requests
+        self.failure_rate_threshold = config.CIRCUIT_BREAKER_FAILURE_RATE if failure_rate_threshold is None else failure_rate_threshold
+        self.open_seconds = config.CIRCUIT_BREAKER_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.half_open_max_calls = config.CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS if half_open_max_calls is None else half_open_max_calls
+        self.logger = Logger.get_instance('CircuitBreaker')
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected_count = 0
+        # Une case par seconde : [seconde, succès, échecs]
+        self._buckets = deque()
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        self._half_open_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """ Return True if a request can be sent now (in HALF_OPEN, it is counted as a probe) """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.open_seconds:
+                    self.rejected_count += 1
+                    return False
+                self._move_to_half_open(now)
+            if self.state == self.HALF_OPEN:
+                # Des sondes perdues (sans résultat) ne doivent pas bloquer le disjoncteur indéfiniment
+                if now - self._half_open_started_at >= self.open_seconds:
+                    self._move_to_half_open(now)
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self.rejected_count += 1
+                    return False
+                self._half_open_calls += 1
+            return True
+
+    def get_retry_after(self):
+        """ Return the seconds left before the breaker lets probe requests through (0 if it is not open) """
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+
+    def is_open(self):
+        """ Return True if requests are currently rejected """
+        return self.get_retry_after() > 0
+
+    def record_success(self):
+        """ Count a successful request """
+        with self._lock:
+            self._add_to_window(is_failure=False)
+            if self.state == self.HALF_OPEN:
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.half_open_max_calls:
+                    self.state = self.CLOSED
+                    self._buckets.clear()
+                    self.logger.info("Disjoncteur %s fermé : le service répond de nouveau", self.name)
+
+    def record_failure(self):
+        """ Count a failed request and open the breaker if needed """
+        with self._lock:
+            self._add_to_window(is_failure=True)
+            if self.state == self.HALF_OPEN:
+                self._open("échec d'une requête de sonde")
+            elif self.state == self.CLOSED:
+                successes, failures = self._get_window_counts()
+                total = successes + failures
+                if total >= self.min_requests and failures / total >= self.failure_rate_threshold:
+                    self._open(f"{failures}/{total} requêtes en échec dans les {self.window_seconds:g} dernières secondes")
+
+    def get_stats(self):
+        """ Return the state and the counters of the breaker """
+        with self._lock:
+            successes, failures = self._get_window_counts()
+            state = self.state
+            if state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                # Le passage à HALF_OPEN se fait à la prochaine requête
+                state = self.HALF_OPEN
+            return {
+                "state": state,
+                "window_successes": successes,
+                "window_failures": failures,
+                "failure_rate": round(failures / (successes + failures), 4) if successes + failures else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected_count,
+                "retry_after_seconds": round(max(0.0, self.open_seconds - (time.monotonic() - self.opened_at)), 3) if state == self.OPEN else 0.0,
+            }
+
+    def _open(self, reason):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self.logger.warning("Disjoncteur %s ouvert pour %g s : %s", self.name, self.open_seconds, reason)
+
+    def _move_to_half_open(self, now):
+        self.state = self.HALF_OPEN
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        self._half_open_started_at = now
+
+    def _add_to_window(self, is_failure):
+        second = int(time.monotonic())
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        self._buckets[-1][2 if is_failure else 1] += 1
+
+    def _get_window_counts(self):
+        oldest_second = int(time.monotonic()) - self.window_seconds
+        while self._buckets and self._buckets[0][0] <= oldest_second:
+            self._buckets.popleft()
+        return sum(bucket[1] for bucket in self._buckets), sum(bucket[2] for bucket in self._buckets)
+
+class CircuitBreakerRegistry:
+    """ Circuit breakers of the downstream services, keyed by route prefix on the API Gateway (CIRCUIT_BREAKER_ROUTES) """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, route_prefixes=None, critical_route_prefixes=None):
+        """ Constructor method """
+        route_prefixes = config.CIRCUIT_BREAKER_ROUTES if route_prefixes is None else route_prefixes
+        self.breakers = {prefix: CircuitBreaker(prefix) for prefix in route_prefixes}
+        self.critical_route_prefixes = [
+            prefix for prefix in (config.CIRCUIT_BREAKER_CRITICAL_ROUTES if critical_route_prefixes is None else critical_route_prefixes)
+            if prefix in self.breakers
+        ]
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide registry, creating it on first use """
+        if CircuitBreakerRegistry._instance is None:
+            with CircuitBreakerRegistry._instance_lock:
+                if CircuitBreakerRegistry._instance is None:
+                    CircuitBreakerRegistry._instance = CircuitBreakerRegistry()
+        return CircuitBreakerRegistry._instance
+
+    def get_breaker(self, url):
+        """ Return the breaker of the service called by this URL, or None if the route is not protected (or breakers are disabled) """
+        if not config.CIRCUIT_BREAKER_ENABLED:
+            return None
+        path = urlsplit(url).path
+        for prefix, breaker in self.breakers.items():
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return breaker
+        return None
+
+    def get_open_critical_breakers(self):
+        """ Return the critical breakers that are open. A saga started now would fail on these services, so it should be rejected. """
+        if not config.CIRCUIT_BREAKER_ENABLED:
+            return []
+        return [self.breakers[prefix] for prefix in self.critical_route_prefixes if self.breakers[prefix].is_open()]
+
+    def get_critical_retry_after(self):
+        """ Return the seconds left before every critical breaker lets requests through (0 if none is open) """
+        return max((breaker.get_retry_after() for breaker in self.get_open_critical_breakers()), default=0.0)
+
+    def get_stats(self):
+        """ Return the state of every breaker """
+        return {
+            "enabled": config.CIRCUIT_BREAKER_ENABLED,
+            "critical": self.critical_route_prefixes,
+            "breakers": {prefix: breaker.get_stats() for prefix, breaker in self.breakers.items()},
+        }
@@ -4,10 +4,275 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 
+import math
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()
 
-FLASK_PORT = int(os.getenv("FLASK_PORT"))
-API_GATEWAY_URL = os.getenv("API_GATEWAY_URL")
+class ConfigError(ValueError):
+    """ Raised at import when environment variables have invalid values. The message lists every invalid variable, not only the first one. """
+
+# Erreurs trouvées pendant la lecture des variables, levées ensemble à la fin du module
+_errors = []
+
+def _check_range(name, value, minimum, maximum):
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        _errors.append(f"{name}={value} : doit être compris entre {'-∞' if minimum is None else minimum} et {'+∞' if maximum is None else maximum}")
+    return value
+
+def _get_str(name, default, choices=None):
+    """ Return a text variable. With choices, the value (in lowercase) must be one of them. """
+    value = os.getenv(name, default)
+    if choices is not None:
+        value = value.lower()
+        if value not in choices:
+            _errors.append(f"{name}={value} : valeurs possibles : {', '.join(choices)}")
+            return default
+    return value
+
+def _get_int(name, default, minimum=None, maximum=None):
+    """ Return an integer variable, between minimum and maximum (included) """
+    raw_value = os.getenv(name, "").strip()
+    if not raw_value:
+        return default
+    try:
+        return _check_range(name, int(raw_value), minimum, maximum)
+    except ValueError:
+        _errors.append(f"{name}={raw_value} : un entier est attendu")
+        return default
+
+def _get_float(name, default, minimum=None, maximum=None):
+    """ Return a number variable, between minimum and maximum (included) """
+    raw_value = os.getenv(name, "").strip()
+    if not raw_value:
+        return default
+    try:
+        return _check_range(name, float(raw_value), minimum, maximum)
+    except ValueError:
+        _errors.append(f"{name}={raw_value} : un nombre est attendu")
+        return default
+
+def _get_bool(name, default):
+    """ Return a boolean variable: true or false """
+    raw_value = os.getenv(name, "").strip().lower()
+    if not raw_value:
+        return default
+    if raw_value not in ("true", "false"):
+        _errors.append(f"{name}={raw_value} : true ou false est attendu")
+        return default
+    return raw_value == "true"
+
+def _get_list(name, default):
+    """ Return a comma-separated variable as a list of non-empty values """
+    return [value.strip() for value in os.getenv(name, default).split(",") if value.strip()]
+
+def _get_int_list(name, default):
+    """ Return a comma-separated variable as a list of integers """
+    values = []
+    for value in _get_list(name, default):
+        try:
+            values.append(int(value))
+        except ValueError:
+            _errors.append(f"{name} : « {value} » n'est pas un entier")
+    return values
+
+def _get_int_mapping(name, default=""):
+    """ Return a variable of the form "name=integer,name=integer" as a dict """
+    mapping = {}
+    for pair in _get_list(name, default):
+        key, _, value = pair.partition("=")
+        try:
+            mapping[key.strip()] = int(value)
+        except ValueError:
+            _errors.append(f"{name} : « {pair} » doit être de la forme nom=entier")
+    return mapping
+
+FLASK_PORT: int = _get_int("FLASK_PORT", 5123, minimum=1, maximum=65535)
+API_GATEWAY_URL: str = _get_str("API_GATEWAY_URL", "http://api-gateway:8080")
+
+# Journalisation : niveau, format (text ou json), écriture par un thread dédié via une file bornée
+LOG_LEVEL: str = _get_str("LOG_LEVEL", "debug", choices=("debug", "info", "warning", "warn", "error", "critical")).upper()
+LOG_FORMAT: str = _get_str("LOG_FORMAT", "text", choices=("text", "json"))
+LOG_ASYNC: bool = _get_bool("LOG_ASYNC", True)
+LOG_QUEUE_MAX_SIZE: int = _get_int("LOG_QUEUE_MAX_SIZE", 10000, minimum=1)
+
+# Client HTTP partagé (pool de connexions keep-alive vers l'API Gateway)
+HTTP_POOL_CONNECTIONS: int = _get_int("HTTP_POOL_CONNECTIONS", 4, minimum=1)
+HTTP_POOL_MAXSIZE: int = _get_int("HTTP_POOL_MAXSIZE", 32, minimum=1)
+HTTP_POOL_BLOCK: bool = _get_bool("HTTP_POOL_BLOCK", True)
+HTTP_POOL_TIMEOUT: float = _get_float("HTTP_POOL_TIMEOUT", 5.0, minimum=0)
+HTTP_CONNECT_TIMEOUT: float = _get_float("HTTP_CONNECT_TIMEOUT", 3.05, minimum=0)
+HTTP_READ_TIMEOUT: float = _get_float("HTTP_READ_TIMEOUT", 10.0, minimum=0)
+
+# Nouvelles tentatives des appels HTTP des handlers (backoff exponentiel avec jitter)
+RETRY_MAX_ATTEMPTS: int = _get_int("RETRY_MAX_ATTEMPTS", 3, minimum=1)
+RETRY_BACKOFF_BASE_MS: float = _get_float("RETRY_BACKOFF_BASE_MS", 100.0, minimum=0)
+RETRY_BACKOFF_MAX_MS: float = _get_float("RETRY_BACKOFF_MAX_MS", 2000.0, minimum=0)
+RETRY_ON_STATUS: frozenset = frozenset(_get_int_list("RETRY_ON_STATUS", "502,503,504"))
+# Nombre de tentatives par étape de saga, ex. "create_payment=1,decrease_stock=5"
+RETRY_STEP_MAX_ATTEMPTS: dict = _get_int_mapping("RETRY_STEP_MAX_ATTEMPTS")
+# Envoyer un header Idempotency-Key avec les POST des handlers (les POST ne sont retentés que s'ils en ont un)
+HTTP_SEND_IDEMPOTENCY_KEYS: bool = _get_bool("HTTP_SEND_IDEMPOTENCY_KEYS", False)
+# Délai maximal des étapes d'une saga, en secondes (0 = aucun). Les timeouts de chaque requête sont réduits pour le respecter
+SAGA_DEADLINE_SECONDS: float = _get_float("SAGA_DEADLINE_SECONDS", 30.0, minimum=0)
+# Délai maximal de chaque compensation, en secondes (0 = aucun), compté à partir de son début : une compensation est tentée même après SAGA_DEADLINE_SECONDS
+SAGA_COMPENSATION_DEADLINE_SECONDS: float = _get_float("SAGA_COMPENSATION_DEADLINE_SECONDS", 60.0, minimum=0)
+
+# Tracing : désactivé (ou collecteur injoignable), le tracer est sans effet et ni le SDK ni l'exportateur ne sont chargés.
+# Le collecteur OTLP est sondé en arrière-plan, à nouveau tous les TRACING_PROBE_INTERVAL_SECONDS tant qu'il ne répond pas (0 = une seule fois)
+TRACING_ENABLED: bool = _get_bool("TRACING_ENABLED", True) and not _get_bool("OTEL_SDK_DISABLED", False)
+TRACING_OTLP_ENDPOINT: str = _get_str("TRACING_OTLP_ENDPOINT", "http://jaeger:4317")
+TRACING_SERVICE_NAME: str = _get_str("TRACING_SERVICE_NAME", "saga-orchestrator")
+TRACING_CONNECT_TIMEOUT_SECONDS: float = _get_float("TRACING_CONNECT_TIMEOUT_SECONDS", 1.0, minimum=0.1)
+TRACING_PROBE_INTERVAL_SECONDS: float = _get_float("TRACING_PROBE_INTERVAL_SECONDS", 30.0, minimum=0)
+# Échantillonnage à la source, échantillonnage des traces en erreur, taille des spans par article, file d'export
+TRACING_SAMPLE_RATIO: float = _get_float("TRACING_SAMPLE_RATIO", 1.0, minimum=0, maximum=1)
+TRACING_ALWAYS_SAMPLE_ERRORS: bool = _get_bool("TRACING_ALWAYS_SAMPLE_ERRORS", True)
+TRACING_ERROR_MAX_TRACES: int = _get_int("TRACING_ERROR_MAX_TRACES", 1000, minimum=1)
+TRACING_ERROR_MAX_SPANS_PER_TRACE: int = _get_int("TRACING_ERROR_MAX_SPANS_PER_TRACE", 256, minimum=1)
+TRACING_MAX_ITEM_ATTRIBUTES: int = _get_int("TRACING_MAX_ITEM_ATTRIBUTES", 10, minimum=0)
+TRACING_MAX_ITEM_SPANS: int = _get_int("TRACING_MAX_ITEM_SPANS", 10, minimum=0)
+TRACING_MAX_QUEUE_SIZE: int = _get_int("TRACING_MAX_QUEUE_SIZE", 2048, minimum=1)
+TRACING_MAX_EXPORT_BATCH_SIZE: int = _get_int("TRACING_MAX_EXPORT_BATCH_SIZE", 512, minimum=1, maximum=TRACING_MAX_QUEUE_SIZE)
+TRACING_SCHEDULE_DELAY_MS: float = _get_float("TRACING_SCHEDULE_DELAY_MS", 5000.0, minimum=0)
+TRACING_EXPORT_TIMEOUT_MS: float = _get_float("TRACING_EXPORT_TIMEOUT_MS", 30000.0, minimum=0)
+
+# Profil des sagas les plus lentes (GET /debug/slow-sagas) : sagas gardées, événements par saga, échantillonnage de la pile (0 = désactivé)
+SAGA_PROFILER_ENABLED: bool = _get_bool("SAGA_PROFILER_ENABLED", False)
+SAGA_PROFILER_SLOWEST: int = _get_int("SAGA_PROFILER_SLOWEST", 50, minimum=1)
+SAGA_PROFILER_MAX_EVENTS: int = _get_int("SAGA_PROFILER_MAX_EVENTS", 256, minimum=0)
+SAGA_PROFILER_SAMPLE_INTERVAL_MS: float = _get_float("SAGA_PROFILER_SAMPLE_INTERVAL_MS", 0.0, minimum=0)
+
+# Disjoncteurs par service (préfixe de route sur l'API Gateway) : taux d'échec sur une fenêtre glissante, puis sondes en HALF_OPEN
+CIRCUIT_BREAKER_ENABLED: bool = _get_bool("CIRCUIT_BREAKER_ENABLED", True)
+CIRCUIT_BREAKER_ROUTES: list = _get_list("CIRCUIT_BREAKER_ROUTES", "/store-api,/payments-api")
+CIRCUIT_BREAKER_CRITICAL_ROUTES: list = _get_list("CIRCUIT_BREAKER_CRITICAL_ROUTES", "/store-api,/payments-api")
+CIRCUIT_BREAKER_WINDOW_SECONDS: int = _get_int("CIRCUIT_BREAKER_WINDOW_SECONDS", 30, minimum=1)
+CIRCUIT_BREAKER_MIN_REQUESTS: int = _get_int("CIRCUIT_BREAKER_MIN_REQUESTS", 20, minimum=1)
+CIRCUIT_BREAKER_FAILURE_RATE: float = _get_float("CIRCUIT_BREAKER_FAILURE_RATE", 0.5, minimum=0, maximum=1)
+CIRCUIT_BREAKER_OPEN_SECONDS: float = _get_float("CIRCUIT_BREAKER_OPEN_SECONDS", 15.0, minimum=0)
+CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS: int = _get_int("CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS", 3, minimum=1)
+
+# Nombre maximal de mises à jour de stock envoyées en parallèle pour une même commande (1 = séquentiel)
+STOCK_UPDATE_CONCURRENCY: int = _get_int("STOCK_UPDATE_CONCURRENCY", 1, minimum=0)
+
+# Mise à jour du stock en une seule requête groupée (retour automatique aux requêtes par article si l'endpoint n'existe pas)
+STOCK_BULK_UPDATE_ENABLED: bool = _get_bool("STOCK_BULK_UPDATE_ENABLED", False)
+STOCK_BULK_UPDATE_PATH: str = _get_str("STOCK_BULK_UPDATE_PATH", "/store-api/stocks/bulk")
+STOCK_BULK_REPROBE_SECONDS: float = _get_float("STOCK_BULK_REPROBE_SECONDS", 300.0, minimum=0)
+# Nouveaux envois (même Idempotency-Key) d'une requête groupée dont l'issue est inconnue (timeout, connexion perdue, 5xx)
+STOCK_BULK_UNKNOWN_RETRIES: int = _get_int("STOCK_BULK_UNKNOWN_RETRIES", 2, minimum=0)
+# Nombre maximal d'articles par requête groupée quand les sorties de stock de plusieurs sagas sont regroupées (lots de commandes)
+STOCK_COALESCE_MAX_ITEMS: int = _get_int("STOCK_COALESCE_MAX_ITEMS", 500, minimum=1)
+
+# Réservation du stock (confirmée après le paiement, sinon laissée expirer) au lieu de la sortie du stock suivie d'une remise en stock en cas d'échec
+STOCK_RESERVATION_ENABLED: bool = _get_bool("STOCK_RESERVATION_ENABLED", False)
+STOCK_RESERVATION_PATH: str = _get_str("STOCK_RESERVATION_PATH", "/store-api/stock-reservations")
+STOCK_RESERVATION_TTL_SECONDS: float = _get_float("STOCK_RESERVATION_TTL_SECONDS", 120.0, minimum=1)
+STOCK_RESERVATION_SWEEP_SECONDS: float = _get_float("STOCK_RESERVATION_SWEEP_SECONDS", 5.0, minimum=0.1)
+# Une confirmation sans réponse définitive est renvoyée jusqu'à l'expiration de la réservation plus ce délai, puis la saga est compensée
+STOCK_COMMIT_RETRY_GRACE_SECONDS: float = _get_float("STOCK_COMMIT_RETRY_GRACE_SECONDS", 30.0, minimum=0)
+
+# Limites de POST /saga/order, vérifiées avant la saga : nombre de lignes, quantité par produit
+ORDER_MAX_ITEMS: int = _get_int("ORDER_MAX_ITEMS", 500, minimum=1)
+ORDER_MAX_QUANTITY: int = _get_int("ORDER_MAX_QUANTITY", 10000, minimum=1)
+
+# Validation des commandes avant la saga, avec un cache (TTL + LRU) des produits et des stocks lus sur store-api
+CATALOG_VALIDATION_ENABLED: bool = _get_bool("CATALOG_VALIDATION_ENABLED", False)
+CATALOG_CHECK_STOCK: bool = _get_bool("CATALOG_CHECK_STOCK", True)
+CATALOG_PRODUCT_PATH: str = _get_str("CATALOG_PRODUCT_PATH", "/store-api/products/{product_id}")
+CATALOG_STOCK_PATH: str = _get_str("CATALOG_STOCK_PATH", "/store-api/stocks/{product_id}")
+CATALOG_PRODUCT_TTL_SECONDS: float = _get_float("CATALOG_PRODUCT_TTL_SECONDS", 300.0, minimum=0)
+CATALOG_STOCK_TTL_SECONDS: float = _get_float("CATALOG_STOCK_TTL_SECONDS", 5.0, minimum=0)
+CATALOG_NEGATIVE_TTL_SECONDS: float = _get_float("CATALOG_NEGATIVE_TTL_SECONDS", 30.0, minimum=0)
+CATALOG_MAX_ENTRIES: int = _get_int("CATALOG_MAX_ENTRIES", 10000, minimum=1)
+CATALOG_FETCH_CONCURRENCY: int = _get_int("CATALOG_FETCH_CONCURRENCY", 8, minimum=1)
+CATALOG_TIMEOUT_SECONDS: float = _get_float("CATALOG_TIMEOUT_SECONDS", 1.0, minimum=0)
+
+# Moteur asynchrone (saga_asgi.py)
+# Si true, les handlers bloquants sont réutilisés via SyncHandlerAdapter (un thread par appel en cours) au lieu des handlers asynchrones
+ASYNC_SAGA_USE_SYNC_HANDLERS: bool = _get_bool("ASYNC_SAGA_USE_SYNC_HANDLERS", False)
+ASYNC_SAGA_SYNC_HANDLER_THREADS: int = _get_int("ASYNC_SAGA_SYNC_HANDLER_THREADS", 32, minimum=1)
+
+# Journal des transitions de saga (SQLite) pour compenser les sagas interrompues au redémarrage
+SAGA_JOURNAL_ENABLED: bool = _get_bool("SAGA_JOURNAL_ENABLED", True)
+SAGA_JOURNAL_PATH: str = _get_str("SAGA_JOURNAL_PATH", "saga_journal.db")
+SAGA_JOURNAL_MAX_BATCH: int = _get_int("SAGA_JOURNAL_MAX_BATCH", 256, minimum=1)
+SAGA_JOURNAL_COMMIT_DELAY_MS: float = _get_float("SAGA_JOURNAL_COMMIT_DELAY_MS", 0.0, minimum=0)
+SAGA_JOURNAL_RETENTION_SECONDS: float = _get_float("SAGA_JOURNAL_RETENTION_SECONDS", 86400.0, minimum=0)
+# Intervalle de compactage du journal par son thread d'écriture (secondes, 0 = seulement au démarrage)
+SAGA_JOURNAL_COMPACT_INTERVAL_SECONDS: float = _get_float("SAGA_JOURNAL_COMPACT_INTERVAL_SECONDS", 300.0, minimum=0)
+# Bail de chaque processus sur ses sagas, renouvelé par le thread d'écriture (secondes) : les sagas d'un autre hôte ne sont reprises qu'après son expiration
+SAGA_JOURNAL_LEASE_SECONDS: float = _get_float("SAGA_JOURNAL_LEASE_SECONDS", 60.0, minimum=1)
+# Compenser les sagas interrompues au démarrage de l'application (gunicorn.conf.py le fait une seule fois, avant de démarrer les workers)
+SAGA_RECOVERY_ON_STARTUP: bool = _get_bool("SAGA_RECOVERY_ON_STARTUP", True)
+
+# Exécuter la sortie du stock et la création du paiement en parallèle, après la création de la commande
+SAGA_PARALLEL_STOCK_AND_PAYMENT: bool = _get_bool("SAGA_PARALLEL_STOCK_AND_PAYMENT", False)
+
+# Soumission asynchrone des sagas (202 + GET /saga/order/<saga_id>)
+SAGA_ASYNC_SUBMISSION: bool = _get_bool("SAGA_ASYNC_SUBMISSION", False)
+SAGA_WORKERS: int = _get_int("SAGA_WORKERS", 16, minimum=1)
+SAGA_QUEUE_MAX_DEPTH: int = _get_int("SAGA_QUEUE_MAX_DEPTH", 256, minimum=1)
+SAGA_QUEUE_RETRY_AFTER_SECONDS: int = _get_int("SAGA_QUEUE_RETRY_AFTER_SECONDS", 1, minimum=0)
+SAGA_STATUS_MAX_ENTRIES: int = _get_int("SAGA_STATUS_MAX_ENTRIES", 10000, minimum=1)
+
+# Transport des étapes de saga : http (le thread de la saga appelle chaque handler) ou messaging (commandes et réponses via un courtier de messages)
+SAGA_TRANSPORT: str = _get_str("SAGA_TRANSPORT", "http", choices=("http", "messaging"))
+# Courtier de messages : memory (dans le processus), sqlite (partageable entre processus) ou chemin d'une classe (module.Classe)
+MESSAGE_BROKER_BACKEND: str = _get_str("MESSAGE_BROKER_BACKEND", "memory")
+MESSAGE_BROKER_SQLITE_PATH: str = _get_str("MESSAGE_BROKER_SQLITE_PATH", "saga_messages.db")
+# Réponses traitées (et commandes publiées) par lot, threads consommateurs des commandes (0 = commandes exécutées par un autre processus)
+MESSAGE_BATCH_SIZE: int = _get_int("MESSAGE_BATCH_SIZE", 64, minimum=1)
+MESSAGE_CONSUMER_CONCURRENCY: int = _get_int("MESSAGE_CONSUMER_CONCURRENCY", 16, minimum=0)
+# Nouvelle livraison d'un message non acquitté, abandon après un nombre de livraisons, lecture des messages publiés par d'autres processus
+MESSAGE_VISIBILITY_TIMEOUT_SECONDS: float = _get_float("MESSAGE_VISIBILITY_TIMEOUT_SECONDS", 60.0, minimum=0.1)
+MESSAGE_MAX_DELIVERIES: int = _get_int("MESSAGE_MAX_DELIVERIES", 5, minimum=1)
+MESSAGE_POLL_INTERVAL_MS: float = _get_float("MESSAGE_POLL_INTERVAL_MS", 100.0, minimum=1)
+# Attente maximale du résultat par POST /saga/order : au-delà, 202 et la saga continue sans le client
+MESSAGE_REPLY_TIMEOUT_SECONDS: float = _get_float("MESSAGE_REPLY_TIMEOUT_SECONDS", 60.0, minimum=0)
+# Attente maximale de la réponse d'une commande : au-delà, l'étape est considérée en échec et la saga est compensée
+MESSAGE_COMMAND_TIMEOUT_SECONDS: float = _get_float("MESSAGE_COMMAND_TIMEOUT_SECONDS", 120.0, minimum=10)
+# Identifiant stable de l'orchestrateur, qui nomme son topic de réponses (gunicorn y ajoute le numéro du worker)
+MESSAGE_INSTANCE_ID: str = _get_str("MESSAGE_INSTANCE_ID", "").strip() or socket.gethostname()
+
+# Lots de commandes (POST /saga/orders:batch) : nombre maximal de commandes par lot, sagas exécutées en même temps (tous lots confondus),
+# regroupement des sorties de stock des sagas d'un lot (si STOCK_BULK_UPDATE_ENABLED)
+BATCH_MAX_ORDERS: int = _get_int("BATCH_MAX_ORDERS", 1000, minimum=1)
+BATCH_CONCURRENCY: int = _get_int("BATCH_CONCURRENCY", 16, minimum=1)
+BATCH_COALESCE_STOCK: bool = _get_bool("BATCH_COALESCE_STOCK", True)
+
+# Contrôle d'admission de POST /saga/order : limite adaptative (AIMD) des sagas en cours selon la latence des services en aval,
+# et limite de débit par user_id (seau à jetons, 0 = pas de limite par utilisateur)
+ADMISSION_CONTROL_ENABLED: bool = _get_bool("ADMISSION_CONTROL_ENABLED", False)
+ADMISSION_MIN_LIMIT: int = _get_int("ADMISSION_MIN_LIMIT", 4, minimum=1)
+ADMISSION_MAX_LIMIT: int = _get_int("ADMISSION_MAX_LIMIT", 256, minimum=ADMISSION_MIN_LIMIT)
+ADMISSION_INITIAL_LIMIT: int = _get_int("ADMISSION_INITIAL_LIMIT", 32, minimum=ADMISSION_MIN_LIMIT, maximum=ADMISSION_MAX_LIMIT)
+ADMISSION_LATENCY_TARGET_MS: float = _get_float("ADMISSION_LATENCY_TARGET_MS", 500.0, minimum=1)
+ADMISSION_DECREASE_FACTOR: float = _get_float("ADMISSION_DECREASE_FACTOR", 0.7, minimum=0.01, maximum=0.99)
+ADMISSION_RETRY_AFTER_SECONDS: int = _get_int("ADMISSION_RETRY_AFTER_SECONDS", 1, minimum=0)
+ADMISSION_USER_RATE_PER_SECOND: float = _get_float("ADMISSION_USER_RATE_PER_SECOND", 5.0, minimum=0)
+ADMISSION_USER_BURST: float = _get_float("ADMISSION_USER_BURST", 10.0, minimum=1)
+ADMISSION_USER_MAX_ENTRIES: int = _get_int("ADMISSION_USER_MAX_ENTRIES", 100000, minimum=1)
+
+# Idempotency-Key sur /saga/order : durée de conservation des réponses, nombre maximal de clés, attente maximale d'un doublon
+IDEMPOTENCY_TTL_SECONDS: float = _get_float("IDEMPOTENCY_TTL_SECONDS", 86400.0, minimum=0)
+IDEMPOTENCY_MAX_ENTRIES: int = _get_int("IDEMPOTENCY_MAX_ENTRIES", 100000, minimum=1)
+IDEMPOTENCY_WAIT_TIMEOUT_SECONDS: float = _get_float("IDEMPOTENCY_WAIT_TIMEOUT_SECONDS", 30.0, minimum=0)
+
+# Serveur de production (gunicorn -c gunicorn.conf.py) : application servie (wsgi ou asgi), processus (0 = un par cœur), threads par processus, délais
+SERVER_APP: str = _get_str("SERVER_APP", "wsgi", choices=("wsgi", "asgi"))
+SERVER_WORKERS: int = _get_int("SERVER_WORKERS", 0, minimum=0)
+SERVER_THREADS: int = _get_int("SERVER_THREADS", 16, minimum=1)
+SERVER_TIMEOUT_SECONDS: int = _get_int("SERVER_TIMEOUT_SECONDS", 60, minimum=1)
+# Le délai d'arrêt laisse à une saga commencée juste avant SIGTERM le temps de finir, puis de compenser : sinon elle est tuée au milieu de sa compensation.
+# Par défaut, 5 secondes de plus pour vider le journal et exporter les spans
+_SAGA_MAX_DURATION_SECONDS = math.ceil(SAGA_DEADLINE_SECONDS + SAGA_COMPENSATION_DEADLINE_SECONDS)
+SERVER_GRACEFUL_TIMEOUT_SECONDS: int = _get_int("SERVER_GRACEFUL_TIMEOUT_SECONDS", _SAGA_MAX_DURATION_SECONDS + 5, minimum=_SAGA_MAX_DURATION_SECONDS)
+SERVER_KEEPALIVE_SECONDS: int = _get_int("SERVER_KEEPALIVE_SECONDS", 5, minimum=0)
+
+# Toutes les erreurs d'un coup : corriger une variable ne doit pas en révéler une autre au démarrage suivant
+if _errors:
+    raise ConfigError("Configuration invalide :\n- " + "\n- ".join(_errors))
@@ -0,0 +1,48 @@
+"""
+Order saga controller (async)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import time
+import saga_metrics
+import saga_profiler
+from opentelemetry import trace
+from controllers.async_saga_controller import AsyncSagaController
+from controllers.order_saga_controller import OrderSagaMixin
+from logger import saga_log_context
+from order_saga_context import OrderSagaContext
+from order_saga_definition import ORDER_SAGA_DEFINITION
+
+class AsyncOrderSagaController(OrderSagaMixin, AsyncSagaController):
+    """
+    Async version of OrderSagaController, executing the same saga definition. Each saga is a coroutine, so many sagas can wait on the network while sharing the same event loop thread.
+    With use_sync_handlers=True, the blocking handlers are reused through SyncHandlerAdapter (one worker thread per call in progress).
+    """
+
+    def __init__(self, use_sync_handlers=None, journal=None, definition=None):
+        """ Constructor method """
+        super().__init__(definition or ORDER_SAGA_DEFINITION, OrderSagaContext(), journal, use_sync_handlers)
+
+    async def run(self, payload):
+        """ Perform steps of order saga """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("order_saga_execution") as saga_span:
+            self.context = OrderSagaContext.from_payload(payload)
+            self.context.saga_id = self.saga_id
+            self._start_deadline()
+
+            saga_span.set_attribute("saga_id", self.saga_id)
+            saga_span.set_attribute("user_id", self.context.user_id or "unknown")
+            saga_span.set_attribute("items_count", len(self.context.items))
+
+            start = time.perf_counter()
+            saga_metrics.saga_started(self.definition.name)
+            try:
+                # Pas d'échantillonnage de la pile : toutes les sagas partagent le thread de la boucle d'événements
+                with saga_log_context(self.saga_id), saga_profiler.profile_saga(self.definition.name, self.saga_id, is_sampled=False):
+                    await self._execute(saga_span)
+                    saga_profiler.record_outcome(self._get_outcome())
+            finally:
+                saga_metrics.saga_finished(self.definition.name, self._get_outcome(), time.perf_counter() - start)
+            return self._build_result(saga_span)
@@ -0,0 +1,151 @@
+"""
+Saga controller (table-driven, async)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+import time
+import config
+import saga_metrics
+import saga_profiler
+from opentelemetry import trace
+from controllers.saga_controller import SagaController
+from handlers.async_handler import SyncHandlerAdapter
+from logger import saga_log_context
+from retry_policy import get_compensation_deadline
+
+class AsyncSagaController(SagaController):
+    """
+    Async version of SagaController: same transition table and bookkeeping, but the handlers are coroutines.
+    The steps of a parallel stage, and the independent compensations, are gathered on the event loop.
+    With use_sync_handlers=True (or for a step without async handler), the blocking handler is reused through SyncHandlerAdapter.
+    """
+
+    def __init__(self, definition, context, journal=None, use_sync_handlers=None):
+        """ Constructor method """
+        super().__init__(definition, context, journal)
+        self.use_sync_handlers = config.ASYNC_SAGA_USE_SYNC_HANDLERS if use_sync_handlers is None else use_sync_handlers
+
+    async def recover(self, saga_id, state_name, snapshot):
+        """ Compensate a saga interrupted by a crash, starting from the last state recorded in the journal """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span(f"{self.definition.name}_saga_recovery") as saga_span:
+            self._prepare_recovery(saga_id, state_name, snapshot)
+            saga_span.set_attribute("saga_id", self.saga_id)
+            saga_span.set_attribute("recovered_state", state_name)
+            with saga_log_context(self.saga_id):
+                await self._execute(saga_span)
+            return self._build_result(saga_span)
+
+    async def _record_state(self):
+        """ Write the current state and the saga context to the journal without blocking the event loop """
+        if self.journal is None:
+            return
+        try:
+            await asyncio.wrap_future(self.journal.append_nowait(self.saga_id, self.current_saga_state, self.context.to_dict()))
+        except Exception as e:
+            self.logger.error("Impossible d'enregistrer l'état %s de la saga %s : %s", self.current_saga_state.name, self.saga_id, e)
+
+    def _create_handler(self, step):
+        """ Create the handler of a step, or return the one already created """
+        if step.name not in self.handlers:
+            if self.use_sync_handlers or step.async_handler_class is None:
+                handler = step.handler_class(self.context)
+                # Le handler bloquant s'exécute dans un thread : il attend l'écriture du journal avec la version bloquante
+                handler.on_applied = super()._record_state if self.journal is not None else None
+                self.handlers[step.name] = SyncHandlerAdapter(handler)
+            else:
+                handler = step.async_handler_class(self.context)
+                handler.on_applied = self._record_state if self.journal is not None else None
+                self.handlers[step.name] = handler
+        return self.handlers[step.name]
+
+    async def _execute(self, saga_span):
+        """ Run the state machine from the current state until the completed state """
+        tracer = trace.get_tracer(__name__)
+
+        while self.current_saga_state != self.definition.completed_state:
+            saga_span.set_attribute("current_state", self.current_saga_state.name)
+            saga_metrics.record_state(self.definition.name, self.current_saga_state.name)
+            saga_profiler.record_state(self.current_saga_state.name)
+            await self._record_state()
+            transition = self.definition.transitions.get(self.current_saga_state)
+
+            if transition is None:
+                with tracer.start_as_current_span("saga_error_handling"):
+                    self.logger.error("L'état saga n'est pas valide : %s", self.current_saga_state)
+                    self.is_error_occurred = True
+                    # Rollback en cascade des étapes appliquées
+                    while self.applied_steps:
+                        await self._compensate(self.definition.get_ready_compensations(self.applied_steps))
+                    self.current_saga_state = self.definition.completed_state
+
+            elif transition.compensated_step is not None:
+                await self._compensate(self.definition.get_ready_compensations(self.applied_steps))
+                self._start_next_compensation()
+
+            else:
+                outcomes = await self._run_stage(transition.stage)
+                self._apply_outcomes(transition, outcomes)
+
+        await self._record_state()
+        saga_span.set_attribute("final_state", self.current_saga_state.name)
+        saga_metrics.record_state(self.definition.name, self.current_saga_state.name)
+        saga_profiler.record_state(self.current_saga_state.name)
+        saga_span.set_attribute("error_occurred", self.is_error_occurred)
+        if self.compensation_results:
+            failed_compensations = [name for name, outcome in self.compensation_results.items() if outcome != "OK"]
+            saga_span.set_attribute("compensations_count", len(self.compensation_results))
+            saga_span.set_attribute("compensations_failed", len(failed_compensations))
+
+    async def _run_stage(self, stage):
+        """ Run the steps of a stage concurrently and return [(step, state returned by its handler)] """
+        states = await asyncio.gather(*(self._run_step(step) for step in stage))
+        return list(zip(stage, states))
+
+    async def _compensate(self, steps):
+        """ Compensate a group of independent steps concurrently and remove them from the applied steps """
+        await asyncio.gather(*(self._rollback_step(step) for step in steps))
+        for step in steps:
+            if step in self.applied_steps:
+                self.applied_steps.remove(step)
+
+    async def _run_step(self, step):
+        """ Run the handler of one step. An exception is logged and counted as a failure. """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span(step.name):
+            start = time.perf_counter()
+            state = None
+            try:
+                handler = self._create_handler(step)
+                handler.configure_requests(step.retry_policy, self.deadline)
+                state = await handler.run()
+            except Exception as e:
+                self.logger.error("L'étape %s de la saga %s a échoué : %s", step.name, self.saga_id, e)
+            duration = time.perf_counter() - start
+            saga_metrics.record_step(self.definition.name, step.name, "run", state == step.success_state, duration)
+            saga_profiler.record_step(step.name, "run", state == step.success_state, duration)
+            return state
+
+    async def _rollback_step(self, step):
+        """ Compensate one step and record its outcome. An exception is logged and the other compensations still run. """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span(f"rollback_{step.name}") as span:
+            start = time.perf_counter()
+            try:
+                handler = self._create_handler(step)
+                # Une compensation doit être tentée même si le disjoncteur du service est ouvert, et même après l'échéance de la saga : elle a son propre délai
+                handler.configure_requests(step.retry_policy, get_compensation_deadline(), fail_fast=False)
+                await handler.rollback()
+                error = handler.rollback_error
+            except Exception as e:
+                error = str(e)
+                self.logger.error("Erreur lors du rollback: %s", error)
+            duration = time.perf_counter() - start
+            saga_metrics.record_step(self.definition.name, step.name, "rollback", error is None, duration)
+            saga_profiler.record_step(step.name, "rollback", error is None, duration)
+            self.compensation_results[step.name] = error or "OK"
+            span.set_attribute("compensation_succeeded", error is None)
@@ -0,0 +1,78 @@
+"""
+Order saga controller (message transport)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import config
+import saga_metrics
+from opentelemetry import trace
+from controllers.message_saga_controller import MessageSagaController
+from controllers.order_saga_controller import OrderSagaMixin
+from logger import saga_log_context
+from messaging.saga_command_consumer import SagaCommandConsumer
+from order_saga_context import OrderSagaContext
+from order_saga_definition import ORDER_SAGA_DEFINITION
+
+class MessageOrderSagaController(OrderSagaMixin, MessageSagaController):
+    """
+    Order saga executed through the message transport (SAGA_TRANSPORT=messaging): the steps are run by SagaCommandConsumer,
+    in this process (MESSAGE_CONSUMER_CONCURRENCY > 0) or in another one sharing the broker. run and run_async wait for the result at most timeout seconds
+    and return None if the saga is still in progress: it goes on without the caller, and its state can be read from the journal.
+    """
+
+    def __init__(self, journal=None, definition=None, dispatcher=None):
+        """ Constructor method """
+        super().__init__(definition or ORDER_SAGA_DEFINITION, OrderSagaContext(), journal, dispatcher)
+        if config.MESSAGE_CONSUMER_CONCURRENCY > 0:
+            SagaCommandConsumer.get_instance()
+
+    def run(self, payload, timeout=None):
+        """ Perform steps of order saga and wait for its result """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("order_saga_execution") as saga_span:
+            self._start(payload, saga_span)
+            try:
+                self.result.result(timeout)
+            except FutureTimeoutError:
+                saga_span.set_attribute("timed_out", True)
+                return None
+            return self._build_result(saga_span)
+
+    async def run_async(self, payload, timeout=None):
+        """ Perform steps of order saga and wait for its result without blocking the event loop """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("order_saga_execution") as saga_span:
+            self._start(payload, saga_span)
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.result)), timeout)
+            except asyncio.TimeoutError:
+                saga_span.set_attribute("timed_out", True)
+                return None
+            return self._build_result(saga_span)
+
+    def _start(self, payload, saga_span):
+        """ Build the context of the saga and publish the commands of its first stage """
+        self.context = OrderSagaContext.from_payload(payload)
+        self.context.saga_id = self.saga_id
+        self._start_deadline()
+
+        saga_span.set_attribute("saga_id", self.saga_id)
+        saga_span.set_attribute("user_id", self.context.user_id or "unknown")
+        saga_span.set_attribute("items_count", len(self.context.items))
+
+        start = time.perf_counter()
+        saga_metrics.saga_started(self.definition.name)
+        # La saga peut se terminer après la fin de la requête (timeout) : sa durée est enregistrée quand elle se termine
+        self.result.add_done_callback(lambda _: saga_metrics.saga_finished(self.definition.name, self._get_outcome(), time.perf_counter() - start))
+        with saga_log_context(self.saga_id):
+            try:
+                self.submit()
+            except Exception as e:
+                self.is_error_occurred = True
+                self.result.set_exception(e)
+                raise
@@ -0,0 +1,169 @@
+"""
+Saga controller (message transport)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import time
+from concurrent.futures import Future
+import config
+import saga_metrics
+from opentelemetry import propagate
+from controllers.saga_controller import SagaController
+from messaging.message_broker import COMMANDS_TOPIC, Message
+from messaging.saga_reply_dispatcher import SagaReplyDispatcher
+
+# Marge pour publier puis recevoir la réponse d'une commande terminée à son échéance
+REPLY_GRACE_SECONDS = 5.0
+
+class MessageSagaController(SagaController):
+    """
+    Executor of a SagaDefinition driven by messages (SAGA_TRANSPORT=messaging), with the same transition table and compensation rules as SagaController.
+    Instead of calling the handlers, the controller publishes one command per step of the current stage (or compensation group) and moves on
+    when every reply of the group has arrived. Between two replies, the saga holds no thread: SagaReplyDispatcher calls on_reply when a reply arrives,
+    and result is resolved once the saga is completed. Replies are matched by sequence number, so that a command delivered twice is applied once.
+    A command whose reply has not arrived after MESSAGE_COMMAND_TIMEOUT_SECONDS (or after the saga deadline, for a forward step) fails,
+    so that the saga is compensated instead of waiting forever for a lost command or a dead consumer. Its consumer may have applied it before
+    the reply was lost, so the step is compensated too: rollbacks are idempotent and only undo what the context records.
+    """
+
+    def __init__(self, definition, context, journal=None, dispatcher=None):
+        """ Constructor method """
+        super().__init__(definition, context, journal)
+        self.dispatcher = dispatcher or SagaReplyDispatcher.get_instance()
+        # Résolu par le dispatcher quand la saga est terminée
+        self.result = Future()
+        self.transition = None
+        # Commandes dont la réponse est attendue, par nom d'étape : (étape, numéro de séquence, contexte envoyé, action, envoi et échéance de la réponse en time.monotonic())
+        self.pending_commands = {}
+        # État retourné par chaque étape de l'étage en cours
+        self.stage_states = {}
+        self.sequence = 0
+        self.journal_writes = []
+
+    def submit(self):
+        """ Start the saga and return the Future resolved once it is completed """
+        self.dispatcher.start(self)
+        return self.result
+
+    def is_finished(self):
+        """ Return True once the saga has reached its completed state """
+        return self.current_saga_state == self.definition.completed_state
+
+    def advance(self):
+        """ Move to the next state waiting for replies and return its commands. Once the saga is completed, record its final state and return no command. """
+        while self.current_saga_state != self.definition.completed_state:
+            saga_metrics.record_state(self.definition.name, self.current_saga_state.name)
+            self._record_state()
+            self.transition = self.definition.transitions.get(self.current_saga_state)
+
+            if self.transition is None:
+                self.logger.error("L'état saga n'est pas valide : %s", self.current_saga_state)
+                self.is_error_occurred = True
+                self._start_next_compensation()
+            elif self.transition.compensated_step is not None:
+                return [self._build_command(step, "rollback") for step in self.definition.get_ready_compensations(self.applied_steps)]
+            else:
+                return [self._build_command(step, "run") for step in self.transition.stage]
+
+        self._record_state()
+        saga_metrics.record_state(self.definition.name, self.current_saga_state.name)
+        return []
+
+    def on_reply(self, reply):
+        """ Apply the reply of a step and return the commands to publish next (none while other replies of the group are awaited) """
+        pending = self.pending_commands.get(reply["step"])
+        if pending is None or pending[1] != reply["sequence"]:
+            self.logger.debug("Réponse en double ignorée pour l'étape %s", reply["step"])
+            return []
+        # Réponse lue avant de retirer la commande : une réponse illisible n'est pas acquittée et reste attendue
+        state = type(self.definition.initial_state)[reply["state"]] if reply["action"] == "run" and reply["state"] is not None else None
+        step, _, sent_context, _, _, _ = self.pending_commands.pop(reply["step"])
+        self._merge_context(sent_context, reply["context"])
+
+        if reply["action"] == "run":
+            saga_metrics.record_step(self.definition.name, step.name, "run", state == step.success_state, reply["duration"])
+            self.stage_states[step.name] = state
+        else:
+            saga_metrics.record_step(self.definition.name, step.name, "rollback", reply["error"] is None, reply["duration"])
+            self.compensation_results[step.name] = reply["error"] or "OK"
+            if step in self.applied_steps:
+                self.applied_steps.remove(step)
+
+        if self.pending_commands:
+            return []
+        if self.transition.compensated_step is None:
+            self._apply_outcomes(self.transition, [(stage_step, self.stage_states.pop(stage_step.name)) for stage_step in self.transition.stage])
+        else:
+            self._start_next_compensation()
+        return self.advance()
+
+    def get_overdue_replies(self, now):
+        """ Return a failure reply for each command whose reply deadline (time.monotonic()) has passed """
+        replies = []
+        for step, sequence, sent_context, action, sent_at, reply_deadline in list(self.pending_commands.values()):
+            if now < reply_deadline:
+                continue
+            error = f"Pas de réponse de l'étape {step.name} ({action}) après {now - sent_at:.1f} s"
+            self.logger.error("%s : elle est considérée en échec", error)
+            # L'étape a pu être appliquée par un consommateur dont la réponse s'est perdue : son état de compensation la fait compenser avec les précédentes
+            state = step.compensation_state if action == "run" else None
+            replies.append({
+                "saga_id": self.saga_id,
+                "sequence": sequence,
+                "step": step.name,
+                "action": action,
+                "state": state.name if state is not None else None,
+                "error": error,
+                "context": sent_context,
+                "duration": now - sent_at,
+            })
+        return replies
+
+    def _build_command(self, step, action):
+        """ Return the command asking a consumer to run or roll back a step, and wait for its reply """
+        self.sequence += 1
+        context = self.context.to_dict()
+        now = time.monotonic()
+        reply_deadline = now + config.MESSAGE_COMMAND_TIMEOUT_SECONDS
+        # Une étape est toujours bornée : le consommateur ne la commence pas après son échéance, qui précède celle de la réponse
+        if action == "run" and self.deadline is not None:
+            reply_deadline = min(reply_deadline, self.deadline + REPLY_GRACE_SECONDS)
+        self.pending_commands[step.name] = (step, self.sequence, context, action, now, reply_deadline)
+        body = {
+            "saga_id": self.saga_id,
+            "saga": self.definition.name,
+            "sequence": self.sequence,
+            "step": step.name,
+            "action": action,
+            "context": context,
+            "reply_to": self.dispatcher.reply_topic,
+            # Les compensations ne sont pas bornées par l'échéance de la saga
+            "deadline_at": time.time() + reply_deadline - REPLY_GRACE_SECONDS - now if action == "run" else None,
+        }
+        headers = {}
+        propagate.inject(headers)
+        return Message(topic=COMMANDS_TOPIC, body=body, headers=headers)
+
+    def _merge_context(self, sent_context, returned_context):
+        """ Keep the fields changed by the step: the steps of a parallel stage received the same context and each change their own fields """
+        for name, value in returned_context.items():
+            if name in sent_context and value != sent_context[name]:
+                setattr(self.context, name, value)
+
+    def _record_state(self):
+        """ Queue the current state in the journal, if enabled: flush_journal waits until it is durable """
+        if self.journal is None:
+            return
+        try:
+            self.journal_writes.append(self.journal.append_nowait(self.saga_id, self.current_saga_state, self.context.to_dict()))
+        except Exception as e:
+            self.logger.error("Impossible d'enregistrer l'état %s de la saga %s : %s", self.current_saga_state.name, self.saga_id, e)
+
+    def flush_journal(self):
+        """ Wait until the states queued in the journal are durable """
+        for future in self.journal_writes:
+            try:
+                future.result()
+            except Exception as e:
+                self.logger.error("Impossible d'enregistrer un état de la saga %s : %s", self.saga_id, e)
+        self.journal_writes = []
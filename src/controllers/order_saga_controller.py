@@ -3,114 +3,88 @@ Order saga controller
 SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
+import time
+import saga_metrics
+import saga_profiler
 from opentelemetry import trace
-from handlers.create_order_handler import CreateOrderHandler
-from handlers.create_payment_handler import CreatePaymentHandler
-from handlers.decrease_stock_handler import DecreaseStockHandler
-from controllers.controller import Controller
+from controllers.saga_controller import SagaController
+from logger import saga_log_context
+from order_saga_context import OrderSagaContext
+from order_saga_definition import ORDER_SAGA_DEFINITION
 from order_saga_state import OrderSagaState
 
-class OrderSagaController(Controller):
-    """ 
-    This class manages states and transitions of an order saga. The current state is persisted only in memory, as an instance variable, therefore it does not allow retrying in case the application fails.
+class OrderSagaMixin:
+    """ Reporting of an order saga, shared by OrderSagaController, AsyncOrderSagaController and MessageOrderSagaController. It only reads the attributes set by SagaController. """
+
+    def _warn_interrupted(self, state):
+        """
+        Log what may be left behind by the steps interrupted in this state. They are compensated from what their handlers journaled,
+        so only a request whose answer arrived just before the stop (and was not journaled yet) can be missed.
+        """
+        transition = self.definition.transitions.get(state)
+        for step in (transition.stage if transition is not None else ()):
+            if step.state == OrderSagaState.DECREASING_STOCK:
+                applied_ids = {item["product_id"] for item in self.context.applied_stock_deltas}
+                unknown_items = [item for item in self.context.items if item["product_id"] not in applied_ids]
+                if unknown_items:
+                    self.logger.warning("Saga %s interrompue pendant la sortie du stock : vérifiez le stock des articles %s", self.saga_id, unknown_items)
+            elif step.state == OrderSagaState.CREATING_ORDER and not self.context.order_id:
+                self.logger.warning("Saga %s interrompue pendant la création de la commande : une commande orpheline peut exister", self.saga_id)
+            elif step.state == OrderSagaState.CREATING_PAYMENT and not self.context.payment_id:
+                self.logger.warning("Saga %s interrompue pendant le paiement de la commande %s : vérifiez qu'aucun paiement n'a été créé", self.saga_id, self.context.order_id)
+            elif step.state == OrderSagaState.COMMITTING_STOCK:
+                self.logger.warning("Saga %s interrompue pendant la confirmation de la réservation %s : si elle a été confirmée, remettez en stock les articles %s",
+                                    self.saga_id, self.context.stock_reservation_id, self.context.items)
+
+    def _build_result(self, saga_span):
+        """ Return the response of /saga/order """
+        result = {
+            "order_id": self.context.order_id,
+            "status": "Une erreur s'est produite lors de la création de la commande." if self.is_error_occurred else "OK"
+        }
+        if self.compensation_results:
+            # Résultat de chaque compensation : "OK" ou le message d'erreur (ex. remise en stock échouée)
+            result["compensations"] = self._get_compensation_outcomes()
+
+        saga_span.set_attribute("order_id", result["order_id"] or "none")
+        saga_span.set_attribute("saga_status", result["status"])
+
+        return result
+
+class OrderSagaController(OrderSagaMixin, SagaController):
+    """
+    This class manages states and transitions of an order saga. The current state is kept in memory, as an instance variable.
+    The steps, their compensations and the transition table are declared in order_saga_definition.py and executed by SagaController.
+    The handlers share an OrderSagaContext: each step stores the fields returned by the services (order_id, total_amount, applied stock, payment_id) for the next steps.
+    If a journal is enabled (SAGA_JOURNAL_ENABLED), every transition is also recorded with this context,
+    so that a saga interrupted by a crash can be compensated at the next startup (see recover and saga_recovery.py).
     Please read section 11 of the arc42 document of this project to understand the limitations of this implementation in more detail.
     """
 
-    def __init__(self):
+    def __init__(self, journal=None, definition=None):
         """ Constructor method """
-        super().__init__()
         # NOTE: veuillez lire le commentaire de ce classe pour mieux comprendre les limitations de ce implémentation
-        self.current_saga_state = OrderSagaState.CREATING_ORDER
-    
-    def run(self, request):
+        super().__init__(definition or ORDER_SAGA_DEFINITION, OrderSagaContext(), journal)
+
+    def run(self, payload):
         """ Perform steps of order saga """
         tracer = trace.get_tracer(__name__)
-        
-        with tracer.start_as_current_span("order_saga_execution") as saga_span:
-            payload = request.get_json() or {}
-            order_data = {
-                "user_id": payload.get('user_id'),
-                "items": payload.get('items', [])
-            }
-            
-            saga_span.set_attribute("user_id", order_data.get("user_id", "unknown"))
-            saga_span.set_attribute("items_count", len(order_data.get("items", [])))
-            
-            # Initialiser les handlers
-            self.create_order_handler = CreateOrderHandler(order_data)
-            self.decrease_stock_handler = None
-            self.create_payment_handler = None
-            
-            # Stack des handlers complétés pour le rollback
-            completed_handlers = []
-
-            while self.current_saga_state is not OrderSagaState.COMPLETED:
-                saga_span.set_attribute("current_state", self.current_saga_state.name)
-                
-                if self.current_saga_state == OrderSagaState.CREATING_ORDER:
-                    with tracer.start_as_current_span("create_order"):
-                        self.current_saga_state = self.create_order_handler.run()
-                        if self.current_saga_state != OrderSagaState.COMPLETED:
-                            completed_handlers.append(self.create_order_handler)
-                    
-                elif self.current_saga_state == OrderSagaState.DECREASING_STOCK:
-                    with tracer.start_as_current_span("decrease_stock"):
-                        self.decrease_stock_handler = DecreaseStockHandler(order_data["items"])
-                        self.current_saga_state = self.decrease_stock_handler.run()
-                        if self.current_saga_state == OrderSagaState.CREATING_PAYMENT:
-                            completed_handlers.append(self.decrease_stock_handler)
-                    
-                elif self.current_saga_state == OrderSagaState.CREATING_PAYMENT:
-                    with tracer.start_as_current_span("create_payment"):
-                        self.create_payment_handler = CreatePaymentHandler(self.create_order_handler.order_id, order_data)
-                        self.current_saga_state = self.create_payment_handler.run()
-                        if self.current_saga_state == OrderSagaState.COMPLETED:
-                            completed_handlers.append(self.create_payment_handler)
-                    
-                elif self.current_saga_state == OrderSagaState.INCREASING_STOCK:
-                    with tracer.start_as_current_span("rollback_decrease_stock"):
-                        # Rollback: remettre le stock
-                        if self.decrease_stock_handler:
-                            self.current_saga_state = self.decrease_stock_handler.rollback()
-                        else:
-                            self.current_saga_state = OrderSagaState.CANCELLING_ORDER
-                    
-                elif self.current_saga_state == OrderSagaState.CANCELLING_ORDER:
-                    with tracer.start_as_current_span("rollback_create_order"):
-                        # Rollback: annuler la commande
-                        if self.create_order_handler:
-                            self.current_saga_state = self.create_order_handler.rollback()
-                        else:
-                            self.current_saga_state = OrderSagaState.COMPLETED
-                        self.is_error_occurred = True
-                    
-                else:
-                    with tracer.start_as_current_span("saga_error_handling"):
-                        self.is_error_occurred = True
-                        self.logger.error(f"L'état saga n'est pas valide : {self.current_saga_state}")
-                        
-                        # Rollback en cascade des handlers complétés
-                        for handler in reversed(completed_handlers):
-                            try:
-                                handler.rollback()
-                            except Exception as e:
-                                self.logger.error(f"Erreur lors du rollback: {str(e)}")
-                        
-                        self.current_saga_state = OrderSagaState.COMPLETED
-
-            saga_span.set_attribute("final_state", self.current_saga_state.name)
-            saga_span.set_attribute("error_occurred", self.is_error_occurred)
-            
-            result = {
-                "order_id": self.create_order_handler.order_id,
-                "status": "Une erreur s'est produite lors de la création de la commande." if self.is_error_occurred else "OK"
-            }
-            
-            saga_span.set_attribute("order_id", result["order_id"] or "none")
-            saga_span.set_attribute("saga_status", result["status"])
-            
-            return result
 
+        with tracer.start_as_current_span("order_saga_execution") as saga_span:
+            self.context = OrderSagaContext.from_payload(payload)
+            self.context.saga_id = self.saga_id
+            self._start_deadline()
 
+            saga_span.set_attribute("saga_id", self.saga_id)
+            saga_span.set_attribute("user_id", self.context.user_id or "unknown")
+            saga_span.set_attribute("items_count", len(self.context.items))
 
-    
+            start = time.perf_counter()
+            saga_metrics.saga_started(self.definition.name)
+            try:
+                with saga_log_context(self.saga_id), saga_profiler.profile_saga(self.definition.name, self.saga_id):
+                    self._execute(saga_span)
+                    saga_profiler.record_outcome(self._get_outcome())
+            finally:
+                saga_metrics.saga_finished(self.definition.name, self._get_outcome(), time.perf_counter() - start)
+            return self._build_result(saga_span)
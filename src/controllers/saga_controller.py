@@ -0,0 +1,248 @@
+"""
+Saga controller (table-driven)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import config
+from opentelemetry import context as otel_context, trace
+import saga_metrics
+import saga_profiler
+from controllers.controller import Controller
+from logger import saga_log_context
+from retry_policy import get_compensation_deadline
+from saga_journal import SagaJournal
+
+class SagaController(Controller):
+    """
+    Generic executor of a SagaDefinition. The next state is looked up in the transition table of the definition instead of being hard-coded:
+    - in a forward state, the steps of the stage are run (in parallel if there are several) and the saga moves to the next stage if they all succeeded;
+    - otherwise, the applied steps are compensated following the dependency graph of the definition: the compensations that do not depend on each other run in parallel.
+      The saga is journaled in the compensation state of the last applied step of each group, and the outcome of every compensation is kept in compensation_results.
+    If a journal is enabled (SAGA_JOURNAL_ENABLED), every transition is recorded with the saga context, and so is every effect a handler stores in the context during its step:
+    after a crash, recover compensates the applied steps and the interrupted one.
+    The requests of each step follow the retry policy of the step. The forward steps must finish before the saga deadline (SAGA_DEADLINE_SECONDS);
+    compensations are not bounded by it, since they must run even when the saga is late: each one has its own deadline (SAGA_COMPENSATION_DEADLINE_SECONDS).
+    """
+
+    def __init__(self, definition, context, journal=None):
+        """ Constructor method """
+        super().__init__()
+        self.definition = definition
+        self.context = context
+        self.current_saga_state = definition.initial_state
+        self.saga_id = uuid.uuid4().hex
+        self.journal = journal if journal is not None else (SagaJournal.get_instance() if config.SAGA_JOURNAL_ENABLED else None)
+        # Handlers créés pendant la saga, par nom d'étape
+        self.handlers = {}
+        # Étapes appliquées, dans l'ordre d'exécution : compensées en cas d'échec
+        self.applied_steps = []
+        # Résultat de chaque compensation exécutée, par nom d'étape : "OK" ou le message d'erreur
+        self.compensation_results = {}
+        # Instant (time.monotonic()) auquel les étapes doivent être terminées, None si aucun
+        self.deadline = None
+
+    def _start_deadline(self):
+        """ Start the saga deadline (SAGA_DEADLINE_SECONDS from now) """
+        self.deadline = time.monotonic() + config.SAGA_DEADLINE_SECONDS if config.SAGA_DEADLINE_SECONDS > 0 else None
+
+    def recover(self, saga_id, state_name, snapshot):
+        """ Compensate a saga interrupted by a crash, starting from the last state recorded in the journal """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span(f"{self.definition.name}_saga_recovery") as saga_span:
+            self._prepare_recovery(saga_id, state_name, snapshot)
+            saga_span.set_attribute("saga_id", self.saga_id)
+            saga_span.set_attribute("recovered_state", state_name)
+            with saga_log_context(self.saga_id):
+                self._execute(saga_span)
+            return self._build_result(saga_span)
+
+    def _prepare_recovery(self, saga_id, state_name, snapshot):
+        """ Restore the context and the steps to compensate from a journal entry """
+        self.saga_id = saga_id
+        self.context = type(self.context).from_dict(snapshot)
+        state = type(self.definition.initial_state)[state_name]
+        self._warn_interrupted(state)
+
+        # Le client a déjà perdu sa connexion : on ne reprend pas les étapes, on compense ce qui a pu être appliqué
+        self.applied_steps = list(self.definition.recovery_compensations.get(state, ()))
+        self.is_error_occurred = True
+        self._start_next_compensation()
+
+    def _warn_interrupted(self, state):
+        """ Log what may be left behind by a step interrupted in this state (to be overridden) """
+        pass
+
+    def _build_result(self, saga_span):
+        """ Return the response of the saga """
+        result = {"saga_id": self.saga_id, "status": "ERROR" if self.is_error_occurred else "OK"}
+        if self.compensation_results:
+            result["compensations"] = self._get_compensation_outcomes()
+        return result
+
+    def _get_outcome(self):
+        """ Return the final outcome of the saga, as reported in the metrics: completed, compensated or compensation_failed """
+        if not self.is_error_occurred:
+            return "completed"
+        if any(outcome != "OK" for outcome in self.compensation_results.values()):
+            return "compensation_failed"
+        return "compensated"
+
+    def _get_compensation_outcomes(self):
+        """ Return the outcome of each compensation ("OK" or the error message), in the order of the steps of the definition """
+        return {step.name: self.compensation_results[step.name] for step in self.definition.steps if step.name in self.compensation_results}
+
+    def _record_state(self):
+        """ Write the current state and the saga context to the journal, if enabled """
+        if self.journal is None:
+            return
+        try:
+            self.journal.append(self.saga_id, self.current_saga_state, self.context.to_dict())
+        except Exception as e:
+            self.logger.error("Impossible d'enregistrer l'état %s de la saga %s : %s", self.current_saga_state.name, self.saga_id, e)
+
+    def _create_handler(self, step):
+        """ Create the handler of a step, or return the one already created """
+        if step.name not in self.handlers:
+            handler = step.handler_class(self.context)
+            if self.journal is not None:
+                # Le handler enregistre ce qu'il a appliqué avant la fin de l'étape : recover le compense même si le processus s'arrête pendant l'étape
+                handler.on_applied = self._record_state
+            self.handlers[step.name] = handler
+        return self.handlers[step.name]
+
+    def _execute(self, saga_span):
+        """ Run the state machine from the current state until the completed state """
+        tracer = trace.get_tracer(__name__)
+
+        while self.current_saga_state != self.definition.completed_state:
+            saga_span.set_attribute("current_state", self.current_saga_state.name)
+            saga_metrics.record_state(self.definition.name, self.current_saga_state.name)
+            saga_profiler.record_state(self.current_saga_state.name)
+            self._record_state()
+            transition = self.definition.transitions.get(self.current_saga_state)
+
+            if transition is None:
+                with tracer.start_as_current_span("saga_error_handling"):
+                    self.logger.error("L'état saga n'est pas valide : %s", self.current_saga_state)
+                    self.is_error_occurred = True
+                    # Rollback en cascade des étapes appliquées
+                    while self.applied_steps:
+                        self._compensate(self.definition.get_ready_compensations(self.applied_steps))
+                    self.current_saga_state = self.definition.completed_state
+
+            elif transition.compensated_step is not None:
+                self._compensate(self.definition.get_ready_compensations(self.applied_steps))
+                self._start_next_compensation()
+
+            else:
+                outcomes = self._run_stage(transition.stage)
+                self._apply_outcomes(transition, outcomes)
+
+        self._record_state()
+        saga_span.set_attribute("final_state", self.current_saga_state.name)
+        saga_metrics.record_state(self.definition.name, self.current_saga_state.name)
+        saga_profiler.record_state(self.current_saga_state.name)
+        saga_span.set_attribute("error_occurred", self.is_error_occurred)
+        if self.compensation_results:
+            failed_compensations = [name for name, outcome in self.compensation_results.items() if outcome != "OK"]
+            saga_span.set_attribute("compensations_count", len(self.compensation_results))
+            saga_span.set_attribute("compensations_failed", len(failed_compensations))
+
+    def _run_stage(self, stage):
+        """ Run the steps of a stage and return [(step, state returned by its handler)] """
+        return list(zip(stage, self._run_in_parallel(self._run_step, stage)))
+
+    def _compensate(self, steps):
+        """ Compensate a group of independent steps (in parallel if there are several) and remove them from the applied steps """
+        self._run_in_parallel(self._rollback_step, steps)
+        for step in steps:
+            if step in self.applied_steps:
+                self.applied_steps.remove(step)
+
+    def _run_in_parallel(self, method, steps):
+        """ Call method(step) for each step and return the results in the same order. Several steps run in parallel, one thread each. """
+        if len(steps) == 1:
+            return [method(steps[0])]
+
+        # Les threads du pool ne partagent pas le contexte courant : on le transmet pour garder les spans imbriqués
+        parent_context = otel_context.get_current()
+        with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix="saga-step") as executor:
+            futures = [executor.submit(method, step, parent_context) for step in steps]
+            return [future.result() for future in futures]
+
+    def _run_step(self, step, parent_context=None):
+        """ Run the handler of one step. An exception is logged and counted as a failure. """
+        tracer = trace.get_tracer(__name__)
+        token = otel_context.attach(parent_context) if parent_context is not None else None
+        try:
+            with tracer.start_as_current_span(step.name):
+                start = time.perf_counter()
+                state = None
+                try:
+                    handler = self._create_handler(step)
+                    handler.configure_requests(step.retry_policy, self.deadline)
+                    state = handler.run()
+                except Exception as e:
+                    self.logger.error("L'étape %s de la saga %s a échoué : %s", step.name, self.saga_id, e)
+                duration = time.perf_counter() - start
+                saga_metrics.record_step(self.definition.name, step.name, "run", state == step.success_state, duration)
+                saga_profiler.record_step(step.name, "run", state == step.success_state, duration)
+                return state
+        finally:
+            if token is not None:
+                otel_context.detach(token)
+
+    def _rollback_step(self, step, parent_context=None):
+        """ Compensate one step and record its outcome. An exception is logged and the other compensations still run. """
+        tracer = trace.get_tracer(__name__)
+        token = otel_context.attach(parent_context) if parent_context is not None else None
+        try:
+            with tracer.start_as_current_span(f"rollback_{step.name}") as span:
+                start = time.perf_counter()
+                try:
+                    handler = self._create_handler(step)
+                    # Une compensation doit être tentée même si le disjoncteur du service est ouvert, et même après l'échéance de la saga : elle a son propre délai
+                    handler.configure_requests(step.retry_policy, get_compensation_deadline(), fail_fast=False)
+                    handler.rollback()
+                    error = handler.rollback_error
+                except Exception as e:
+                    error = str(e)
+                    self.logger.error("Erreur lors du rollback: %s", error)
+                duration = time.perf_counter() - start
+                saga_metrics.record_step(self.definition.name, step.name, "rollback", error is None, duration)
+                saga_profiler.record_step(step.name, "rollback", error is None, duration)
+                self.compensation_results[step.name] = error or "OK"
+                span.set_attribute("compensation_succeeded", error is None)
+        finally:
+            if token is not None:
+                otel_context.detach(token)
+
+    def _apply_outcomes(self, transition, outcomes):
+        """ Move to the next stage if every step succeeded, otherwise start compensating the applied steps """
+        has_failed = False
+        for step, state in outcomes:
+            if state != step.success_state:
+                has_failed = True
+                # Une étape qui retourne son propre état de compensation a été appliquée en partie : elle est compensée elle aussi
+                if state != step.compensation_state:
+                    continue
+            if step.compensation_state is not None:
+                self.applied_steps.append(step)
+
+        if has_failed:
+            self.is_error_occurred = True
+            self._start_next_compensation()
+        else:
+            self.current_saga_state = transition.next_state
+
+    def _start_next_compensation(self):
+        """ Move to the compensation state of the next group of compensations, or to the completed state if nothing is left to compensate """
+        ready_steps = self.definition.get_ready_compensations(self.applied_steps)
+        if ready_steps:
+            self.current_saga_state = ready_steps[-1].compensation_state
+        else:
+            self.current_saga_state = self.definition.completed_state
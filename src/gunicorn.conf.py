@@ -0,0 +1,101 @@
+"""
+Gunicorn configuration (production server)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import itertools
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+# Sous un autre nom : gunicorn lit chaque variable de ce fichier comme un paramètre, et « config » en est un
+import config as app_config
+
+def get_cpu_count():
+    """ Return the number of CPUs this process may run on (the CPU set of the container, not of the host, when available) """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Fabriques d'application : chaque worker crée la sienne, et configure le tracing, après le fork
+wsgi_app = "saga_asgi:create_app()" if app_config.SERVER_APP == "asgi" else "saga_orchestrator:create_app()"
+worker_class = "uvicorn.workers.UvicornWorker" if app_config.SERVER_APP == "asgi" else "gthread"
+bind = f"0.0.0.0:{app_config.FLASK_PORT}"
+workers = app_config.SERVER_WORKERS or get_cpu_count()
+threads = app_config.SERVER_THREADS
+timeout = app_config.SERVER_TIMEOUT_SECONDS
+graceful_timeout = app_config.SERVER_GRACEFUL_TIMEOUT_SECONDS
+keepalive = app_config.SERVER_KEEPALIVE_SECONDS
+# L'application est importée par chaque worker, après le fork : le tracer, l'exportateur, le pool HTTP et les threads
+# (journal, logs, export des spans) appartiennent au worker et ne sont pas copiés à moitié initialisés depuis le maître
+preload_app = False
+
+# Les métriques Prometheus de tous les workers sont écrites dans ce répertoire et agrégées par GET /metrics
+# (doit être défini avant que les workers importent prometheus_client)
+if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="saga-metrics-")
+# Importé ici, et non dans child_exit : child_exit est appelé par le gestionnaire de SIGCHLD, qui peut interrompre un autre import
+from prometheus_client import multiprocess
+
+# La reprise des sagas interrompues est faite une seule fois, par on_starting : les workers ne doivent pas la refaire,
+# car ils compenseraient les sagas qu'un autre worker vient de commencer
+is_recovery_enabled = app_config.SAGA_JOURNAL_ENABLED and app_config.SAGA_RECOVERY_ON_STARTUP
+# (les workers héritent de ce module config, déjà importé par le maître)
+app_config.SAGA_RECOVERY_ON_STARTUP = False
+
+def on_starting(server):
+    """ Clear the metrics of a previous run, then compensate the interrupted sagas before any worker accepts requests """
+    multiproc_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    for name in os.listdir(multiproc_dir):
+        path = os.path.join(multiproc_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    if is_recovery_enabled:
+        # Dans un processus séparé : le maître n'ouvre ni le journal ni de connexions HTTP dont les workers hériteraient
+        result = subprocess.run([sys.executable, "saga_recovery.py"], cwd=os.path.dirname(os.path.abspath(__file__)))
+        if result.returncode != 0:
+            server.log.error("La reprise des sagas interrompues a échoué (code %s)", result.returncode)
+
+def pre_fork(server, worker):
+    """ Give the new worker the smallest slot number not used by a live worker: a worker that replaces a dead one takes its slot """
+    used_slots = {getattr(other, "saga_slot", None) for other in server.WORKERS.values()}
+    worker.saga_slot = next(slot for slot in itertools.count() if slot not in used_slots)
+
+def post_fork(server, worker):
+    """ Name the reply topic of the worker after its slot: stable across restarts, and not shared with the other workers """
+    app_config.MESSAGE_INSTANCE_ID = f"{app_config.MESSAGE_INSTANCE_ID}-{worker.saga_slot}"
+
+def post_worker_init(worker):
+    """ Refuse new sagas and report not ready as soon as the worker receives SIGTERM (wsgi only: uvicorn installs its own handlers) """
+    if app_config.SERVER_APP == "asgi":
+        return
+    from server_lifecycle import ServerLifecycle
+    handle_exit = worker.handle_exit
+
+    def handle_exit_and_drain(sig, frame):
+        ServerLifecycle.get_instance().start_draining()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_exit_and_drain)
+
+def worker_exit(server, worker):
+    """ Once the requests in progress are done, wait for the sagas accepted in async mode, then flush the journal and the spans """
+    from saga_journal import SagaJournal
+    from server_lifecycle import ServerLifecycle
+    from tracing import flush_tracing
+
+    lifecycle = ServerLifecycle.get_instance()
+    # Garder une seconde pour vider le journal et les spans avant que le maître ne tue le worker
+    lifecycle.drain(app_config.SERVER_GRACEFUL_TIMEOUT_SECONDS - lifecycle.get_draining_seconds() - 1)
+    if SagaJournal._instance is not None:
+        SagaJournal._instance.close()
+    flush_tracing(1000)
+
+def child_exit(server, worker):
+    """ Remove the live gauges of a dead worker from the aggregated metrics """
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,53 @@
+"""
+Handler: commit stock reservation (async)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+from opentelemetry import trace
+from handlers.async_handler import AsyncHandler
+from handlers.commit_stock_handler import CommitStockMixin
+from order_saga_state import OrderSagaState
+from stock_reservation import ReservationIndex
+
+class AsyncCommitStockHandler(CommitStockMixin, AsyncHandler):
+    """ Non-blocking version of CommitStockHandler. Commit the stock reservation of the saga once the payment is created. """
+
+    def __init__(self, context, reservation_index=None):
+        """ Constructor method """
+        self.context = context
+        self.reservation_index = reservation_index or ReservationIndex.get_instance()
+        super().__init__()
+
+    async def run(self):
+        """ Call StoreManager to commit the stock reservation """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("commit_stock_handler_run") as span:
+            reservation_id = self.context.stock_reservation_id
+            span.set_attribute("reservation_id", reservation_id)
+
+            # Réservation déjà expirée : store-api refuserait la confirmation, inutile de l'appeler
+            if not self._is_reservation_live(span, reservation_id):
+                return OrderSagaState.CANCELLING_PAYMENT
+
+            # La confirmation est idempotente (clé : l'id de la saga) : sans réponse définitive, elle est renvoyée
+            attempt = 1
+            while True:
+                try:
+                    with tracer.start_as_current_span("store_api_commit_stock"):
+                        response = await self.http_client.post(**self._build_commit_request(reservation_id))
+                    state = self._handle_response(span, reservation_id, response)
+                except Exception as e:
+                    state = self._handle_error(span, reservation_id, e)
+                if state is not None:
+                    return state
+                delay = self._get_retry_delay(attempt)
+                if delay is None:
+                    return self._handle_unresolved(span, reservation_id, attempt)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def rollback(self):
+        """ Nothing to revert: this is the last step, so it is never compensated """
+        return OrderSagaState.CANCELLING_PAYMENT
@@ -0,0 +1,48 @@
+"""
+Handler: create order (async)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from opentelemetry import trace
+from handlers.async_handler import AsyncHandler
+from handlers.create_order_handler import CreateOrderMixin
+
+class AsyncCreateOrderHandler(CreateOrderMixin, AsyncHandler):
+    """ Non-blocking version of CreateOrderHandler. Handle order creation. Delete order in case of failure. """
+
+    def __init__(self, context):
+        """ Constructor method """
+        self.context = context
+        super().__init__()
+
+    async def run(self):
+        """Call StoreManager to create order"""
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("create_order_handler_run") as span:
+            self._set_run_attributes(span)
+            try:
+                with tracer.start_as_current_span("store_api_create_order"):
+                    response = await self.http_client.post(**self._build_create_request())
+                state = self._handle_create_response(span, response)
+                if self.context.order_id:
+                    await self.record_applied()
+                return state
+            except Exception as e:
+                return self._handle_create_error(span, e)
+
+    async def rollback(self):
+        """Call StoreManager to delete order"""
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("create_order_handler_rollback") as span:
+            span.set_attribute("order_id", self.context.order_id)
+            if self.context.order_id <= 0:
+                return self._skip_delete(span)
+
+            try:
+                with tracer.start_as_current_span("store_api_delete_order"):
+                    response = await self.http_client.delete(**self._build_delete_request())
+                return self._handle_delete_response(span, response)
+            except Exception as e:
+                return self._handle_delete_error(span, e)
@@ -0,0 +1,62 @@
+"""
+Handler: create payment transaction (async)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from opentelemetry import trace
+from handlers.async_handler import AsyncHandler
+from handlers.create_payment_handler import CreatePaymentMixin
+
+class AsyncCreatePaymentHandler(CreatePaymentMixin, AsyncHandler):
+    """ Non-blocking version of CreatePaymentHandler. Handle the creation of a payment transaction for a given order. """
+
+    def __init__(self, context):
+        """ Constructor method """
+        self.context = context
+        super().__init__()
+
+    async def run(self):
+        """Call payment microservice to generate payment transaction"""
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("create_payment_handler_run") as span:
+            span.set_attribute("order_id", self.context.order_id)
+            span.set_attribute("user_id", self.context.user_id or 'unknown')
+
+            try:
+                # Étape 1: Obtenir le total de la commande, seulement si l'étape de création ne l'a pas déjà fourni
+                span.set_attribute("total_amount_from_context", self.context.total_amount is not None)
+                if self.context.total_amount is None:
+                    with tracer.start_as_current_span("get_order_details") as order_span:
+                        order_response = await self.http_client.get(**self._build_order_details_request())
+                        failure_state = self._handle_order_details_response(span, order_span, order_response)
+                        if failure_state is not None:
+                            return failure_state
+                span.set_attribute("total_amount", self.context.total_amount)
+
+                # Étape 2: Créer la transaction de paiement
+                with tracer.start_as_current_span("create_payment_transaction") as payment_span:
+                    payment_response = await self.http_client.post(**self._build_payment_request())
+                    state = self._handle_payment_response(span, payment_span, payment_response)
+                if self.context.payment_id:
+                    await self.record_applied()
+                return state
+
+            except Exception as e:
+                return self._handle_run_error(span, e)
+
+    async def rollback(self):
+        """Call payment microservice to delete payment transaction"""
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("create_payment_handler_rollback") as span:
+            span.set_attribute("payment_id", self.context.payment_id)
+            if self.context.payment_id <= 0:
+                return self._skip_delete(span)
+
+            try:
+                with tracer.start_as_current_span("delete_payment_transaction"):
+                    response = await self.http_client.delete(**self._build_delete_request())
+                return self._handle_delete_response(span, response)
+            except Exception as e:
+                return self._handle_delete_error(span, e)
@@ -0,0 +1,131 @@
+"""
+Handler: decrease stock (async)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+import config
+from opentelemetry import trace
+from handlers.async_handler import AsyncHandler
+from handlers.decrease_stock_handler import DecreaseStockMixin
+from stock_bulk import (RETRY_ALONE, build_stock_bulk_request, get_stock_bulk_resend_delay, get_stock_coalescer, handle_stock_bulk_error,
+                        handle_stock_bulk_response, merge_stock_deltas)
+from tracing import start_item_span
+
+class AsyncDecreaseStockHandler(DecreaseStockMixin, AsyncHandler):
+    """ Non-blocking version of DecreaseStockHandler. Per-item updates run as concurrent tasks instead of threads. """
+
+    def __init__(self, context, concurrency=None, use_bulk=None):
+        """ Constructor method """
+        self.context = context
+        self.order_item_data = context.items
+        self.stock_deltas = merge_stock_deltas(context.items)
+        self.concurrency = max(1, config.STOCK_UPDATE_CONCURRENCY if concurrency is None else concurrency)
+        self.use_bulk = config.STOCK_BULK_UPDATE_ENABLED if use_bulk is None else use_bulk
+        super().__init__()
+
+    async def run(self):
+        """Call StoreManager to decrease stock for each item"""
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("decrease_stock_handler_run") as span:
+            self._set_span_attributes(span, self.order_item_data)
+            try:
+                self.context.applied_stock_deltas = []
+                self.context.applied_stock_deltas, failed_items = await self._update_stock(self.stock_deltas, -1, "decrease", stop_on_failure=True)
+                return self._handle_decrease_result(span, failed_items)
+            except Exception as e:
+                return self._handle_decrease_error(span, e)
+
+    async def rollback(self):
+        """ Call StoreManager to revert stock check out (in other words, check-in the previously checked-out product and quantity) """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("decrease_stock_handler_rollback") as span:
+            self._set_span_attributes(span, self.context.applied_stock_deltas)
+            try:
+                restored_items, failed_items = await self._update_stock(self.context.applied_stock_deltas, 1, "increase", stop_on_failure=False)
+                return self._handle_increase_result(span, restored_items, failed_items)
+            except Exception as e:
+                return self._handle_increase_error(span, e)
+
+    async def _update_stock(self, items, sign, operation, stop_on_failure):
+        """
+        Apply stock deltas in one bulk request if possible, otherwise one request per item. Return (succeeded_items, failed_items).
+        In a batch, stock decreases go through the coalescer, as in DecreaseStockHandler.
+        """
+        coalescer = get_stock_coalescer()
+        if self._can_coalesce(coalescer, sign):
+            coalesced_result = await coalescer.decrease_async(items, self.context.saga_id, getattr(self.http_client, "deadline", None))
+            if coalesced_result is not RETRY_ALONE:
+                result = self._handle_bulk_result(items, sign, coalesced_result, stop_on_failure)
+                if result is not None:
+                    await self._record_applied_deltas(result[0] if sign < 0 else [])
+                    return result
+
+        if self._can_use_bulk(items):
+            result = self._handle_bulk_result(items, sign, await self._update_stock_bulk(items, sign, operation), stop_on_failure)
+            if result is not None:
+                await self._record_applied_deltas(result[0] if sign < 0 else [])
+                return result
+        return await self._update_stock_per_item(items, sign, operation, stop_on_failure)
+
+    async def _update_stock_bulk(self, items, sign, operation):
+        """ Call StoreManager once for all items. Same results and resends as post_stock_bulk. """
+        tracer = trace.get_tracer(__name__)
+        request = build_stock_bulk_request(items, sign, operation, self.context.saga_id)
+
+        with tracer.start_as_current_span(f"store_api_{operation}_stock_bulk") as bulk_span:
+            bulk_span.set_attribute("items_count", len(items))
+            attempt = 1
+            while True:
+                try:
+                    result = handle_stock_bulk_response(bulk_span, await self.http_client.post(**request), operation, self.logger)
+                except Exception as e:
+                    result = handle_stock_bulk_error(bulk_span, e, operation, self.logger, attempt)
+                delay = get_stock_bulk_resend_delay(attempt, request, result, getattr(self.http_client, "deadline", None))
+                if delay is None:
+                    bulk_span.set_attribute("attempts", attempt)
+                    return result
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _update_stock_per_item(self, items, sign, operation, stop_on_failure):
+        """ Send one stock update per item, at most self.concurrency at a time. Return (succeeded_items, failed_items). """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        has_failed = asyncio.Event()
+
+        async def update(i, item):
+            async with semaphore:
+                # Ne pas lancer les requêtes restantes après un échec. Celles déjà en cours se terminent et sont comptabilisées.
+                if stop_on_failure and has_failed.is_set():
+                    return None
+                result = await self._update_item_stock(i, item, sign, operation)
+                if result is not True:
+                    has_failed.set()
+                return result
+
+        results = await asyncio.gather(*(update(i, item) for i, item in enumerate(items)))
+        return self._split_item_results(items, results, sign)
+
+    async def _update_item_stock(self, i, item, sign, operation):
+        """ Call StoreManager to apply a stock delta to a single item. Return True if the update was applied, False if not, BULK_OUTCOME_UNKNOWN if unknown. """
+        tracer = trace.get_tracer(__name__)
+
+        with start_item_span(tracer, f"{operation}_stock_item_{i}", i) as item_span:
+            item_span.set_attribute("product_id", item["product_id"])
+            item_span.set_attribute("quantity", item["quantity"])
+            try:
+                with start_item_span(tracer, f"store_api_{operation}_stock", i):
+                    response = await self.http_client.post(**self._build_item_request(item, sign, operation))
+                result = self._handle_item_response(item_span, item, operation, response)
+            except Exception as e:
+                result = self._handle_item_error(item_span, item, operation, e)
+            if sign < 0 and result is not False:
+                await self._record_applied_deltas([item])
+            return result
+
+    async def _record_applied_deltas(self, items):
+        """ Add stock deltas taken out of the stock to the context and journal it """
+        if self._add_applied_deltas(items):
+            await self.record_applied()
@@ -0,0 +1,73 @@
+"""
+Base async handler class
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+import contextvars
+from abc import ABC, abstractmethod
+from logger import Logger
+from async_http_client import AsyncHttpClient
+from retry_policy import RetryingClient
+
+class AsyncHandler(ABC):
+    """ Parent class of non-blocking handlers. Same contract as Handler, but run and rollback are coroutines. """
+
+    def __init__(self):
+        """ Constructor method """
+        self.logger = Logger.get_instance('Handler')
+        # Message d'erreur du dernier rollback, None s'il a réussi (les rollbacks retournent toujours l'état suivant)
+        self.rollback_error = None
+        self.http_client = AsyncHttpClient.get_instance()
+        # Coroutine appelée par record_applied (voir AsyncSagaController), None sans journal
+        self.on_applied = None
+
+    def configure_requests(self, retry_policy=None, deadline=None, fail_fast=True):
+        """ Apply a retry policy and a deadline (time.monotonic()) to the requests sent by this handler. With fail_fast=False, open circuit breakers are ignored. """
+        self.http_client = RetryingClient(AsyncHttpClient.get_instance(), retry_policy, deadline, fail_fast)
+
+    async def record_applied(self):
+        """ Journal the context as soon as an effect of the step is stored in it, without blocking the event loop (see Handler.record_applied) """
+        if self.on_applied is not None:
+            await self.on_applied()
+
+    @abstractmethod
+    async def run(self):
+        """ Run an operation """
+        pass
+
+    @abstractmethod
+    async def rollback(self):
+        """ Revert the effects of the operation executed by the run method"""
+        pass
+
+class SyncHandlerAdapter(AsyncHandler):
+    """ Wrap a blocking Handler so it can be used by the async saga controller. Each call runs in a worker thread. """
+
+    def __init__(self, handler, executor=None):
+        """ Constructor method """
+        self.handler = handler
+        self.executor = executor
+        self.logger = handler.logger
+
+    def __getattr__(self, name):
+        """ Expose the attributes of the wrapped handler (ex. context) """
+        return getattr(self.handler, name)
+
+    def configure_requests(self, retry_policy=None, deadline=None, fail_fast=True):
+        """ Apply a retry policy, a deadline and the circuit breaker mode to the requests sent by the wrapped handler """
+        self.handler.configure_requests(retry_policy, deadline, fail_fast)
+
+    async def run(self):
+        """ Run the wrapped handler in a worker thread """
+        return await self._call_in_thread(self.handler.run)
+
+    async def rollback(self):
+        """ Roll back the wrapped handler in a worker thread """
+        return await self._call_in_thread(self.handler.rollback)
+
+    async def _call_in_thread(self, method):
+        """ Call a blocking method without blocking the event loop. The current context (ex. active span) is carried to the thread. """
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, ctx.run, method)
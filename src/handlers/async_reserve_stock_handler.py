@@ -0,0 +1,42 @@
+"""
+Handler: reserve stock (async)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from opentelemetry import trace
+from handlers.async_handler import AsyncHandler
+from handlers.reserve_stock_handler import ReserveStockMixin
+from stock_reservation import ReservationIndex
+from tracing import set_item_attributes
+
+class AsyncReserveStockHandler(ReserveStockMixin, AsyncHandler):
+    """ Non-blocking version of ReserveStockHandler. Hold the stock of the order at store-api until CommitStockHandler commits it. """
+
+    def __init__(self, context, reservation_index=None):
+        """ Constructor method """
+        self.context = context
+        self.reservation_index = reservation_index or ReservationIndex.get_instance()
+        super().__init__()
+
+    async def run(self):
+        """ Call StoreManager to reserve the stock of every item """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("reserve_stock_handler_run") as span:
+            span.set_attribute("items_count", len(self.context.items))
+
+            # Ajouter les détails des produits au span principal (limités à TRACING_MAX_ITEM_ATTRIBUTES articles)
+            set_item_attributes(span, self.context.items)
+
+            reservation = self._build_reservation()
+            span.set_attribute("reservation_id", reservation.reservation_id)
+            try:
+                with tracer.start_as_current_span("store_api_reserve_stock"):
+                    response = await self.http_client.post(**self._build_reserve_request(reservation))
+            except Exception as e:
+                return self._handle_reserve_error(span, e)
+            return self._handle_reserve_response(span, reservation, response)
+
+    async def rollback(self):
+        """ Leave the reservation to expire: store-api gives the stock back on its own, without a compensating request """
+        return self._abandon_reservation()
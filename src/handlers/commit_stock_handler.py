@@ -0,0 +1,122 @@
+"""
+Handler: commit stock reservation
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import time
+import config
+from opentelemetry import trace
+from handlers.handler import Handler
+from http_response import get_error_text, is_success
+from order_saga_state import OrderSagaState
+from retry_policy import RetryPolicy, RetryingClient, idempotency_headers
+from stock_reservation import RESERVATION_GONE_STATUS_CODES, ReservationIndex
+
+class CommitStockMixin:
+    """ Requests and response handling of the reservation commit, shared by CommitStockHandler and AsyncCommitStockHandler. They only read the attributes set by the constructors of both. """
+
+    def _is_reservation_live(self, span, reservation_id):
+        if self.reservation_index.is_live(reservation_id, self.context.stock_reservation_expires_at):
+            return True
+        span.set_attribute("success", False)
+        span.set_attribute("expired", True)
+        self.logger.error("La réservation %s a expiré avant la fin du paiement", reservation_id)
+        return False
+
+    def _build_commit_request(self, reservation_id):
+        """ Return the arguments of POST STOCK_RESERVATION_PATH/<reservation_id>/commit """
+        return {
+            "url": f'{config.API_GATEWAY_URL}{config.STOCK_RESERVATION_PATH}/{reservation_id}/commit',
+            "headers": {'Content-Type': 'application/json', **idempotency_headers(self.context.saga_id, "commit_stock")},
+        }
+
+    def _handle_response(self, span, reservation_id, response):
+        """ Return the next state for the response of store-api to the commit, or None if the commit must be sent again (5xx) """
+        if is_success(response):
+            self.reservation_index.commit(reservation_id)
+            span.set_attribute("success", True)
+            self.logger.debug("La confirmation de la réservation du stock a réussi")
+            return OrderSagaState.COMPLETED
+
+        status_code = response.status_code
+        text = get_error_text(response)
+        span.set_attribute("success", False)
+        span.set_attribute("error_code", status_code)
+        span.set_attribute("error_message", str(text))
+        if status_code >= 500:
+            # La gateway ou store-api n'a pas répondu pour de bon : la confirmation a peut-être été appliquée
+            self.logger.warning("Erreur %s lors de la confirmation de la réservation %s, nouvel envoi : %s", status_code, reservation_id, text)
+            return None
+        if status_code in RESERVATION_GONE_STATUS_CODES:
+            span.set_attribute("expired", True)
+            self.logger.error("La réservation %s n'existe plus chez store-api (%s) : %s", reservation_id, status_code, text)
+        else:
+            self.logger.error("Erreur %s lors de la confirmation de la réservation %s : %s", status_code, reservation_id, text)
+        return OrderSagaState.CANCELLING_PAYMENT
+
+    def _handle_error(self, span, reservation_id, error):
+        """ Return None: a commit that raised (timeout, lost connection, open circuit breaker...) must be sent again """
+        span.set_attribute("error_message", str(error))
+        self.logger.warning("La confirmation de la réservation %s a échoué (le stock peut avoir été sorti), nouvel envoi : %s", reservation_id, error)
+        # Le paiement est créé : les nouveaux envois ne sont plus limités par le délai de la saga, comme les compensations
+        if isinstance(self.http_client, RetryingClient):
+            self.http_client.deadline = None
+        return None
+
+    def _get_retry_delay(self, attempt):
+        """ Return the time to wait before sending the commit again, or None once the reservation has expired for STOCK_COMMIT_RETRY_GRACE_SECONDS """
+        expires_at = self.context.stock_reservation_expires_at or time.time()
+        delay = RetryPolicy().get_backoff(attempt)
+        if time.time() + delay >= expires_at + config.STOCK_COMMIT_RETRY_GRACE_SECONDS:
+            return None
+        return delay
+
+    def _handle_unresolved(self, span, reservation_id, attempts):
+        """ Return the next state when store-api never gave a definite answer. The reservation has expired by now: unless the commit went through, the stock is back. """
+        span.set_attribute("success", False)
+        span.set_attribute("commit_attempts", attempts)
+        self.logger.error("Aucune réponse définitive à la confirmation de la réservation %s après %s envois : la saga est compensée, "
+                          "le stock est à vérifier si la confirmation a été appliquée", reservation_id, attempts)
+        return OrderSagaState.CANCELLING_PAYMENT
+
+class CommitStockHandler(CommitStockMixin, Handler):
+    """ Commit the stock reservation of the saga once the payment is created: store-api takes the reserved stock out for good. """
+
+    def __init__(self, context, reservation_index=None):
+        """ Constructor method """
+        self.context = context
+        self.reservation_index = reservation_index or ReservationIndex.get_instance()
+        super().__init__()
+
+    def run(self):
+        """ Call StoreManager to commit the stock reservation """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("commit_stock_handler_run") as span:
+            reservation_id = self.context.stock_reservation_id
+            span.set_attribute("reservation_id", reservation_id)
+
+            # Réservation déjà expirée : store-api refuserait la confirmation, inutile de l'appeler
+            if not self._is_reservation_live(span, reservation_id):
+                return OrderSagaState.CANCELLING_PAYMENT
+
+            # La confirmation est idempotente (clé : l'id de la saga) : sans réponse définitive, elle est renvoyée
+            attempt = 1
+            while True:
+                try:
+                    with tracer.start_as_current_span("store_api_commit_stock"):
+                        response = self.http_client.post(**self._build_commit_request(reservation_id))
+                    state = self._handle_response(span, reservation_id, response)
+                except Exception as e:
+                    state = self._handle_error(span, reservation_id, e)
+                if state is not None:
+                    return state
+                delay = self._get_retry_delay(attempt)
+                if delay is None:
+                    return self._handle_unresolved(span, reservation_id, attempt)
+                time.sleep(delay)
+                attempt += 1
+
+    def rollback(self):
+        """ Nothing to revert: this is the last step, so it is never compensated """
+        return OrderSagaState.CANCELLING_PAYMENT
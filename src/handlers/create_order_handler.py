@@ -4,91 +4,129 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 import config
-import requests
 from opentelemetry import trace
 from logger import Logger
 from handlers.handler import Handler
+from http_response import get_error_text, is_success
 from order_saga_state import OrderSagaState
+from retry_policy import idempotency_headers
+from tracing import set_item_attributes
 
-class CreateOrderHandler(Handler):
+class CreateOrderMixin:
+    """ Requests and response handling of the order creation, shared by CreateOrderHandler and AsyncCreateOrderHandler. They only read the attributes set by the constructors of both. """
+
+    def _set_run_attributes(self, span):
+        span.set_attribute("user_id", self.context.user_id or "unknown")
+        span.set_attribute("items_count", len(self.context.items))
+        # Ajouter les détails des produits au span principal (limités à TRACING_MAX_ITEM_ATTRIBUTES articles)
+        set_item_attributes(span, self.context.items)
+
+    def _build_create_request(self):
+        """ Return the arguments of POST /store-api/orders """
+        return {
+            "url": f'{config.API_GATEWAY_URL}/store-api/orders',
+            "json": self.context.to_order_data(),
+            "headers": {'Content-Type': 'application/json', **idempotency_headers(self.context.saga_id, "create_order")},
+        }
+
+    def _handle_create_response(self, span, response):
+        """ Return the next state for the response of store-api to the order creation """
+        if is_success(response):
+            data = response.json()
+            self.context.order_id = data['order_id'] if data else 0
+            # Garder le total retourné pour éviter que l'étape de paiement récupère la commande à nouveau
+            if data and data.get('total_amount') is not None:
+                self.context.total_amount = data['total_amount']
+            span.set_attribute("order_id", self.context.order_id)
+            span.set_attribute("success", True)
+            self.logger.debug("La création de la commande a réussi")
+            return OrderSagaState.DECREASING_STOCK
+
+        text = get_error_text(response)
+        span.set_attribute("success", False)
+        span.set_attribute("error_code", response.status_code)
+        span.set_attribute("error_message", str(text))
+        self.logger.error("Erreur %s : %s", response.status_code, text)
+        return OrderSagaState.COMPLETED
+
+    def _handle_create_error(self, span, error):
+        span.set_attribute("success", False)
+        span.set_attribute("error_message", str(error))
+        self.logger.error("La création de la commande a échoué : %s", error)
+        return OrderSagaState.COMPLETED
+
+    def _skip_delete(self, span):
+        span.set_attribute("success", True)
+        span.set_attribute("skipped", True)
+        self.logger.debug("Aucune commande à supprimer (order_id = 0)")
+        return OrderSagaState.COMPLETED
+
+    def _build_delete_request(self):
+        """ Return the arguments of DELETE /store-api/orders/<order_id> """
+        return {"url": f'{config.API_GATEWAY_URL}/store-api/orders/{self.context.order_id}'}
+
+    def _handle_delete_response(self, span, response):
+        """ Return the next state for the response of store-api to the order deletion """
+        if is_success(response):
+            data = response.json()
+            self.context.order_id = data['order_id'] if data else 0
+            span.set_attribute("success", True)
+            self.logger.debug("La supression de la commande a réussi")
+            return OrderSagaState.COMPLETED
+
+        text = get_error_text(response)
+        span.set_attribute("success", False)
+        span.set_attribute("error_code", response.status_code)
+        span.set_attribute("error_message", str(text))
+        self.rollback_error = f"Erreur {response.status_code} : {text}"
+        self.logger.error(self.rollback_error)
+        return OrderSagaState.COMPLETED
+
+    def _handle_delete_error(self, span, error):
+        span.set_attribute("success", False)
+        span.set_attribute("error_message", str(error))
+        self.rollback_error = "La supression de la commande a échoué : " + str(error)
+        self.logger.error(self.rollback_error)
+        return OrderSagaState.COMPLETED
+
+class CreateOrderHandler(CreateOrderMixin, Handler):
     """ Handle order creation. Delete order in case of failure. """
 
-    def __init__(self, order_data):
+    def __init__(self, context):
         """ Constructor method """
-        self.order_data = order_data
-        self.order_id = 0
+        self.context = context
         super().__init__()
 
     def run(self):
         """Call StoreManager to create order"""
         tracer = trace.get_tracer(__name__)
-        
+
         with tracer.start_as_current_span("create_order_handler_run") as span:
-            span.set_attribute("user_id", self.order_data.get("user_id", "unknown"))
-            span.set_attribute("items_count", len(self.order_data.get("items", [])))
-            
-            # Ajouter les détails des produits au span principal
-            for idx, item in enumerate(self.order_data.get("items", [])):
-                span.set_attribute(f"product_{idx}_id", item.get("product_id", "unknown"))
-                span.set_attribute(f"product_{idx}_quantity", item.get("quantity", 0))
-            
+            self._set_run_attributes(span)
             try:
                 # ATTENTION: Si vous exécutez ce code dans Docker, n'utilisez pas localhost. Utilisez plutôt le hostname de votre API Gateway
                 with tracer.start_as_current_span("store_api_create_order"):
-                    response = requests.post(f'{config.API_GATEWAY_URL}/store-api/orders',
-                        json=self.order_data,
-                        headers={'Content-Type': 'application/json'}
-                    )
-                    
-                if response.ok:
-                    data = response.json() 
-                    self.order_id = data['order_id'] if data else 0
-                    span.set_attribute("order_id", self.order_id)
-                    span.set_attribute("success", True)
-                    self.logger.debug("La création de la commande a réussi")
-                    return OrderSagaState.DECREASING_STOCK
-                else:
-                    text = response.json() 
-                    span.set_attribute("success", False)
-                    span.set_attribute("error_code", response.status_code)
-                    span.set_attribute("error_message", str(text))
-                    self.logger.error(f"Erreur {response.status_code} : {text}")
-                    return OrderSagaState.COMPLETED
-
+                    response = self.http_client.post(**self._build_create_request())
+                state = self._handle_create_response(span, response)
+                if self.context.order_id:
+                    self.record_applied()
+                return state
             except Exception as e:
-                span.set_attribute("success", False)
-                span.set_attribute("error_message", str(e))
-                self.logger.error("La création de la commande a échoué : " + str(e))
-                return OrderSagaState.COMPLETED
-        
+                return self._handle_create_error(span, e)
+
     def rollback(self):
         """Call StoreManager to delete order"""
         tracer = trace.get_tracer(__name__)
-        
+
         with tracer.start_as_current_span("create_order_handler_rollback") as span:
-            span.set_attribute("order_id", self.order_id)
-            
+            span.set_attribute("order_id", self.context.order_id)
+            if self.context.order_id <= 0:
+                return self._skip_delete(span)
+
             try:
                 # ATTENTION: Si vous exécutez ce code dans Docker, n'utilisez pas localhost. Utilisez plutôt le hostname de votre API Gateway
                 with tracer.start_as_current_span("store_api_delete_order"):
-                    response = requests.delete(f'{config.API_GATEWAY_URL}/store-api/orders/{self.order_id}')
-                    
-                if response.ok:
-                    data = response.json() 
-                    self.order_id = data['order_id'] if data else 0
-                    span.set_attribute("success", True)
-                    self.logger.debug("La supression de la commande a réussi")
-                    return OrderSagaState.COMPLETED
-                else:
-                    text = response.json() 
-                    span.set_attribute("success", False)
-                    span.set_attribute("error_code", response.status_code)
-                    span.set_attribute("error_message", str(text))
-                    self.logger.error(f"Erreur {response.status_code} : {text}")
-                    return OrderSagaState.COMPLETED
-
+                    response = self.http_client.delete(**self._build_delete_request())
+                return self._handle_delete_response(span, response)
             except Exception as e:
-                span.set_attribute("success", False)
-                span.set_attribute("error_message", str(e))
-                self.logger.error("La supression de la commande a échoué : " + str(e))
-                return OrderSagaState.COMPLETED
\ No newline at end of file
+                return self._handle_delete_error(span, e)
@@ -4,119 +4,157 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 import config
-import requests
 from opentelemetry import trace
 from logger import Logger
 from handlers.handler import Handler
+from http_response import get_error_text, is_success
 from order_saga_state import OrderSagaState
+from retry_policy import idempotency_headers
 
-class CreatePaymentHandler(Handler):
+class CreatePaymentMixin:
+    """ Requests and response handling of the payment creation, shared by CreatePaymentHandler and AsyncCreatePaymentHandler. They only read the attributes set by the constructors of both. """
+
+    def _build_order_details_request(self):
+        """ Return the arguments of GET /store-api/orders/<order_id> """
+        return {"url": f'{config.API_GATEWAY_URL}/store-api/orders/{self.context.order_id}'}
+
+    def _handle_order_details_response(self, span, order_span, order_response):
+        """ Keep the total of the order in the context. Return None on success, otherwise the next state of the saga. """
+        if not is_success(order_response):
+            text = get_error_text(order_response)
+            order_span.set_attribute("success", False)
+            order_span.set_attribute("error_code", order_response.status_code)
+            order_span.set_attribute("error_message", str(text))
+            span.set_attribute("success", False)
+            span.set_attribute("failure_step", "get_order_details")
+            self.logger.error("Erreur %s lors de la récupération de la commande: %s", order_response.status_code, text)
+            return OrderSagaState.INCREASING_STOCK
+
+        order_details = order_response.json()
+        self.context.total_amount = order_details.get('total_amount', 0)
+        order_span.set_attribute("success", True)
+        return None
+
+    def _build_payment_request(self):
+        """ Return the arguments of POST /payments-api/payments """
+        return {
+            "url": f'{config.API_GATEWAY_URL}/payments-api/payments',
+            "json": {
+                "order_id": self.context.order_id,
+                "user_id": self.context.user_id,
+                "total_amount": self.context.total_amount
+            },
+            "headers": {'Content-Type': 'application/json', **idempotency_headers(self.context.saga_id, "create_payment")},
+        }
+
+    def _handle_payment_response(self, span, payment_span, payment_response):
+        """ Return the next state for the response of payments-api to the payment creation """
+        if is_success(payment_response):
+            payment_result = payment_response.json()
+            self.context.payment_id = payment_result.get('payment_id', 0)
+            payment_span.set_attribute("success", True)
+            payment_span.set_attribute("payment_id", self.context.payment_id)
+            span.set_attribute("success", True)
+            span.set_attribute("payment_id", self.context.payment_id)
+            self.logger.debug("La création d'une transaction de paiement a réussi")
+            return OrderSagaState.COMPLETED
+
+        text = get_error_text(payment_response)
+        payment_span.set_attribute("success", False)
+        payment_span.set_attribute("error_code", payment_response.status_code)
+        payment_span.set_attribute("error_message", str(text))
+        span.set_attribute("success", False)
+        span.set_attribute("failure_step", "create_payment_transaction")
+        self.logger.error("Erreur %s lors de la création du paiement: %s", payment_response.status_code, text)
+        return OrderSagaState.INCREASING_STOCK
+
+    def _handle_run_error(self, span, error):
+        span.set_attribute("success", False)
+        span.set_attribute("error_message", str(error))
+        self.logger.error("La création d'une transaction de paiement a échoué : %s", error)
+        return OrderSagaState.INCREASING_STOCK
+
+    def _skip_delete(self, span):
+        span.set_attribute("success", True)
+        span.set_attribute("skipped", True)
+        self.logger.debug("Aucun paiement à supprimer (payment_id = 0)")
+        return OrderSagaState.INCREASING_STOCK
+
+    def _build_delete_request(self):
+        """ Return the arguments of DELETE /payments-api/payments/<payment_id> """
+        return {"url": f'{config.API_GATEWAY_URL}/payments-api/payments/{self.context.payment_id}'}
+
+    def _handle_delete_response(self, span, response):
+        """ Return the next state for the response of payments-api to the payment deletion """
+        if is_success(response):
+            span.set_attribute("success", True)
+            self.logger.debug("La suppression d'une transaction de paiement a réussi")
+        else:
+            text = get_error_text(response)
+            span.set_attribute("success", False)
+            span.set_attribute("error_code", response.status_code)
+            span.set_attribute("error_message", str(text))
+            self.rollback_error = f"Erreur {response.status_code} lors de la suppression du paiement: {text}"
+            self.logger.error(self.rollback_error)
+        return OrderSagaState.INCREASING_STOCK
+
+    def _handle_delete_error(self, span, error):
+        span.set_attribute("success", False)
+        span.set_attribute("error_message", str(error))
+        self.rollback_error = "La suppression d'une transaction de paiement a échoué : " + str(error)
+        self.logger.error(self.rollback_error)
+        return OrderSagaState.INCREASING_STOCK
+
+class CreatePaymentHandler(CreatePaymentMixin, Handler):
     """ Handle the creation of a payment transaction for a given order. Trigger rollback of previous steps in case of failure. """
 
-    def __init__(self, order_id, order_data):
+    def __init__(self, context):
         """ Constructor method """
-        self.order_id = order_id
-        self.order_data = order_data
-        self.total_amount = 0
-        self.payment_id = 0
+        self.context = context
         super().__init__()
 
     def run(self):
         """Call payment microservice to generate payment transaction"""
         tracer = trace.get_tracer(__name__)
-        
+
         with tracer.start_as_current_span("create_payment_handler_run") as span:
-            span.set_attribute("order_id", self.order_id)
-            span.set_attribute("user_id", self.order_data.get('user_id', 'unknown'))
-            
+            span.set_attribute("order_id", self.context.order_id)
+            span.set_attribute("user_id", self.context.user_id or 'unknown')
+
             try:
-                # Étape 1: Obtenir le total de la commande
-                with tracer.start_as_current_span("get_order_details") as order_span:
-                    order_response = requests.get(f'{config.API_GATEWAY_URL}/store-api/orders/{self.order_id}')
-                    
-                if not order_response.ok:
-                    text = order_response.json() if order_response.content else "Aucun contenu de réponse"
-                    order_span.set_attribute("success", False)
-                    order_span.set_attribute("error_code", order_response.status_code)
-                    order_span.set_attribute("error_message", str(text))
-                    span.set_attribute("success", False)
-                    span.set_attribute("failure_step", "get_order_details")
-                    self.logger.error(f"Erreur {order_response.status_code} lors de la récupération de la commande: {text}")
-                    return OrderSagaState.INCREASING_STOCK
-                
-                order_details = order_response.json()
-                self.total_amount = order_details.get('total_amount', 0)
-                order_span.set_attribute("success", True)
-                span.set_attribute("total_amount", self.total_amount)
-                
+                # Étape 1: Obtenir le total de la commande, seulement si l'étape de création ne l'a pas déjà fourni
+                span.set_attribute("total_amount_from_context", self.context.total_amount is not None)
+                if self.context.total_amount is None:
+                    with tracer.start_as_current_span("get_order_details") as order_span:
+                        order_response = self.http_client.get(**self._build_order_details_request())
+                        failure_state = self._handle_order_details_response(span, order_span, order_response)
+                        if failure_state is not None:
+                            return failure_state
+                span.set_attribute("total_amount", self.context.total_amount)
+
                 # Étape 2: Créer la transaction de paiement
-                payment_data = {
-                    "order_id": self.order_id,
-                    "user_id": self.order_data.get('user_id'),
-                    "total_amount": self.total_amount
-                }
-                
                 with tracer.start_as_current_span("create_payment_transaction") as payment_span:
-                    payment_response = requests.post(f'{config.API_GATEWAY_URL}/payments-api/payments',
-                        json=payment_data,
-                        headers={'Content-Type': 'application/json'}
-                    )
-                
-                if payment_response.ok:
-                    payment_result = payment_response.json()
-                    self.payment_id = payment_result.get('payment_id', 0)
-                    payment_span.set_attribute("success", True)
-                    payment_span.set_attribute("payment_id", self.payment_id)
-                    span.set_attribute("success", True)
-                    span.set_attribute("payment_id", self.payment_id)
-                    self.logger.debug("La création d'une transaction de paiement a réussi")
-                    return OrderSagaState.COMPLETED
-                else:
-                    text = payment_response.json() if payment_response.content else "Aucun contenu de réponse"
-                    payment_span.set_attribute("success", False)
-                    payment_span.set_attribute("error_code", payment_response.status_code)
-                    payment_span.set_attribute("error_message", str(text))
-                    span.set_attribute("success", False)
-                    span.set_attribute("failure_step", "create_payment_transaction")
-                    self.logger.error(f"Erreur {payment_response.status_code} lors de la création du paiement: {text}")
-                    return OrderSagaState.INCREASING_STOCK
+                    payment_response = self.http_client.post(**self._build_payment_request())
+                    state = self._handle_payment_response(span, payment_span, payment_response)
+                if self.context.payment_id:
+                    self.record_applied()
+                return state
 
             except Exception as e:
-                span.set_attribute("success", False)
-                span.set_attribute("error_message", str(e))
-                self.logger.error("La création d'une transaction de paiement a échoué : " + str(e))
-                return OrderSagaState.INCREASING_STOCK
-        
+                return self._handle_run_error(span, e)
+
     def rollback(self):
         """Call payment microservice to delete payment transaction"""
         tracer = trace.get_tracer(__name__)
-        
+
         with tracer.start_as_current_span("create_payment_handler_rollback") as span:
-            span.set_attribute("payment_id", self.payment_id)
-            
+            span.set_attribute("payment_id", self.context.payment_id)
+            if self.context.payment_id <= 0:
+                return self._skip_delete(span)
+
             try:
-                if self.payment_id > 0:
-                    with tracer.start_as_current_span("delete_payment_transaction"):
-                        response = requests.delete(f'{config.API_GATEWAY_URL}/payments-api/payments/{self.payment_id}')
-                        
-                    if response.ok:
-                        span.set_attribute("success", True)
-                        self.logger.debug("La suppression d'une transaction de paiement a réussi")
-                    else:
-                        text = response.json() if response.content else "Aucun contenu de réponse"
-                        span.set_attribute("success", False)
-                        span.set_attribute("error_code", response.status_code)
-                        span.set_attribute("error_message", str(text))
-                        self.logger.error(f"Erreur {response.status_code} lors de la suppression du paiement: {text}")
-                else:
-                    span.set_attribute("success", True)
-                    span.set_attribute("skipped", True)
-                    self.logger.debug("Aucun paiement à supprimer (payment_id = 0)")
-                
-                return OrderSagaState.INCREASING_STOCK
-                
+                with tracer.start_as_current_span("delete_payment_transaction"):
+                    response = self.http_client.delete(**self._build_delete_request())
+                return self._handle_delete_response(span, response)
             except Exception as e:
-                span.set_attribute("success", False)
-                span.set_attribute("error_message", str(e))
-                self.logger.error("La suppression d'une transaction de paiement a échoué : " + str(e))
-                return OrderSagaState.INCREASING_STOCK
\ No newline at end of file
+                return self._handle_delete_error(span, e)
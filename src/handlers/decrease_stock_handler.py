@@ -3,120 +3,262 @@ Handler: decrease stock
 SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import config
-import requests
-from opentelemetry import trace
+from opentelemetry import context, trace
 from logger import Logger
 from handlers.handler import Handler
+from http_response import get_error_text, is_request_sent, is_success
 from order_saga_state import OrderSagaState
+from retry_policy import idempotency_headers
+from stock_bulk import BULK_OUTCOME_UNKNOWN, RETRY_ALONE, get_stock_coalescer, merge_stock_deltas, post_stock_bulk
+from tracing import set_item_attributes, start_item_span
 
-class DecreaseStockHandler(Handler):
+class DecreaseStockMixin:
+    """ Requests and response handling of the stock decrease, shared by DecreaseStockHandler and AsyncDecreaseStockHandler. They only read the attributes set by the constructors of both. """
+
+    # Moment (time.monotonic) jusqu'auquel on considère que l'endpoint groupé n'existe pas, partagé par toutes les sagas
+    bulk_unsupported_until = 0.0
+
+    def _set_span_attributes(self, span, items):
+        span.set_attribute("items_count", len(items))
+        span.set_attribute("concurrency", self.concurrency)
+        # Ajouter les détails des produits au span principal (limités à TRACING_MAX_ITEM_ATTRIBUTES articles)
+        set_item_attributes(span, items)
+
+    def _handle_decrease_result(self, span, failed_items):
+        """ Return the next state once the stock decrease is done (context.applied_stock_deltas is set) """
+        span.set_attribute("applied_count", len(self.context.applied_stock_deltas))
+        if failed_items:
+            span.set_attribute("success", False)
+            span.set_attribute("failed_count", len(failed_items))
+            # Compenser seulement les articles déjà sortis du stock, puis annuler la commande
+            return OrderSagaState.INCREASING_STOCK if self.context.applied_stock_deltas else OrderSagaState.CANCELLING_ORDER
+
+        span.set_attribute("success", True)
+        self.logger.debug("La sortie des articles du stock a réussi")
+        return OrderSagaState.CREATING_PAYMENT
+
+    def _handle_decrease_error(self, span, error):
+        span.set_attribute("success", False)
+        span.set_attribute("error_message", str(error))
+        self.logger.error("La sortie des articles du stock a échoué : %s", error)
+        return OrderSagaState.INCREASING_STOCK if self.context.applied_stock_deltas else OrderSagaState.CANCELLING_ORDER
+
+    def _handle_increase_result(self, span, restored_items, failed_items):
+        """ Return the next state once the stock is put back. Only the items that could not be restored are kept for a later attempt. """
+        span.set_attribute("success_count", len(restored_items))
+        span.set_attribute("total_items", len(self.context.applied_stock_deltas))
+        self.context.applied_stock_deltas = failed_items
+        if failed_items:
+            self.rollback_error = f"La remise en stock a échoué pour {len(failed_items)} article(s)"
+            self.logger.error(self.rollback_error)
+        else:
+            self.logger.debug("L'entrée des articles dans le stock a réussi")
+        return OrderSagaState.CANCELLING_ORDER
+
+    def _handle_increase_error(self, span, error):
+        span.set_attribute("error_message", str(error))
+        self.rollback_error = "La remise en stock a échoué : " + str(error)
+        self.logger.error(self.rollback_error)
+        return OrderSagaState.CANCELLING_ORDER
+
+    def _can_coalesce(self, coalescer, sign):
+        return self.use_bulk and coalescer is not None and sign < 0 and time.monotonic() >= DecreaseStockMixin.bulk_unsupported_until
+
+    def _can_use_bulk(self, items):
+        return self.use_bulk and len(items) > 1 and time.monotonic() >= DecreaseStockMixin.bulk_unsupported_until
+
+    def _handle_bulk_result(self, items, sign, bulk_result, stop_on_failure):
+        """ Return (succeeded_items, failed_items) for the result of a bulk request, or None to fall back to per-item updates """
+        if bulk_result is None:
+            DecreaseStockMixin.bulk_unsupported_until = time.monotonic() + config.STOCK_BULK_REPROBE_SECONDS
+            return None
+        if bulk_result is True:
+            return items, []
+        if bulk_result is BULK_OUTCOME_UNKNOWN:
+            # Les articles ont peut-être été appliqués. Une sortie du stock est comptée comme appliquée (et en échec) pour être compensée ;
+            # une remise en stock n'est pas renvoyée article par article, ce qui pourrait la doubler : elle sera renvoyée avec la même clé
+            self.logger.error("Issue inconnue de la mise à jour groupée du stock pour %s article(s)", len(items))
+            return (items, items) if sign < 0 else ([], items)
+        if stop_on_failure:
+            return [], items
+        # Compensation : si la requête groupée est refusée ou n'est pas partie, rien n'a été remis en stock, on tente article par article
+        self.logger.debug("La remise en stock groupée a échoué, compensation article par article")
+        return None
+
+    def _build_item_request(self, item, sign, operation):
+        """ Return the arguments of POST /store-api/stocks for one item """
+        return {
+            "url": f'{config.API_GATEWAY_URL}/store-api/stocks',
+            "json": {
+                "product_id": item["product_id"],
+                "quantity": sign * item["quantity"]
+            },
+            "headers": {'Content-Type': 'application/json', **idempotency_headers(self.context.saga_id, f"{operation}_stock:{item['product_id']}")},
+        }
+
+    def _handle_item_response(self, item_span, item, operation, response):
+        """ Return True if store-api applied the stock delta of the item, False if it refused it (4xx), BULK_OUTCOME_UNKNOWN for a 5xx """
+        if not is_success(response):
+            text = get_error_text(response)
+            item_span.set_attribute("success", False)
+            item_span.set_attribute("error_code", response.status_code)
+            item_span.set_attribute("error_message", str(text))
+            self.logger.error("Erreur %s lors de la mise à jour du stock (%s) pour le produit %s: %s", response.status_code, operation, item['product_id'], text)
+            # Une erreur de la gateway ou de store-api ne dit pas si le stock a été modifié
+            return BULK_OUTCOME_UNKNOWN if response.status_code >= 500 else False
+
+        item_span.set_attribute("success", True)
+        return True
+
+    def _handle_item_error(self, item_span, item, operation, error):
+        """ Return BULK_OUTCOME_UNKNOWN if the request that raised may have reached store-api (ex. read timeout), otherwise False """
+        item_span.set_attribute("success", False)
+        item_span.set_attribute("error_message", str(error))
+        self.logger.error("La mise à jour du stock (%s) pour le produit %s a échoué : %s", operation, item['product_id'], error)
+        return BULK_OUTCOME_UNKNOWN if is_request_sent(error) else False
+
+    def _add_applied_deltas(self, items):
+        """ Add stock deltas taken out of the stock to the context while the step runs. Return False if there is nothing to add. """
+        if not items:
+            return False
+        # Nouvelle liste plutôt qu'un ajout : le journal peut lire le contexte pendant ce temps
+        self.context.applied_stock_deltas = self.context.applied_stock_deltas + list(items)
+        return True
+
+    def _split_item_results(self, items, results, sign):
+        """
+        Return (succeeded_items, failed_items) for the results of per-item updates, in the order of items (None: request not sent).
+        An item with an unknown outcome is failed, and counted as applied when stock is taken out, so that it is compensated like in a bulk request.
+        """
+        succeeded = [item for item, result in zip(items, results) if result is True or (result is BULK_OUTCOME_UNKNOWN and sign < 0)]
+        failed = [item for item, result in zip(items, results) if result is False or result is BULK_OUTCOME_UNKNOWN]
+        return succeeded, failed
+
+class DecreaseStockHandler(DecreaseStockMixin, Handler):
     """ Handle the stock check-out of a given list of products and quantities. Trigger rollback of previous steps in case of failure. """
 
-    def __init__(self, order_item_data):
+    def __init__(self, context, concurrency=None, use_bulk=None):
         """ Constructor method """
-        self.order_item_data = order_item_data
+        self.context = context
+        self.order_item_data = context.items
+        self.stock_deltas = merge_stock_deltas(context.items)
+        self.concurrency = max(1, config.STOCK_UPDATE_CONCURRENCY if concurrency is None else concurrency)
+        self.use_bulk = config.STOCK_BULK_UPDATE_ENABLED if use_bulk is None else use_bulk
+        self._applied_lock = threading.Lock()
         super().__init__()
 
     def run(self):
         """Call StoreManager to decrease stock for each item"""
         tracer = trace.get_tracer(__name__)
-        
+
         with tracer.start_as_current_span("decrease_stock_handler_run") as span:
-            span.set_attribute("items_count", len(self.order_item_data))
-            
-            # Ajouter les détails des produits au span principal
-            for idx, item in enumerate(self.order_item_data):
-                span.set_attribute(f"product_{idx}_id", item["product_id"])
-                span.set_attribute(f"product_{idx}_quantity", item["quantity"])
-            
+            self._set_span_attributes(span, self.order_item_data)
             try:
-                for i, item in enumerate(self.order_item_data):
-                    with tracer.start_as_current_span(f"decrease_stock_item_{i}") as item_span:
-                        item_span.set_attribute("product_id", item["product_id"])
-                        item_span.set_attribute("quantity", item["quantity"])
-                        
-                        # Diminuer le stock pour chaque item de la commande
-                        stock_data = {
-                            "product_id": item["product_id"],
-                            "quantity": -item["quantity"]  # Quantité négative pour diminuer le stock
-                        }
-                        
-                        with tracer.start_as_current_span("store_api_decrease_stock"):
-                            response = requests.post(f'{config.API_GATEWAY_URL}/store-api/stocks',
-                                json=stock_data,
-                                headers={'Content-Type': 'application/json'}
-                            )
-                        
-                        if not response.ok:
-                            text = response.json() if response.content else "Aucun contenu de réponse"
-                            item_span.set_attribute("success", False)
-                            item_span.set_attribute("error_code", response.status_code)
-                            item_span.set_attribute("error_message", str(text))
-                            span.set_attribute("success", False)
-                            self.logger.error(f"Erreur {response.status_code} lors de la diminution du stock pour le produit {item['product_id']}: {text}")
-                            return OrderSagaState.CANCELLING_ORDER
-                        else:
-                            item_span.set_attribute("success", True)
-                
-                span.set_attribute("success", True)
-                self.logger.debug("La sortie des articles du stock a réussi")
-                return OrderSagaState.CREATING_PAYMENT
-                
+                # Quantité négative pour diminuer le stock. Les articles sortis sont enregistrés au fur et à mesure, puis dans l'ordre de la commande
+                self.context.applied_stock_deltas = []
+                self.context.applied_stock_deltas, failed_items = self._update_stock(self.stock_deltas, -1, "decrease", stop_on_failure=True)
+                return self._handle_decrease_result(span, failed_items)
             except Exception as e:
-                span.set_attribute("success", False)
-                span.set_attribute("error_message", str(e))
-                self.logger.error("La sortie des articles du stock a échoué : " + str(e))
-                return OrderSagaState.CANCELLING_ORDER
-        
+                return self._handle_decrease_error(span, e)
+
     def rollback(self):
         """ Call StoreManager to revert stock check out (in other words, check-in the previously checked-out product and quantity) """
         tracer = trace.get_tracer(__name__)
-        
+
         with tracer.start_as_current_span("decrease_stock_handler_rollback") as span:
-            span.set_attribute("items_count", len(self.order_item_data))
-            
-            # Ajouter les détails des produits au span principal
-            for idx, item in enumerate(self.order_item_data):
-                span.set_attribute(f"product_{idx}_id", item["product_id"])
-                span.set_attribute(f"product_{idx}_quantity", item["quantity"])
-            
+            self._set_span_attributes(span, self.context.applied_stock_deltas)
+            try:
+                # Quantité positive pour remettre le stock. On continue même en cas d'échec pour compenser autant que possible
+                restored_items, failed_items = self._update_stock(self.context.applied_stock_deltas, 1, "increase", stop_on_failure=False)
+                return self._handle_increase_result(span, restored_items, failed_items)
+            except Exception as e:
+                return self._handle_increase_error(span, e)
+
+    def _update_stock(self, items, sign, operation, stop_on_failure):
+        """
+        Apply stock deltas in one bulk request if possible, otherwise one request per item. Return (succeeded_items, failed_items).
+        In a batch (see saga_batch.py), stock decreases go through the coalescer, which merges those of concurrent sagas into one bulk request.
+        """
+        coalescer = get_stock_coalescer()
+        if self._can_coalesce(coalescer, sign):
+            coalesced_result = coalescer.decrease(items, self.context.saga_id, getattr(self.http_client, "deadline", None))
+            if coalesced_result is not RETRY_ALONE:
+                result = self._handle_bulk_result(items, sign, coalesced_result, stop_on_failure)
+                if result is not None:
+                    self._record_applied_deltas(result[0] if sign < 0 else [])
+                    return result
+
+        if self._can_use_bulk(items):
+            result = self._handle_bulk_result(items, sign, self._update_stock_bulk(items, sign, operation), stop_on_failure)
+            if result is not None:
+                self._record_applied_deltas(result[0] if sign < 0 else [])
+                return result
+        return self._update_stock_per_item(items, sign, operation, stop_on_failure)
+
+    def _update_stock_bulk(self, items, sign, operation):
+        """ Call StoreManager once for all items. Return a result of post_stock_bulk. """
+        return post_stock_bulk(self.http_client, items, sign, operation, self.context.saga_id, self.logger)
+
+    def _update_stock_per_item(self, items, sign, operation, stop_on_failure):
+        """ Send one stock update per item, at most self.concurrency at a time. Return (succeeded_items, failed_items). """
+        if self.concurrency == 1 or len(items) <= 1:
+            results = []
+            for i, item in enumerate(items):
+                results.append(self._update_item_stock(i, item, sign, operation))
+                if results[-1] is not True and stop_on_failure:
+                    break
+            return self._split_item_results(items, results, sign)
+
+        # Les threads du pool ne partagent pas le contexte courant : on le transmet pour garder les spans imbriqués
+        parent_context = context.get_current()
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(items))) as executor:
+            futures = {
+                executor.submit(self._update_item_stock, i, item, sign, operation, parent_context): i
+                for i, item in enumerate(items)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                # Requête annulée après un échec : jamais envoyée, l'article n'est ni appliqué ni en échec
+                if future.cancelled():
+                    continue
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    # Un article en erreur ne doit pas faire perdre ceux déjà appliqués, qu'il faudra compenser
+                    self.logger.error("La mise à jour du stock (%s) pour le produit %s a échoué : %s", operation, items[i]['product_id'], e)
+                    results[i] = False
+                if results[i] is not True and stop_on_failure:
+                    # Ne pas lancer les requêtes restantes. Celles déjà en cours se terminent et sont comptabilisées.
+                    for pending in futures:
+                        pending.cancel()
+
+        return self._split_item_results(items, [results.get(i) for i in range(len(items))], sign)
+
+    def _update_item_stock(self, i, item, sign, operation, parent_context=None):
+        """ Call StoreManager to apply a stock delta to a single item. Return True if the update was applied, False if not, BULK_OUTCOME_UNKNOWN if unknown. """
+        tracer = trace.get_tracer(__name__)
+
+        with start_item_span(tracer, f"{operation}_stock_item_{i}", i, parent_context) as item_span:
+            item_span.set_attribute("product_id", item["product_id"])
+            item_span.set_attribute("quantity", item["quantity"])
             try:
-                success_count = 0
-                for i, item in enumerate(self.order_item_data):
-                    with tracer.start_as_current_span(f"increase_stock_item_{i}") as item_span:
-                        item_span.set_attribute("product_id", item["product_id"])
-                        item_span.set_attribute("quantity", item["quantity"])
-                        
-                        # Remettre le stock pour chaque item de la commande (compensation)
-                        stock_data = {
-                            "product_id": item["product_id"],
-                            "quantity": item["quantity"]  # Quantité positive pour remettre le stock
-                        }
-                        
-                        with tracer.start_as_current_span("store_api_increase_stock"):
-                            response = requests.post(f'{config.API_GATEWAY_URL}/store-api/stocks',
-                                json=stock_data,
-                                headers={'Content-Type': 'application/json'}
-                            )
-                        
-                        if not response.ok:
-                            text = response.json() if response.content else "Aucun contenu de réponse"
-                            item_span.set_attribute("success", False)
-                            item_span.set_attribute("error_code", response.status_code)
-                            item_span.set_attribute("error_message", str(text))
-                            self.logger.error(f"Erreur {response.status_code} lors de la remise en stock du produit {item['product_id']}: {text}")
-                            # Continue quand même avec les autres items pour tenter de compenser autant que possible
-                        else:
-                            item_span.set_attribute("success", True)
-                            success_count += 1
-                
-                span.set_attribute("success_count", success_count)
-                span.set_attribute("total_items", len(self.order_item_data))
-                self.logger.debug("L'entrée des articles dans le stock a réussi")
-                return OrderSagaState.CANCELLING_ORDER
-                
+                with start_item_span(tracer, f"store_api_{operation}_stock", i):
+                    response = self.http_client.post(**self._build_item_request(item, sign, operation))
+                result = self._handle_item_response(item_span, item, operation, response)
             except Exception as e:
-                span.set_attribute("error_message", str(e))
-                self.logger.error("La remise en stock a échoué : " + str(e))
-                return OrderSagaState.CANCELLING_ORDER
\ No newline at end of file
+                result = self._handle_item_error(item_span, item, operation, e)
+            if sign < 0 and result is not False:
+                self._record_applied_deltas([item])
+            return result
+
+    def _record_applied_deltas(self, items):
+        """ Add stock deltas taken out of the stock to the context and journal it (the per-item updates run in several threads) """
+        with self._applied_lock:
+            is_added = self._add_applied_deltas(items)
+        if is_added:
+            self.record_applied()
@@ -4,6 +4,8 @@ SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
 from logger import Logger
+from http_client import HttpClient
+from retry_policy import RetryingClient
 from abc import ABC, abstractmethod
 
 class Handler(ABC):
@@ -12,6 +14,20 @@ class Handler(ABC):
     def __init__(self):
         """ Constructor method """
         self.logger = Logger.get_instance('Handler')
+        # Message d'erreur du dernier rollback, None s'il a réussi (les rollbacks retournent toujours l'état suivant)
+        self.rollback_error = None
+        self.http_client = HttpClient.get_instance()
+        # Appelé par record_applied (voir SagaController) : enregistre le contexte dans le journal de la saga, None sans journal
+        self.on_applied = None
+
+    def configure_requests(self, retry_policy=None, deadline=None, fail_fast=True):
+        """ Apply a retry policy and a deadline (time.monotonic()) to the requests sent by this handler. With fail_fast=False, open circuit breakers are ignored. """
+        self.http_client = RetryingClient(HttpClient.get_instance(), retry_policy, deadline, fail_fast)
+
+    def record_applied(self):
+        """ Journal the context as soon as an effect of the step is stored in it (ex. stock taken out), so that it is compensated if the process stops before the end of the step """
+        if self.on_applied is not None:
+            self.on_applied()
 
     @abstractmethod
     def run(self):
@@ -0,0 +1,117 @@
+"""
+Handler: reserve stock
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import time
+import config
+from opentelemetry import trace
+from handlers.handler import Handler
+from http_response import get_error_text, is_success
+from order_saga_state import OrderSagaState
+from retry_policy import idempotency_headers
+from stock_reservation import ReservationIndex, StockReservation
+from tracing import set_item_attributes
+
+class ReserveStockMixin:
+    """ Requests and response handling of the stock reservation, shared by ReserveStockHandler and AsyncReserveStockHandler. They only read the attributes set by the constructors of both. """
+
+    def _build_reservation(self):
+        """ Return the reservation of this saga. Its id is the saga id, so that a retried request does not hold the stock twice. """
+        # Échéance calculée avant l'envoi : celle de store-api ne peut pas être plus proche
+        return StockReservation(
+            reservation_id=self.context.saga_id,
+            saga_id=self.context.saga_id,
+            items=self.context.items,
+            expires_at=time.time() + config.STOCK_RESERVATION_TTL_SECONDS,
+        )
+
+    def _to_reservation_data(self, reservation):
+        """ Return the body expected by POST STOCK_RESERVATION_PATH """
+        return {
+            "reservation_id": reservation.reservation_id,
+            "items": [{"product_id": item["product_id"], "quantity": item["quantity"]} for item in reservation.items],
+            "ttl_seconds": config.STOCK_RESERVATION_TTL_SECONDS,
+        }
+
+    def _build_reserve_request(self, reservation):
+        """ Return the arguments of POST STOCK_RESERVATION_PATH """
+        return {
+            "url": f'{config.API_GATEWAY_URL}{config.STOCK_RESERVATION_PATH}',
+            "json": self._to_reservation_data(reservation),
+            "headers": {'Content-Type': 'application/json', **idempotency_headers(self.context.saga_id, "reserve_stock")},
+        }
+
+    def _handle_reserve_response(self, span, reservation, response):
+        """ Return the next state for the response of store-api to the reservation """
+        if not is_success(response):
+            text = get_error_text(response)
+            span.set_attribute("success", False)
+            span.set_attribute("error_code", response.status_code)
+            span.set_attribute("error_message", str(text))
+            self.logger.error("Erreur %s lors de la réservation du stock : %s", response.status_code, text)
+            return OrderSagaState.CANCELLING_ORDER
+
+        self._record_reservation(reservation)
+        span.set_attribute("success", True)
+        self.logger.debug("La réservation du stock a réussi")
+        return OrderSagaState.CREATING_PAYMENT
+
+    def _handle_reserve_error(self, span, error):
+        span.set_attribute("success", False)
+        span.set_attribute("error_message", str(error))
+        self.logger.error("La réservation du stock a échoué : %s", error)
+        return OrderSagaState.CANCELLING_ORDER
+
+    def _record_reservation(self, reservation):
+        """ Keep the reservation in the saga context (journaled, for recovery) and in the index """
+        self.context.stock_reservation_id = reservation.reservation_id
+        self.context.stock_reservation_expires_at = reservation.expires_at
+        self.reservation_index.add(reservation)
+
+    def _abandon_reservation(self):
+        """ Forget the reservation of the saga, which will expire at store-api, and return the next state """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("reserve_stock_handler_rollback") as span:
+            span.set_attribute("reservation_id", self.context.stock_reservation_id)
+            if self.context.stock_reservation_id:
+                self.reservation_index.abandon(self.context.stock_reservation_id)
+                self.logger.debug("La réservation %s est abandonnée, elle expirera d'elle-même", self.context.stock_reservation_id)
+            span.set_attribute("success", True)
+            return OrderSagaState.CANCELLING_ORDER
+
+class ReserveStockHandler(ReserveStockMixin, Handler):
+    """
+    Hold the stock of the order at store-api for STOCK_RESERVATION_TTL_SECONDS, in one request. The stock is only taken out when CommitStockHandler commits the reservation.
+    There is nothing to send back on failure: the reservation of a compensated saga is left to expire.
+    """
+
+    def __init__(self, context, reservation_index=None):
+        """ Constructor method """
+        self.context = context
+        self.reservation_index = reservation_index or ReservationIndex.get_instance()
+        super().__init__()
+
+    def run(self):
+        """ Call StoreManager to reserve the stock of every item """
+        tracer = trace.get_tracer(__name__)
+
+        with tracer.start_as_current_span("reserve_stock_handler_run") as span:
+            span.set_attribute("items_count", len(self.context.items))
+
+            # Ajouter les détails des produits au span principal (limités à TRACING_MAX_ITEM_ATTRIBUTES articles)
+            set_item_attributes(span, self.context.items)
+
+            reservation = self._build_reservation()
+            span.set_attribute("reservation_id", reservation.reservation_id)
+            try:
+                with tracer.start_as_current_span("store_api_reserve_stock"):
+                    response = self.http_client.post(**self._build_reserve_request(reservation))
+            except Exception as e:
+                return self._handle_reserve_error(span, e)
+            return self._handle_reserve_response(span, reservation, response)
+
+    def rollback(self):
+        """ Leave the reservation to expire: store-api gives the stock back on its own, without a compensating request """
+        return self._abandon_reservation()
@@ -0,0 +1,230 @@
+"""
+Shared HTTP client
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import config
+from opentelemetry import trace
+from admission_control import record_downstream_request
+from circuit_breaker import CircuitBreakerRegistry, CircuitOpenError, is_failure_status
+from http_response import is_request_sent
+from retry_policy import RetryPolicy, get_remaining_time, parse_retry_after, record_retries, record_retry
+from saga_profiler import get_current_profile
+
+class PoolStats:
+    """ Thread-safe counters describing how connections are obtained from the pool. Used to size the pool. """
+
+    def __init__(self):
+        """ Constructor method """
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.misses = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_checkout(self, wait_time):
+        """ Count a connection taken from the pool and the time spent waiting for it """
+        with self._lock:
+            self.checkouts += 1
+            self.wait_time_total += wait_time
+            if wait_time > self.wait_time_max:
+                self.wait_time_max = wait_time
+
+    def record_miss(self):
+        """ Count a checkout that had to open a new TCP connection """
+        with self._lock:
+            self.misses += 1
+
+    def snapshot(self):
+        """ Return a copy of the counters as a dict """
+        with self._lock:
+            hits = max(self.checkouts - self.misses, 0)
+            return {
+                "checkouts": self.checkouts,
+                "hits": hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / self.checkouts, 4) if self.checkouts else 0.0,
+                "wait_time_total_seconds": round(self.wait_time_total, 6),
+                "wait_time_avg_seconds": round(self.wait_time_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_time_max_seconds": round(self.wait_time_max, 6),
+            }
+
+def _instrumented_pool_class(base_class, stats, pool_timeout):
+    """ Build a urllib3 connection pool class that reports checkouts, misses and wait time to stats """
+
+    class InstrumentedConnectionPool(base_class):
+        def _get_conn(self, timeout=None):
+            # urllib3 attend indéfiniment si le pool est plein et qu'aucun timeout n'est donné
+            if timeout is None:
+                timeout = pool_timeout
+            start = time.perf_counter()
+            conn = super()._get_conn(timeout=timeout)
+            stats.record_checkout(time.perf_counter() - start)
+            return conn
+
+        def _new_conn(self):
+            stats.record_miss()
+            return super()._new_conn()
+
+    InstrumentedConnectionPool.__name__ = f"Instrumented{base_class.__name__}"
+    return InstrumentedConnectionPool
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """ HTTPAdapter whose connection pools feed a PoolStats instance """
+
+    def __init__(self, stats, pool_timeout, **kwargs):
+        """ Constructor method """
+        self.stats = stats
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        """ Initialize the urllib3 PoolManager with instrumented pool classes """
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _instrumented_pool_class(HTTPConnectionPool, self.stats, self.pool_timeout),
+            "https": _instrumented_pool_class(HTTPSConnectionPool, self.stats, self.pool_timeout),
+        }
+
+class HttpClient:
+    """ HTTP client shared by all saga handlers. Keeps connections to the API Gateway alive in a bounded pool. """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, pool_connections=None, pool_maxsize=None, pool_block=None, pool_timeout=None,
+                 connect_timeout=None, read_timeout=None):
+        """ Constructor method """
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else config.HTTP_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else config.HTTP_READ_TIMEOUT,
+        )
+        self.stats = PoolStats()
+        self.session = requests.Session()
+        adapter = PooledHTTPAdapter(
+            self.stats,
+            pool_timeout if pool_timeout is not None else config.HTTP_POOL_TIMEOUT,
+            pool_connections=config.HTTP_POOL_CONNECTIONS if pool_connections is None else pool_connections,
+            pool_maxsize=config.HTTP_POOL_MAXSIZE if pool_maxsize is None else pool_maxsize,
+            pool_block=config.HTTP_POOL_BLOCK if pool_block is None else pool_block,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide client, creating it on first use """
+        if HttpClient._instance is None:
+            with HttpClient._instance_lock:
+                if HttpClient._instance is None:
+                    HttpClient._instance = HttpClient()
+        return HttpClient._instance
+
+    def request(self, method, url, retry_policy=None, deadline=None, fail_fast=True, **kwargs):
+        """
+        Send a request through the pooled session, applying the default (connect, read) timeouts.
+        With a retry_policy, failed attempts are sent again after a backoff. With a deadline (time.monotonic()), the timeouts never go past it.
+        If the circuit breaker of the service is open, CircuitOpenError is raised without sending the request, unless fail_fast is False (ex. compensations).
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        breaker = CircuitBreakerRegistry.get_instance().get_breaker(url)
+        if retry_policy is None and deadline is None:
+            return self._send(breaker, fail_fast, method, url, **kwargs)
+
+        retry_policy = retry_policy or RetryPolicy(max_attempts=1)
+        timeout = kwargs.pop("timeout")
+        attempt = 1
+        backoff_total = 0.0
+        while True:
+            remaining = get_remaining_time(deadline)
+            attempt_timeout = timeout if remaining is None else (min(timeout[0], remaining), min(timeout[1], remaining))
+            try:
+                response = self._send(breaker, fail_fast, method, url, timeout=attempt_timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # Une connexion qui n'a pas pu s'établir n'a rien envoyé : on peut la retenter même pour un POST
+                delay = retry_policy.get_retry_delay(attempt, method, kwargs.get("headers"), is_sent=is_request_sent(e), deadline=deadline)
+                if delay is None:
+                    record_retries(attempt, backoff_total)
+                    raise
+                record_retry(attempt, delay, type(e).__name__)
+            else:
+                delay = retry_policy.get_retry_delay(attempt, method, kwargs.get("headers"), status_code=response.status_code,
+                                                     retry_after=parse_retry_after(response.headers.get("Retry-After")), deadline=deadline)
+                if delay is None:
+                    record_retries(attempt, backoff_total)
+                    return response
+                record_retry(attempt, delay, str(response.status_code))
+                response.close()
+            time.sleep(delay)
+            backoff_total += delay
+            attempt += 1
+
+    def _send(self, breaker, fail_fast, method, url, **kwargs):
+        """ Send one request, after checking the circuit breaker of the service, and report the outcome to it """
+        if breaker is None:
+            return self._request(method, url, **kwargs)
+        if fail_fast and not breaker.allow_request():
+            trace.get_current_span().set_attribute("circuit_breaker_rejected", breaker.name)
+            raise CircuitOpenError(f"Disjoncteur {breaker.name} ouvert : requête {method} {url} non envoyée")
+        try:
+            response = self._request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            breaker.record_failure()
+            raise
+        if is_failure_status(response.status_code):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    def _request(self, method, url, **kwargs):
+        """
+        Send the request. Its duration is reported to the admission controller (ADMISSION_CONTROL_ENABLED),
+        and to the timeline of the saga if it is profiled (SAGA_PROFILER_ENABLED).
+        """
+        profile = get_current_profile()
+        if profile is None and not config.ADMISSION_CONTROL_ENABLED:
+            return self.session.request(method, url, **kwargs)
+        start = time.perf_counter()
+        status_code = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            duration = time.perf_counter() - start
+            record_downstream_request(duration, status_code)
+            if profile is not None:
+                profile.record_request(method, url, start, duration, status_code)
+
+    def get(self, url, **kwargs):
+        """ Send a GET request """
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """ Send a POST request """
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        """ Send a DELETE request """
+        return self.request("DELETE", url, **kwargs)
+
+    def get_stats(self):
+        """ Return pool counters and the current pool configuration """
+        adapter = self.session.get_adapter("http://")
+        stats = self.stats.snapshot()
+        stats["pool_connections"] = adapter._pool_connections
+        stats["pool_maxsize"] = adapter._pool_maxsize
+        stats["pool_block"] = adapter._pool_block
+        stats["connect_timeout_seconds"] = self.timeout[0]
+        stats["read_timeout_seconds"] = self.timeout[1]
+        return stats
+
+    def close(self):
+        """ Close every pooled connection """
+        self.session.close()
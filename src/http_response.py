@@ -0,0 +1,34 @@
+"""
+HTTP response helpers
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import httpx
+import requests
+from urllib3.exceptions import NewConnectionError
+
+def is_success(response):
+    """ Return True for a 2xx response. Works with requests and httpx responses, which do not agree on 3xx (Response.ok vs is_success). """
+    return 200 <= response.status_code < 300
+
+def get_error_text(response):
+    """ Return the body of an error response, for logs and spans: the decoded JSON if possible, otherwise the raw text """
+    if not response.content:
+        return "Aucun contenu de réponse"
+    try:
+        return response.json()
+    except ValueError:
+        # Page d'erreur HTML d'un proxy, corps tronqué... : le texte brut suffit pour le diagnostic
+        return response.text
+
+def is_request_sent(error):
+    """
+    Return True if the request that raised this error may have reached the server, so its effect is unknown (ex. read timeout, connection lost).
+    A connection that could not be established, an open circuit breaker or a passed deadline send nothing.
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return not isinstance(error, requests.ConnectTimeout) and not isinstance(reason, NewConnectionError)
+    if isinstance(error, httpx.TransportError):
+        return not isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+    return False
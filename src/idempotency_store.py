@@ -0,0 +1,104 @@
+"""
+Idempotency store
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import config
+
+# Refus temporaires (trop de requêtes, service indisponible) : la clé est oubliée pour que le client puisse renvoyer sa requête
+TEMPORARY_REFUSAL_STATUS_CODES = (429, 503)
+
+class IdempotencyEntry:
+    """ Response of the first request sent with a given Idempotency-Key. The future is resolved with that response when the request finishes. """
+
+    def __init__(self, fingerprint):
+        """ Constructor method """
+        self.fingerprint = fingerprint
+        self.future = Future()
+        self.expires_at = None
+
+class IdempotencyStore:
+    """
+    In-memory store of responses indexed by Idempotency-Key, with a TTL and LRU eviction.
+    The first request with a key runs the saga; concurrent duplicates wait for its response and later duplicates receive the stored response.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, ttl_seconds=None, max_entries=None):
+        """ Constructor method """
+        self.ttl_seconds = config.IDEMPOTENCY_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = config.IDEMPOTENCY_MAX_ENTRIES if max_entries is None else max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide store, creating it on first use """
+        if IdempotencyStore._instance is None:
+            with IdempotencyStore._instance_lock:
+                if IdempotencyStore._instance is None:
+                    IdempotencyStore._instance = IdempotencyStore()
+        return IdempotencyStore._instance
+
+    @staticmethod
+    def fingerprint(payload):
+        """ Hash of the request payload, used to detect a key reused for a different request """
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def begin(self, key, payload):
+        """ Return (entry, is_first). If is_first is True, the caller must run the request then call finish (or complete or discard). """
+        fingerprint = self.fingerprint(payload)
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry, False
+
+            entry = IdempotencyEntry(fingerprint)
+            self.entries[key] = entry
+            self._evict()
+            return entry, True
+
+    def _evict(self):
+        """ Remove the least recently used responses beyond max_entries. A request still in progress is kept: its duplicates would start a new saga. """
+        while len(self.entries) > self.max_entries:
+            oldest_key = next((key for key, entry in self.entries.items() if entry.expires_at is not None), None)
+            if oldest_key is None:
+                return
+            del self.entries[oldest_key]
+
+    def finish(self, key, entry, response):
+        """ Complete the first request with its response, or discard the key if the response is a temporary refusal (TEMPORARY_REFUSAL_STATUS_CODES) """
+        if response[1] in TEMPORARY_REFUSAL_STATUS_CODES:
+            self.discard(key, entry, response)
+        else:
+            self.complete(key, entry, response)
+
+    def complete(self, key, entry, response):
+        """ Store the response of the first request and wake up the duplicates waiting for it """
+        with self._lock:
+            entry.expires_at = time.monotonic() + self.ttl_seconds
+        entry.future.set_result(response)
+
+    def discard(self, key, entry, response):
+        """ Forget a key whose response must not be replayed (ex. 429, unexpected error). Waiting duplicates still receive this response. """
+        with self._lock:
+            if self.entries.get(key) is entry:
+                del self.entries[key]
+        entry.future.set_result(response)
+
+    def get_stats(self):
+        """ Return the number of stored keys """
+        return {"entries": len(self.entries), "max_entries": self.max_entries, "ttl_seconds": self.ttl_seconds}
@@ -3,42 +3,152 @@ Logger
 SPDX-License-Identifier: LGPL-3.0-or-later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
+import atexit
+import json
 import logging
+import queue
 import sys
+import threading
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+import config
+from opentelemetry import context as otel_context
+
+# Clé du contexte OpenTelemetry qui porte le saga_id : le contexte est déjà transmis aux threads des étapes parallèles
+SAGA_ID_CONTEXT_KEY = otel_context.create_key("saga_id")
+
+@contextmanager
+def saga_log_context(saga_id):
+    """ Add saga_id to the records logged in this block (including by the threads that receive the current OpenTelemetry context) """
+    token = otel_context.attach(otel_context.set_value(SAGA_ID_CONTEXT_KEY, saga_id))
+    try:
+        yield
+    finally:
+        otel_context.detach(token)
+
+class SagaIdFilter(logging.Filter):
+    """ Set record.saga_id to the saga being executed by the current thread or task ("-" if none) """
+
+    def filter(self, record):
+        # En mode asynchrone, le saga_id a déjà été lu dans le thread appelant
+        if not hasattr(record, "saga_id"):
+            record.saga_id = otel_context.get_value(SAGA_ID_CONTEXT_KEY) or "-"
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """ Format a record as one JSON object per line """
+
+    def format(self, record):
+        entry = {
+            "timestamp": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "saga_id": getattr(record, "saga_id", "-"),
+            "thread": record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class DroppingQueueHandler(QueueHandler):
+    """ QueueHandler for a bounded queue: when the queue is full, the record is dropped and counted instead of blocking the caller """
+
+    def __init__(self, log_queue):
+        """ Constructor method """
+        super().__init__(log_queue)
+        self.dropped_count = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped_count += 1
 
 class Logger:
-    """ This class logs messages to the terminal """
-    
+    """
+    This class logs messages to the terminal.
+    With LOG_ASYNC=true, loggers only put records in a bounded queue (LOG_QUEUE_MAX_SIZE); a listener thread formats them and writes them to stdout,
+    so a slow stdout never blocks the sagas. Records that do not fit in the queue are dropped and counted (see get_dropped_count).
+    Use %-style arguments (logger.debug("... %s", value)): the message is only built if the level is enabled.
+    """
+
+    _output_handlers = None
+    _queue_handler = None
+    _listener = None
+    _setup_lock = threading.Lock()
+
     @staticmethod
-    def get_instance(name: str, level=logging.DEBUG, log_to_file=False):
+    def get_instance(name: str, level=None, log_to_file=False):
         """ Set up a logger to stdout. Works for both the Docker terminal and the host machine terminal """
         logger = logging.getLogger(name)
-        logger.setLevel(level)
-        logger.propagate = False
-        
+
         # Prevent duplicate handlers if logger already exists
         if logger.handlers:
             return logger
-        
+
+        with Logger._setup_lock:
+            if logger.handlers:
+                return logger
+            logger.setLevel(config.LOG_LEVEL if level is None else level)
+            logger.propagate = False
+            for handler in Logger._get_handlers(log_to_file):
+                logger.addHandler(handler)
+
+            # Ensure root logger doesn't interfere
+            logging.root.setLevel(logging.WARNING)
+
+        return logger
+
+    @staticmethod
+    def get_dropped_count():
+        """ Return the number of records dropped because the log queue was full """
+        return Logger._queue_handler.dropped_count if Logger._queue_handler is not None else 0
+
+    @staticmethod
+    def _get_handlers(log_to_file):
+        """ Return the handlers shared by every logger: the queue handler in async mode, the output handlers otherwise """
+        if Logger._output_handlers is None:
+            Logger._output_handlers = Logger._create_output_handlers()
+        output_handlers = list(Logger._output_handlers)
+
+        # File handler (.log file, optional)
+        if log_to_file:
+            file_handler = logging.FileHandler("sensors_visualization.log")
+            file_handler.setFormatter(Logger._output_handlers[0].formatter)
+            file_handler.addFilter(SagaIdFilter())
+            output_handlers.append(file_handler)
+
+        if not config.LOG_ASYNC:
+            return output_handlers
+
+        if Logger._queue_handler is None:
+            Logger._queue_handler = DroppingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_MAX_SIZE))
+            # Le saga_id est lu dans le thread appelant, avant la mise en file
+            Logger._queue_handler.addFilter(SagaIdFilter())
+            Logger._listener = QueueListener(Logger._queue_handler.queue, *Logger._output_handlers, respect_handler_level=True)
+            Logger._listener.start()
+            # Écrire les messages encore en file avant la fin du processus
+            atexit.register(Logger._listener.stop)
+        return [Logger._queue_handler] + output_handlers[len(Logger._output_handlers):]
+
+    @staticmethod
+    def _create_output_handlers():
         # Format of the string that will be logged
-        formatter = logging.Formatter(
-            fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        
+        if config.LOG_FORMAT == "json":
+            formatter = JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S')
+        else:
+            formatter = logging.Formatter(
+                fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
+
         # Console Handler (stdout)
         console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(level)
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
-
-        # File handler (.log file, optional)
-        if (log_to_file):
-            fileHandler = logging.FileHandler("sensors_visualization.log")
-            fileHandler.setFormatter(formatter)
-            logger.addHandler(fileHandler)
-        
-        # Ensure root logger doesn't interfere
-        logging.root.setLevel(logging.WARNING)
-        
-        return logger
\ No newline at end of file
+        console_handler.addFilter(SagaIdFilter())
+        return [console_handler]
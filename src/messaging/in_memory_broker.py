@@ -0,0 +1,47 @@
+"""
+In-memory message broker
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from messaging.message_broker import MessageBroker
+
+class InMemoryBroker(MessageBroker):
+    """
+    Broker kept in the memory of the process: one queue per topic, shared by the threads of the process.
+    Messages are not redelivered, and are lost if the process stops: a saga interrupted this way is compensated from the journal at the next startup.
+    """
+
+    def __init__(self):
+        """ Constructor method """
+        self.queues = defaultdict(deque)
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+
+    def publish(self, messages, acked=()):
+        """ Append a batch of messages to their topics (a received message needs no acknowledgement) """
+        if not messages:
+            return
+        with self._condition:
+            for message in messages:
+                message.message_id = next(self._ids)
+                self.queues[message.topic].append(message)
+            self._condition.notify_all()
+
+    def receive(self, topic, max_messages=1, timeout=None):
+        """ Remove and return up to max_messages messages of a topic, waiting at most timeout seconds for the first one """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            queue = self.queues[topic]
+            while not queue:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return []
+                self._condition.wait(remaining)
+            messages = [queue.popleft() for _ in range(min(max_messages, len(queue)))]
+        for message in messages:
+            message.attempts += 1
+        return messages
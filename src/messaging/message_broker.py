@@ -0,0 +1,74 @@
+"""
+Message broker
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import importlib
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+import config
+
+# Commandes envoyées aux handlers des étapes, et réponses retournées à l'orchestrateur
+COMMANDS_TOPIC = "saga.commands"
+REPLIES_TOPIC = "saga.replies"
+
+@dataclass
+class Message:
+    """ One message of a topic. message_id is set by the broker when the message is published; attempts counts its deliveries. """
+    topic: str
+    body: dict
+    message_id: object = None
+    attempts: int = 0
+    headers: dict = field(default_factory=dict)
+
+class MessageBroker(ABC):
+    """
+    Parent broker class. Delivery is at least once: a message received is delivered again if it is not acknowledged
+    (published in acked) before MESSAGE_VISIBILITY_TIMEOUT_SECONDS, so consumers must tolerate duplicates.
+    The broker used by the process is chosen by MESSAGE_BROKER_BACKEND: memory, sqlite, or the path of a class (module.Class) taking no argument.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide broker, creating it on first use """
+        if MessageBroker._instance is None:
+            with MessageBroker._instance_lock:
+                if MessageBroker._instance is None:
+                    MessageBroker._instance = create_message_broker(config.MESSAGE_BROKER_BACKEND)
+        return MessageBroker._instance
+
+    @abstractmethod
+    def publish(self, messages, acked=()):
+        """ Publish a batch of messages and acknowledge the messages in acked, atomically if the backend supports it """
+        pass
+
+    @abstractmethod
+    def receive(self, topic, max_messages=1, timeout=None):
+        """ Return up to max_messages messages of a topic, waiting at most timeout seconds for the first one (empty list if none arrived) """
+        pass
+
+    def extend_visibility(self, messages):
+        """ Keep received messages invisible for another visibility timeout while they are being processed (nothing to do without redelivery) """
+        pass
+
+    def close(self):
+        """ Release the resources of the broker """
+        pass
+
+def create_message_broker(backend):
+    """ Create the broker of a backend: memory, sqlite, or the path of a broker class (module.Class) """
+    if backend == "memory":
+        from messaging.in_memory_broker import InMemoryBroker
+        return InMemoryBroker()
+    if backend == "sqlite":
+        from messaging.sqlite_broker import SqliteBroker
+        return SqliteBroker()
+    module_name, _, class_name = backend.rpartition(".")
+    if not module_name:
+        raise ValueError(f"Courtier de messages inconnu : {backend}")
+    broker_class = getattr(importlib.import_module(module_name), class_name)
+    return broker_class()
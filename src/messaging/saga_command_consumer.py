@@ -0,0 +1,161 @@
+"""
+Saga command consumer
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+import time
+import config
+from opentelemetry import context as otel_context, propagate, trace
+from logger import Logger, saga_log_context
+from messaging.message_broker import COMMANDS_TOPIC, Message, MessageBroker
+from retry_policy import get_compensation_deadline
+
+class SagaCommandConsumer:
+    """
+    Execute the commands of the message transport (SAGA_TRANSPORT=messaging): each command asks to run or roll back one step of a saga.
+    A new handler of the step is created with the context carried by the command, so any process sharing the broker can execute it.
+    The reply (state returned by the handler, updated context) is published to the reply topic of the orchestrator in the same operation that acknowledges the command.
+    MESSAGE_CONSUMER_CONCURRENCY threads receive one command at a time: they bound the handler calls in progress, whatever the number of sagas waiting.
+    While a command is being executed, its visibility is extended every third of the visibility timeout of the broker:
+    a long handler call (ex. a compensation retried without deadline) is not delivered again to another consumer.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, definition, context_class, broker=None, concurrency=None):
+        """ Constructor method """
+        self.definition = definition
+        self.context_class = context_class
+        self.broker = broker or MessageBroker.get_instance()
+        self.concurrency = config.MESSAGE_CONSUMER_CONCURRENCY if concurrency is None else concurrency
+        self.logger = Logger.get_instance('SagaCommandConsumer')
+        self._is_stopping = False
+        self._threads = []
+        # Commandes en cours d'exécution, par message_id : leur visibilité est prolongée tant qu'elles ne sont pas acquittées
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide consumer of the order saga commands, started on first use """
+        if SagaCommandConsumer._instance is None:
+            with SagaCommandConsumer._instance_lock:
+                if SagaCommandConsumer._instance is None:
+                    from order_saga_context import OrderSagaContext
+                    from order_saga_definition import ORDER_SAGA_DEFINITION
+                    consumer = SagaCommandConsumer(ORDER_SAGA_DEFINITION, OrderSagaContext)
+                    consumer.start()
+                    SagaCommandConsumer._instance = consumer
+        return SagaCommandConsumer._instance
+
+    def start(self):
+        """ Start the consumer threads """
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._consume_loop, name=f"saga-consumer-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._extend_visibility_loop, name="saga-consumer-visibility", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """ Stop receiving commands and wait for the commands being executed """
+        self._is_stopping = True
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _consume_loop(self):
+        while not self._is_stopping:
+            try:
+                commands = self.broker.receive(COMMANDS_TOPIC, 1, timeout=1)
+            except Exception as e:
+                self.logger.error("Impossible de recevoir les commandes de saga : %s", e)
+                time.sleep(1)
+                continue
+            for command in commands:
+                with self._in_flight_lock:
+                    self._in_flight[command.message_id] = command
+                try:
+                    self.broker.publish([self.handle(command)], acked=[command])
+                except Exception as e:
+                    # Non acquittée, la commande sera livrée de nouveau après MESSAGE_VISIBILITY_TIMEOUT_SECONDS
+                    self.logger.error("La commande %s n'a pas pu être traitée : %s", command.message_id, e)
+                finally:
+                    with self._in_flight_lock:
+                        self._in_flight.pop(command.message_id, None)
+
+    def _extend_visibility_loop(self):
+        visibility_timeout = getattr(self.broker, "visibility_timeout", config.MESSAGE_VISIBILITY_TIMEOUT_SECONDS)
+        while not self._stopped.wait(visibility_timeout / 3):
+            with self._in_flight_lock:
+                commands = list(self._in_flight.values())
+            try:
+                self.broker.extend_visibility(commands)
+            except Exception as e:
+                self.logger.error("Impossible de prolonger la visibilité des commandes en cours : %s", e)
+
+    def handle(self, command):
+        """ Call the handler of the step named in the command and return the reply message """
+        body = command.body
+        context = self.context_class.from_dict(body["context"])
+        try:
+            step = self.definition.get_step(body["step"])
+        except KeyError:
+            # Définition différente de celle de l'orchestrateur : l'étape échoue tout de suite, la saga est compensée au lieu d'attendre
+            self.logger.error("Étape %s inconnue de la saga %s : vérifiez que tous les processus ont la même configuration", body["step"], body["saga"])
+            return self._build_reply(body, body["step"], None, f"Étape inconnue : {body['step']}", context, 0.0)
+        deadline_at = body.get("deadline_at")
+        if body["action"] == "run" and deadline_at is not None and time.time() >= deadline_at:
+            # L'orchestrateur a cessé d'attendre cette réponse (ou va le faire) : l'étape n'est pas commencée
+            self.logger.warning("Commande %s de la saga %s reçue après son échéance, étape non exécutée", body["step"], body["saga_id"])
+            return self._build_reply(body, step.name, None, "Échéance de l'étape dépassée", context, 0.0)
+        tracer = trace.get_tracer(__name__)
+
+        # Les spans des handlers rejoignent la trace de la saga, transmise dans les en-têtes de la commande
+        token = otel_context.attach(propagate.extract(command.headers))
+        try:
+            with saga_log_context(body["saga_id"]), tracer.start_as_current_span(step.name if body["action"] == "run" else f"rollback_{step.name}"):
+                start = time.perf_counter()
+                state = None
+                error = None
+                try:
+                    handler = step.handler_class(context)
+                    if body["action"] == "run":
+                        # Échéance de la saga convertie en time.monotonic() : l'horloge monotone n'est pas partagée entre processus
+                        handler.configure_requests(step.retry_policy, time.monotonic() + deadline_at - time.time() if deadline_at is not None else None)
+                        state = handler.run()
+                    else:
+                        # Une compensation doit être tentée même si le disjoncteur du service est ouvert, et même après l'échéance de la saga : elle a son propre délai
+                        handler.configure_requests(step.retry_policy, get_compensation_deadline(), fail_fast=False)
+                        state = handler.rollback()
+                        error = handler.rollback_error
+                except Exception as e:
+                    error = str(e)
+                    self.logger.error("L'étape %s (%s) de la saga %s a échoué : %s", step.name, body["action"], body["saga_id"], e)
+                duration = time.perf_counter() - start
+        finally:
+            otel_context.detach(token)
+
+        return self._build_reply(body, step.name, state, error, context, duration)
+
+    def _build_reply(self, body, step_name, state, error, context, duration):
+        """ Return the reply to a command: state returned by the handler (None if it failed), error of a rollback, updated context """
+        return Message(topic=body["reply_to"], body={
+            "saga_id": body["saga_id"],
+            "sequence": body["sequence"],
+            "step": step_name,
+            "action": body["action"],
+            "state": state.name if state is not None else None,
+            "error": error,
+            "context": context.to_dict(),
+            "duration": duration,
+        })
+
+# Consommateurs seuls, dans un processus séparé de l'orchestrateur (MESSAGE_BROKER_BACKEND=sqlite, même base)
+if __name__ == '__main__':
+    SagaCommandConsumer.get_instance()
+    threading.Event().wait()
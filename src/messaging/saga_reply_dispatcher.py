@@ -0,0 +1,143 @@
+"""
+Saga reply dispatcher
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+import time
+from collections import OrderedDict
+import config
+from logger import Logger, saga_log_context
+from messaging.message_broker import REPLIES_TOPIC, MessageBroker
+
+class SagaReplyDispatcher:
+    """
+    Drive the sagas of the message transport from their replies, on one thread for the whole process.
+    Up to MESSAGE_BATCH_SIZE replies are received at once and passed to the controllers of their sagas; the commands of the next stages are then
+    published in one batch, once the transitions they follow are durable in the journal, and in the same operation that acknowledges the replies.
+    Each process has its own reply topic, named after MESSAGE_INSTANCE_ID, so the replies of its sagas are never received by another orchestrator sharing the broker.
+    The topic stays the same when the process is restarted: the replies sent to the previous process are received and dropped instead of piling up.
+    A reply that cannot be applied is not acknowledged, so it is delivered again; a reply that does not arrive in time is replaced by a failure.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, broker=None, batch_size=None):
+        """ Constructor method """
+        self.broker = broker or MessageBroker.get_instance()
+        self.batch_size = config.MESSAGE_BATCH_SIZE if batch_size is None else batch_size
+        self.reply_topic = f"{REPLIES_TOPIC}.{config.MESSAGE_INSTANCE_ID}"
+        self.logger = Logger.get_instance('SagaReplyDispatcher')
+        # Contrôleurs des sagas en cours, par saga_id
+        self.sagas = {}
+        # État final des sagas terminées récemment (SAGA_STATUS_MAX_ENTRIES au plus), par saga_id
+        self.finished = OrderedDict()
+        self._next_expiry_check = 0.0
+        self._is_stopping = False
+        self._thread = threading.Thread(target=self._dispatch_loop, name="saga-reply-dispatcher", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide dispatcher, creating it on first use """
+        if SagaReplyDispatcher._instance is None:
+            with SagaReplyDispatcher._instance_lock:
+                if SagaReplyDispatcher._instance is None:
+                    SagaReplyDispatcher._instance = SagaReplyDispatcher()
+        return SagaReplyDispatcher._instance
+
+    def start(self, controller):
+        """ Register a saga and publish the commands of its first stage """
+        self.sagas[controller.saga_id] = controller
+        try:
+            with saga_log_context(controller.saga_id):
+                commands = controller.advance()
+            self._publish([controller], commands)
+        except Exception:
+            self.sagas.pop(controller.saga_id, None)
+            raise
+
+    def dispatch(self, replies):
+        """ Pass a batch of replies to their sagas, then publish the commands that follow and acknowledge the replies that were applied """
+        controllers = []
+        commands = []
+        acked = [reply for reply in replies if self._apply_reply(reply.body, controllers, commands)]
+        self._publish(controllers, commands, acked)
+
+    def expire_replies(self):
+        """ Fail the commands whose reply is overdue (MessageSagaController.get_overdue_replies), then publish the compensations that follow """
+        controllers = []
+        commands = []
+        now = time.monotonic()
+        for controller in list(self.sagas.values()):
+            for reply in controller.get_overdue_replies(now):
+                self._apply_reply(reply, controllers, commands)
+        if controllers:
+            self._publish(controllers, commands)
+
+    def _apply_reply(self, reply, controllers, commands):
+        """ Pass one reply to its saga. Return False if it could not be applied: it must not be acknowledged. """
+        controller = self.sagas.get(reply["saga_id"])
+        if controller is None:
+            # Saga déjà terminée (commande livrée deux fois, réponse arrivée après son échéance) ou saga d'un processus précédent
+            self.logger.warning("Réponse ignorée pour la saga inconnue %s (étape %s)", reply["saga_id"], reply["step"])
+            return True
+        if controller not in controllers:
+            controllers.append(controller)
+        with saga_log_context(controller.saga_id):
+            try:
+                commands.extend(controller.on_reply(reply))
+            except Exception as e:
+                self.logger.error("La réponse de l'étape %s n'a pas pu être appliquée : %s", reply["step"], e)
+                return False
+        return True
+
+    def _publish(self, controllers, commands, acked=()):
+        # Les transitions doivent être durables avant que les commandes qui les suivent ne soient visibles
+        for controller in controllers:
+            controller.flush_journal()
+        self.broker.publish(commands, acked)
+        for controller in controllers:
+            if controller.is_finished():
+                self.finished[controller.saga_id] = self._build_status(controller)
+                while len(self.finished) > config.SAGA_STATUS_MAX_ENTRIES:
+                    self.finished.popitem(last=False)
+                self.sagas.pop(controller.saga_id, None)
+                controller.result.set_result(None)
+
+    def get_status(self, saga_id):
+        """ Return the current state of a saga driven by this process, or None if it is unknown """
+        controller = self.sagas.get(saga_id)
+        if controller is not None:
+            return self._build_status(controller)
+        return self.finished.get(saga_id)
+
+    def _build_status(self, controller):
+        status = {
+            "saga_id": controller.saga_id,
+            "status": "DONE" if controller.is_finished() else "RUNNING",
+            "state": controller.current_saga_state.name,
+            "order_id": controller.context.to_dict().get("order_id", 0),
+        }
+        if controller.is_finished():
+            status["outcome"] = controller._get_outcome()
+        return status
+
+    def _dispatch_loop(self):
+        while not self._is_stopping:
+            try:
+                replies = self.broker.receive(self.reply_topic, self.batch_size, timeout=1)
+                if replies:
+                    self.dispatch(replies)
+                if time.monotonic() >= self._next_expiry_check:
+                    self._next_expiry_check = time.monotonic() + 1
+                    self.expire_replies()
+            except Exception as e:
+                self.logger.error("Impossible de traiter les réponses des sagas : %s", e)
+                time.sleep(1)
+
+    def stop(self, timeout=None):
+        """ Stop receiving replies """
+        self._is_stopping = True
+        self._thread.join(timeout)
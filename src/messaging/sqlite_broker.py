@@ -0,0 +1,135 @@
+"""
+SQLite message broker
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import json
+import sqlite3
+import threading
+import time
+import config
+from logger import Logger
+from messaging.message_broker import Message, MessageBroker
+
+# Suffixe du topic des messages abandonnés après MESSAGE_MAX_DELIVERIES livraisons
+DEAD_LETTER_SUFFIX = ".dead"
+
+class SqliteBroker(MessageBroker):
+    """
+    Broker stored in a SQLite table (WAL mode, synchronous=FULL), which can be shared by the processes of the same host.
+    A received message stays in the table, invisible for MESSAGE_VISIBILITY_TIMEOUT_SECONDS, until it is acknowledged:
+    publishing the reply and deleting the message it answers happen in the same transaction (transactional outbox),
+    so a crash in between sends neither or both. A message delivered MESSAGE_MAX_DELIVERIES times is moved to the topic <topic>.dead.
+    """
+
+    def __init__(self, path=None, visibility_timeout=None, max_deliveries=None, poll_interval=None):
+        """ Constructor method """
+        self.path = config.MESSAGE_BROKER_SQLITE_PATH if path is None else path
+        self.visibility_timeout = config.MESSAGE_VISIBILITY_TIMEOUT_SECONDS if visibility_timeout is None else visibility_timeout
+        self.max_deliveries = config.MESSAGE_MAX_DELIVERIES if max_deliveries is None else max_deliveries
+        # Les messages publiés par un autre processus ne réveillent pas les consommateurs de celui-ci : ils sont lus à cet intervalle
+        self.poll_interval = config.MESSAGE_POLL_INTERVAL_MS / 1000 if poll_interval is None else poll_interval
+        self.logger = Logger.get_instance('SqliteBroker')
+        self._lock = threading.Lock()
+        self._published = threading.Condition()
+
+        # Transactions ouvertes explicitement (BEGIN IMMEDIATE) : les lectures qui réservent des messages ne se chevauchent pas
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS saga_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                body TEXT NOT NULL,
+                headers TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                visible_at REAL NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_saga_messages_topic ON saga_messages (topic, visible_at, id)")
+
+    def publish(self, messages, acked=()):
+        """ Insert a batch of messages and delete the acknowledged ones, in one transaction """
+        if not messages and not acked:
+            return
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                for message in messages:
+                    cursor = self._connection.execute(
+                        "INSERT INTO saga_messages (topic, body, headers, visible_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (message.topic, json.dumps(message.body), json.dumps(message.headers), now, now)
+                    )
+                    message.message_id = cursor.lastrowid
+                self._connection.executemany("DELETE FROM saga_messages WHERE id = ?", [(message.message_id,) for message in acked])
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        if messages:
+            with self._published:
+                self._published.notify_all()
+
+    def receive(self, topic, max_messages=1, timeout=None):
+        """ Reserve and return up to max_messages visible messages of a topic, waiting at most timeout seconds for the first one """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            messages = self._claim(topic, max_messages)
+            if messages:
+                return messages
+            remaining = deadline - time.monotonic() if deadline is not None else self.poll_interval
+            if remaining <= 0:
+                return []
+            with self._published:
+                self._published.wait(min(remaining, self.poll_interval))
+
+    def _claim(self, topic, max_messages):
+        """ Make up to max_messages visible messages invisible for visibility_timeout and return them """
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._connection.execute(
+                    "SELECT id, body, headers, attempts FROM saga_messages WHERE topic = ? AND visible_at <= ? ORDER BY id LIMIT ?",
+                    (topic, now, max_messages)
+                ).fetchall()
+                # Les messages abandonnés restent lisibles autant de fois que nécessaire
+                max_deliveries = self.max_deliveries if not topic.endswith(DEAD_LETTER_SUFFIX) else float("inf")
+                dead_ids = [(row[0],) for row in rows if row[3] >= max_deliveries]
+                live_rows = [row for row in rows if row[3] < max_deliveries]
+                self._connection.executemany("UPDATE saga_messages SET topic = topic || ? WHERE id = ?",
+                                             [(DEAD_LETTER_SUFFIX, message_id) for message_id, in dead_ids])
+                self._connection.executemany("UPDATE saga_messages SET attempts = attempts + 1, visible_at = ? WHERE id = ?",
+                                             [(now + self.visibility_timeout, row[0]) for row in live_rows])
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        if dead_ids:
+            self.logger.error("%s message(s) du topic %s abandonné(s) après %s livraisons : %s",
+                              len(dead_ids), topic, self.max_deliveries, [message_id for message_id, in dead_ids])
+        return [Message(topic=topic, body=json.loads(body), message_id=message_id, attempts=attempts + 1, headers=json.loads(headers) if headers else {})
+                for message_id, body, headers, attempts in live_rows]
+
+    def extend_visibility(self, messages):
+        """ Make received messages invisible for another visibility_timeout, so that they are not delivered again while they are being processed """
+        if not messages:
+            return
+        visible_at = time.time() + self.visibility_timeout
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany("UPDATE saga_messages SET visible_at = ? WHERE id = ?", [(visible_at, message.message_id) for message in messages])
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        """ Close the connection to the database """
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,59 @@
+"""
+Order request validation
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import fastjsonschema
+import config
+import saga_metrics
+
+ORDER_REQUEST_SCHEMA = {
+    "type": "object",
+    "required": ["user_id", "items"],
+    "properties": {
+        "user_id": {"type": "integer", "minimum": 1},
+        "items": {
+            "type": "array",
+            "minItems": 1,
+            "maxItems": config.ORDER_MAX_ITEMS,
+            "items": {
+                "type": "object",
+                "required": ["product_id", "quantity"],
+                "properties": {
+                    "product_id": {"type": "integer", "minimum": 1},
+                    "quantity": {"type": "integer", "minimum": 1, "maximum": config.ORDER_MAX_QUANTITY},
+                },
+                # Champs en plus (ex. nom du produit affiché par le client) acceptés, puis retirés par normalize_order_request
+                "additionalProperties": True,
+            },
+        },
+    },
+}
+
+# Compilé une seule fois en une fonction Python : valider une requête ne parcourt plus le schéma
+_validate = fastjsonschema.compile(ORDER_REQUEST_SCHEMA)
+
+def normalize_order_request(payload):
+    """
+    Validate the body of POST /saga/order, then merge the lines that share a product_id and sort the items by product_id,
+    so that every saga updates the stock of its products in the same order. Return (normalized payload, None) or (None, error).
+    The items keep only product_id and quantity: the other fields of a line are dropped, so they never reach the services.
+    JSON Schema accepts 1.0 as an integer: the identifiers and quantities are converted to int, so the services never receive a float.
+    """
+    try:
+        _validate(payload)
+    except fastjsonschema.JsonSchemaValueException as e:
+        saga_metrics.record_order_rejected("invalid_request")
+        return None, {"field": e.name, "error": e.message}
+
+    quantities = {}
+    for item in payload["items"]:
+        product_id = int(item["product_id"])
+        quantities[product_id] = quantities.get(product_id, 0) + int(item["quantity"])
+    for product_id, quantity in quantities.items():
+        if quantity > config.ORDER_MAX_QUANTITY:
+            saga_metrics.record_order_rejected("invalid_request")
+            return None, {"field": "data.items", "error": f"La quantité totale du produit {product_id} dépasse {config.ORDER_MAX_QUANTITY}"}
+
+    items = [{"product_id": product_id, "quantity": quantities[product_id]} for product_id in sorted(quantities)]
+    return {**payload, "user_id": int(payload["user_id"]), "items": items}, None
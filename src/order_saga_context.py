@@ -0,0 +1,42 @@
+"""
+Order saga context
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+@dataclass
+class OrderSagaContext:
+    """ Data shared by the steps of an order saga. Handlers read their inputs here and store the fields returned by the services, so later steps do not fetch them again. """
+    # Sert aussi à construire les Idempotency-Key des requêtes de la saga
+    saga_id: str = ""
+    user_id: Optional[int] = None
+    items: list = field(default_factory=list)
+    order_id: int = 0
+    # None tant que le Store Manager ne l'a pas retourné
+    total_amount: Optional[float] = None
+    # Articles dont le stock a réellement été diminué (seuls ceux-ci seront compensés)
+    applied_stock_deltas: list = field(default_factory=list)
+    # Mode réservation : réservation du stock à confirmer après le paiement, et son échéance (time.time())
+    stock_reservation_id: str = ""
+    stock_reservation_expires_at: Optional[float] = None
+    payment_id: int = 0
+
+    @classmethod
+    def from_payload(cls, payload):
+        """ Build the context of a new saga from the JSON payload of /saga/order """
+        return cls(user_id=payload.get('user_id'), items=payload.get('items', []))
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Rebuild a context saved with to_dict (ex. from the saga journal) """
+        return cls(**{name: value for name, value in data.items() if name in cls.__dataclass_fields__})
+
+    def to_dict(self):
+        """ Return the context as a JSON-serializable dict """
+        return asdict(self)
+
+    def to_order_data(self):
+        """ Return the body expected by POST /store-api/orders """
+        return {"user_id": self.user_id, "items": self.items}
@@ -0,0 +1,99 @@
+"""
+Order saga definition
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import config
+from handlers.async_create_order_handler import AsyncCreateOrderHandler
+from handlers.async_commit_stock_handler import AsyncCommitStockHandler
+from handlers.async_create_payment_handler import AsyncCreatePaymentHandler
+from handlers.async_decrease_stock_handler import AsyncDecreaseStockHandler
+from handlers.async_reserve_stock_handler import AsyncReserveStockHandler
+from handlers.commit_stock_handler import CommitStockHandler
+from handlers.create_order_handler import CreateOrderHandler
+from handlers.create_payment_handler import CreatePaymentHandler
+from handlers.decrease_stock_handler import DecreaseStockHandler
+from handlers.reserve_stock_handler import ReserveStockHandler
+from order_saga_state import OrderSagaState
+from retry_policy import RetryPolicy
+from saga_definition import SagaDefinition, SagaStep
+
+CREATE_ORDER_STEP = SagaStep(
+    name="create_order",
+    state=OrderSagaState.CREATING_ORDER,
+    success_state=OrderSagaState.DECREASING_STOCK,
+    handler_class=CreateOrderHandler,
+    async_handler_class=AsyncCreateOrderHandler,
+    compensation_state=OrderSagaState.CANCELLING_ORDER,
+    # Le paiement référence la commande : il est supprimé avant. La remise en stock est indépendante et s'exécute en parallèle
+    compensation_dependencies=("create_payment",),
+    retry_policy=RetryPolicy.for_step("create_order"),
+)
+
+DECREASE_STOCK_STEP = SagaStep(
+    name="decrease_stock",
+    state=OrderSagaState.DECREASING_STOCK,
+    success_state=OrderSagaState.CREATING_PAYMENT,
+    handler_class=DecreaseStockHandler,
+    async_handler_class=AsyncDecreaseStockHandler,
+    compensation_state=OrderSagaState.INCREASING_STOCK,
+    compensation_dependencies=(),
+    retry_policy=RetryPolicy.for_step("decrease_stock"),
+)
+
+CREATE_PAYMENT_STEP = SagaStep(
+    name="create_payment",
+    state=OrderSagaState.CREATING_PAYMENT,
+    success_state=OrderSagaState.COMPLETED,
+    handler_class=CreatePaymentHandler,
+    async_handler_class=AsyncCreatePaymentHandler,
+    compensation_state=OrderSagaState.CANCELLING_PAYMENT,
+    compensation_dependencies=(),
+    retry_policy=RetryPolicy.for_step("create_payment"),
+)
+
+RESERVE_STOCK_STEP = SagaStep(
+    name="reserve_stock",
+    state=OrderSagaState.RESERVING_STOCK,
+    success_state=OrderSagaState.CREATING_PAYMENT,
+    handler_class=ReserveStockHandler,
+    async_handler_class=AsyncReserveStockHandler,
+    # Aucune requête : la réservation est laissée expirer
+    compensation_state=OrderSagaState.RELEASING_STOCK,
+    compensation_dependencies=(),
+    retry_policy=RetryPolicy.for_step("reserve_stock"),
+)
+
+COMMIT_STOCK_STEP = SagaStep(
+    name="commit_stock",
+    state=OrderSagaState.COMMITTING_STOCK,
+    success_state=OrderSagaState.COMPLETED,
+    handler_class=CommitStockHandler,
+    async_handler_class=AsyncCommitStockHandler,
+    # Dernière étape : jamais compensée. Si elle échoue, le paiement et la commande le sont
+    compensation_state=None,
+    retry_policy=RetryPolicy.for_step("commit_stock"),
+)
+
+def build_order_saga_definition(parallel_stock_and_payment=None, reserve_stock=None):
+    """
+    Return the order saga: create the order, then decrease stock and create the payment (one after the other, or in parallel).
+    With reserve_stock, the stock is reserved instead of decreased, and the reservation is committed once the payment is created.
+    """
+    if parallel_stock_and_payment is None:
+        parallel_stock_and_payment = config.SAGA_PARALLEL_STOCK_AND_PAYMENT
+    if reserve_stock is None:
+        reserve_stock = config.STOCK_RESERVATION_ENABLED
+    stock_step = RESERVE_STOCK_STEP if reserve_stock else DECREASE_STOCK_STEP
+    if parallel_stock_and_payment:
+        # Le paiement n'a besoin que de order_id et total_amount, déjà connus après la création de la commande
+        stages = [CREATE_ORDER_STEP, (stock_step, CREATE_PAYMENT_STEP)]
+    else:
+        stages = [CREATE_ORDER_STEP, stock_step, CREATE_PAYMENT_STEP]
+    if reserve_stock:
+        # La réservation n'est confirmée qu'une fois le paiement créé
+        stages.append(COMMIT_STOCK_STEP)
+    return SagaDefinition("order", stages, OrderSagaState.COMPLETED)
+
+# Table de transitions calculée une seule fois, au chargement du module
+ORDER_SAGA_DEFINITION = build_order_saga_definition()
@@ -14,3 +14,8 @@ class OrderSagaState(Enum):
     INCREASING_STOCK = 4
     CANCELLING_ORDER = 5
     COMPLETED = 6
+    CANCELLING_PAYMENT = 7
+    # Mode réservation (STOCK_RESERVATION_ENABLED)
+    RESERVING_STOCK = 8
+    RELEASING_STOCK = 9
+    COMMITTING_STOCK = 10
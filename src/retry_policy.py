@@ -0,0 +1,129 @@
+"""
+Retry policy
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import random
+import time
+import config
+import saga_profiler
+from opentelemetry import trace
+
+class SagaDeadlineExceeded(Exception):
+    """ Raised instead of sending a request once the saga deadline has passed """
+    pass
+
+class RetryPolicy:
+    """
+    When and how long to wait before sending a failed request again: at most max_attempts attempts, exponential backoff with full jitter.
+    A response is retried only if its status is in retry_on_status. A request that reached the server (response or lost connection) is retried only
+    if it is idempotent: GET/PUT/DELETE, or a POST carrying an Idempotency-Key header. No retry is started if it cannot finish before the deadline.
+    A Retry-After header can lengthen the wait up to backoff_max, not beyond.
+    """
+
+    IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+    def __init__(self, max_attempts=None, backoff_base=None, backoff_max=None, retry_on_status=None):
+        """ Constructor method """
+        self.max_attempts = max(1, max_attempts if max_attempts is not None else config.RETRY_MAX_ATTEMPTS)
+        self.backoff_base = backoff_base if backoff_base is not None else config.RETRY_BACKOFF_BASE_MS / 1000
+        self.backoff_max = backoff_max if backoff_max is not None else config.RETRY_BACKOFF_MAX_MS / 1000
+        self.retry_on_status = frozenset(retry_on_status if retry_on_status is not None else config.RETRY_ON_STATUS)
+
+    @staticmethod
+    def for_step(step_name):
+        """ Return the policy of a saga step: the default policy, with the number of attempts set in RETRY_STEP_MAX_ATTEMPTS if any """
+        return RetryPolicy(max_attempts=config.RETRY_STEP_MAX_ATTEMPTS.get(step_name))
+
+    def is_idempotent(self, method, headers=None):
+        """ Return True if sending the request twice has the same effect as sending it once """
+        return method.upper() in self.IDEMPOTENT_METHODS or bool(headers and "Idempotency-Key" in headers)
+
+    def get_backoff(self, attempt):
+        """ Return the time to wait after the given failed attempt (1 = first): random between 0 and base * 2^(attempt - 1), capped """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def get_retry_delay(self, attempt, method, headers=None, status_code=None, is_sent=True, retry_after=None, deadline=None):
+        """ Return the time to wait before the next attempt, or None if the request must not be sent again """
+        if attempt >= self.max_attempts:
+            return None
+        if status_code is not None and status_code not in self.retry_on_status:
+            return None
+        if is_sent and not self.is_idempotent(method, headers):
+            return None
+        delay = self.get_backoff(attempt)
+        if retry_after is not None:
+            # Un Retry-After démesuré (ex. une heure pendant une maintenance) ne bloque pas l'étape au-delà de l'attente maximale
+            delay = max(delay, min(retry_after, self.backoff_max))
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+def get_remaining_time(deadline):
+    """ Return the seconds left before the deadline (None if there is no deadline). Raise SagaDeadlineExceeded if it has passed. """
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise SagaDeadlineExceeded("Le délai maximal de la saga est dépassé")
+    return remaining
+
+def get_compensation_deadline():
+    """ Return the deadline (time.monotonic()) of a compensation starting now, or None (SAGA_COMPENSATION_DEADLINE_SECONDS = 0) """
+    if config.SAGA_COMPENSATION_DEADLINE_SECONDS <= 0:
+        return None
+    return time.monotonic() + config.SAGA_COMPENSATION_DEADLINE_SECONDS
+
+def parse_retry_after(value):
+    """ Return the delay in seconds of a Retry-After header, or None if it is missing or not a number of seconds """
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+def record_retry(attempt, delay, reason):
+    """ Add a retry event to the current span (the span of the request being retried) """
+    trace.get_current_span().add_event("http_retry", {"attempt": attempt, "backoff_ms": round(delay * 1000, 3), "reason": reason})
+    saga_profiler.record_retry(attempt, delay, reason)
+
+def record_retries(attempts, backoff_total):
+    """ Record on the current span how many times the request was sent again and the total time spent waiting """
+    if attempts > 1:
+        span = trace.get_current_span()
+        span.set_attribute("http.retry_count", attempts - 1)
+        span.set_attribute("http.retry_backoff_ms", round(backoff_total * 1000, 3))
+
+def idempotency_headers(saga_id, operation):
+    """ Return the Idempotency-Key header of a POST sent by a saga step, if enabled (HTTP_SEND_IDEMPOTENCY_KEYS). Such a POST can be retried. """
+    if not config.HTTP_SEND_IDEMPOTENCY_KEYS or not saga_id:
+        return {}
+    return {"Idempotency-Key": f"{saga_id}:{operation}"}
+
+class RetryingClient:
+    """
+    View of a shared HTTP client (sync or async) that applies the retry policy of a saga step and the saga deadline to every request.
+    With fail_fast=False, the requests are sent even if the circuit breaker of the service is open (ex. compensations).
+    """
+
+    def __init__(self, client, retry_policy=None, deadline=None, fail_fast=True):
+        """ Constructor method """
+        self.client = client
+        self.retry_policy = retry_policy
+        self.deadline = deadline
+        self.fail_fast = fail_fast
+
+    def request(self, method, url, **kwargs):
+        """ Send a request with the policy and deadline of this view (returns a coroutine if the client is async) """
+        return self.client.request(method, url, retry_policy=self.retry_policy, deadline=self.deadline, fail_fast=self.fail_fast, **kwargs)
+
+    def get(self, url, **kwargs):
+        """ Send a GET request """
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """ Send a POST request """
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        """ Send a DELETE request """
+        return self.request("DELETE", url, **kwargs)
@@ -0,0 +1,350 @@
+"""
+Saga Orchestrator (ASGI)
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+import config
+from admission_control import AdmissionController
+from async_http_client import AsyncHttpClient
+from catalog_cache import CatalogCache
+from circuit_breaker import CircuitBreakerRegistry
+from controllers.async_order_saga_controller import AsyncOrderSagaController
+from controllers.message_order_saga_controller import MessageOrderSagaController
+from idempotency_store import IdempotencyStore
+from order_request import normalize_order_request
+from logger import Logger
+from saga_metrics import get_metrics
+from saga_profiler import get_slow_sagas
+from saga_recovery import recover_unfinished_sagas
+from saga_status import get_saga_status
+from server_lifecycle import ServerLifecycle
+from stock_bulk import StockDeltaCoalescer, stock_coalescing
+
+from opentelemetry import trace
+from tracing import setup_tracing
+
+logger = Logger.get_instance('SagaAsgi')
+
+async def read_json(receive):
+    """ Read the whole request body and decode it as JSON. Return None if the body is not valid JSON. """
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+def get_header(scope, name):
+    """ Return the value of a request header (name in lowercase), or None """
+    for header_name, value in scope.get("headers", []):
+        if header_name.decode("latin-1") == name:
+            return value.decode("latin-1")
+    return None
+
+async def send_json(send, status, data, headers=None):
+    """ Send a JSON response """
+    body = json.dumps(data).encode()
+    response_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    response_headers += [(name.lower().encode(), str(value).encode()) for name, value in (headers or {}).items()]
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": response_headers,
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def health(scope, receive, send):
+    """ Return OK if app is up and running """
+    await send_json(send, 200, {'status': 'ok'})
+
+async def ready(scope, receive, send):
+    """ Return 200 if this process accepts new sagas, 503 while it is shutting down """
+    is_ready, details = ServerLifecycle.get_instance().get_readiness()
+    await send_json(send, 200 if is_ready else 503, {'status': 'ready' if is_ready else 'unavailable', **details})
+
+async def metrics(scope, receive, send):
+    """ Return saga metrics (durations, step latencies, transitions, sagas in flight) in the Prometheus text format """
+    body, content_type = get_metrics()
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def circuit_breakers(scope, receive, send):
+    """ Return the state of the circuit breakers of the downstream services """
+    await send_json(send, 200, CircuitBreakerRegistry.get_instance().get_stats())
+
+async def slow_sagas(scope, receive, send):
+    """ Return the timeline of the slowest sagas (SAGA_PROFILER_ENABLED), slowest first. Optional query parameter: limit. """
+    limit = parse_qs(scope.get("query_string", b"").decode()).get("limit", [None])[0]
+    await send_json(send, 200, get_slow_sagas(int(limit) if limit and limit.isdigit() else None))
+
+async def start_saga(payload, on_finished=None):
+    """
+    Run the saga. Return (body, status code, headers). If a critical circuit breaker is open, return 503 without creating the order.
+    With a 202, the saga goes on in the background: on_finished, if given, is called once it is finished. It is not called for any other response.
+    The payload is validated and normalized first (400 if it is invalid).
+    With CATALOG_VALIDATION_ENABLED, unknown products and quantities above the cached stock are rejected (400).
+    """
+    lifecycle = ServerLifecycle.get_instance()
+    if lifecycle.is_draining():
+        return {'error': "Le serveur s'arrête, veuillez réessayer plus tard"}, 503, {'Retry-After': str(config.SAGA_QUEUE_RETRY_AFTER_SECONDS)}
+
+    payload, error = normalize_order_request(payload)
+    if error is not None:
+        return {'error': "Requête invalide", 'details': [error]}, 400, {}
+
+    retry_after = CircuitBreakerRegistry.get_instance().get_critical_retry_after()
+    if retry_after > 0:
+        return {'error': "Un service requis par la saga est indisponible, veuillez réessayer plus tard"}, 503, {'Retry-After': str(math.ceil(retry_after))}
+
+    if config.CATALOG_VALIDATION_ENABLED:
+        # Le cache lit store-api avec le client bloquant : dans un thread, pour ne pas bloquer la boucle
+        errors = await asyncio.get_running_loop().run_in_executor(None, CatalogCache.get_instance().validate_order, payload['items'])
+        if errors:
+            return {'error': "Commande invalide", 'details': errors}, 400, {}
+
+    if config.SAGA_TRANSPORT == "messaging":
+        order_saga_controller = MessageOrderSagaController()
+        with lifecycle.track_saga():
+            result = await order_saga_controller.run_async(payload, config.MESSAGE_REPLY_TIMEOUT_SECONDS)
+        if result is None:
+            # La saga continue sans le client : son état reste lisible avec GET /saga/order/<saga_id>
+            if on_finished is not None:
+                order_saga_controller.result.add_done_callback(lambda _: on_finished())
+            status_url = f"/saga/order/{order_saga_controller.saga_id}"
+            return {'saga_id': order_saga_controller.saga_id, 'status': 'RUNNING', 'status_url': status_url}, 202, {'Location': status_url}
+    else:
+        order_saga_controller = AsyncOrderSagaController()
+        with lifecycle.track_saga():
+            result = await order_saga_controller.run(payload)
+    return result, 200 if result["status"] == "OK" else 500, {}
+
+async def start_admitted_saga(payload):
+    """
+    Run start_saga if admission control lets the order in (otherwise 429 or 503), and release its slot once the saga is finished:
+    when start_saga answers, or later for a saga that goes on in the background (202).
+    """
+    admission = AdmissionController.get_instance()
+    if admission is None:
+        return await start_saga(payload)
+    user_id = payload.get('user_id') if isinstance(payload, dict) else None
+    rejection = admission.try_admit(user_id)
+    if rejection is not None:
+        trace.get_current_span().set_attribute("admission_rejected", True)
+        return rejection
+
+    try:
+        response = await start_saga(payload, admission.release)
+    except BaseException:
+        admission.release()
+        raise
+    # Avec 202, la saga continue en arrière-plan et rend elle-même son créneau quand elle se termine
+    if response[1] != 202:
+        admission.release()
+    return response
+
+async def start_saga_once(idempotency_key, payload):
+    """
+    Start the saga only for the first request with this Idempotency-Key. Duplicates wait for, then replay, the first response:
+    they are looked up before admission control, so they take neither a rate limit token nor a concurrency slot.
+    """
+    store = IdempotencyStore.get_instance()
+    entry, is_first = store.begin(idempotency_key, payload)
+
+    if not is_first:
+        if entry.fingerprint != store.fingerprint(payload):
+            return {'error': "Cette Idempotency-Key a déjà été utilisée avec une autre requête"}, 422, {}
+        try:
+            body, status_code, headers = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(entry.future)), config.IDEMPOTENCY_WAIT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            return {'error': "Une requête avec cette Idempotency-Key est encore en cours"}, 409, {'Retry-After': str(config.SAGA_QUEUE_RETRY_AFTER_SECONDS)}
+        return body, status_code, {**headers, 'Idempotent-Replayed': 'true'}
+
+    try:
+        response = await start_admitted_saga(payload)
+    except BaseException:
+        store.discard(idempotency_key, entry, ({'error': "La requête originale a échoué, veuillez réessayer"}, 500, {}))
+        raise
+
+    # Un refus temporaire ne doit pas empêcher une nouvelle tentative avec la même clé
+    store.finish(idempotency_key, entry, response)
+    return response
+
+async def start_batch_order(batch_idempotency_key, index, order):
+    """ Start the saga of one order of a batch, through admission control and, if the batch has an Idempotency-Key, with the key "<key>:<index>" """
+    if batch_idempotency_key:
+        return await start_saga_once(f"{batch_idempotency_key}:{index}", order)
+    return await start_admitted_saga(order)
+
+async def saga_order(scope, receive, send):
+    """ Start order saga. Requests sent again with the same Idempotency-Key header do not start a new saga. """
+    tracer = trace.get_tracer(__name__)
+
+    with tracer.start_as_current_span("saga_order") as span:
+        payload = await read_json(receive) or {}
+        idempotency_key = get_header(scope, "idempotency-key")
+
+        if idempotency_key:
+            span.set_attribute("idempotency_key", idempotency_key)
+            body, status_code, headers = await start_saga_once(idempotency_key, payload)
+        else:
+            body, status_code, headers = await start_admitted_saga(payload)
+        await send_json(send, status_code, body, headers)
+
+async def saga_order_status(scope, receive, send):
+    """ Return the current state of a saga still running after a 202 of the message transport """
+    saga_id = scope["path"][len(SAGA_STATUS_PATH_PREFIX):]
+    # Le journal est lu avec sqlite3, bloquant : dans un thread
+    status = await asyncio.get_running_loop().run_in_executor(None, get_saga_status, saga_id)
+    if status is None:
+        return await send_json(send, 404, {'error': f"Saga {saga_id} introuvable"})
+    await send_json(send, 200, status)
+
+# Sagas de lots exécutées en même temps, tous lots confondus (créé dans la boucle d'événements au premier lot)
+batch_semaphore = None
+
+async def saga_orders_batch(scope, receive, send):
+    """
+    Start one order saga per element of "orders", BATCH_CONCURRENCY at a time. The response is streamed as NDJSON:
+    one line {"index", "status_code", "body"} per order, written as soon as its saga finishes (so not in the order of the request).
+    Each order goes through admission control and the idempotency store (see start_batch_order). With STOCK_BULK_UPDATE_ENABLED and BATCH_COALESCE_STOCK,
+    the stock decreases of the sagas running at the same time are merged (StockDeltaCoalescer), as with the Flask engine.
+    """
+    global batch_semaphore
+    payload = await read_json(receive)
+    idempotency_key = get_header(scope, "idempotency-key")
+    orders = payload.get('orders') if isinstance(payload, dict) else None
+    if not isinstance(orders, list) or not orders:
+        return await send_json(send, 400, {'error': "Le corps doit contenir une liste non vide « orders »"})
+    if len(orders) > config.BATCH_MAX_ORDERS:
+        return await send_json(send, 413, {'error': f"Un lot contient au plus {config.BATCH_MAX_ORDERS} commandes"})
+    if ServerLifecycle.get_instance().is_draining():
+        return await send_json(send, 503, {'error': "Le serveur s'arrête, veuillez réessayer plus tard"}, {'Retry-After': str(config.SAGA_QUEUE_RETRY_AFTER_SECONDS)})
+
+    if batch_semaphore is None:
+        batch_semaphore = asyncio.Semaphore(config.BATCH_CONCURRENCY)
+    coalescer = StockDeltaCoalescer.get_instance() if config.STOCK_BULK_UPDATE_ENABLED and config.BATCH_COALESCE_STOCK else None
+    is_cancelled = False
+
+    async def run_order(index, order):
+        async with batch_semaphore:
+            # Le client est parti : on ne commence pas les sagas restantes (celles déjà commencées se terminent normalement)
+            if is_cancelled:
+                return index, None, None
+            try:
+                if coalescer is None:
+                    body, status_code, _ = await start_batch_order(idempotency_key, index, order)
+                else:
+                    # Chaque tâche a sa copie du contexte : le coalesceur ne vaut que pour la saga de cette commande
+                    with stock_coalescing(coalescer):
+                        body, status_code, _ = await start_batch_order(idempotency_key, index, order)
+            except Exception as e:
+                logger.error("Une commande du lot a échoué : %s", e)
+                body, status_code = {'error': str(e)}, 500
+            return index, body, status_code
+
+    tracer = trace.get_tracer(__name__)
+    with tracer.start_as_current_span("saga_orders_batch") as span:
+        span.set_attribute("orders_count", len(orders))
+        if idempotency_key:
+            span.set_attribute("idempotency_key", idempotency_key)
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/x-ndjson")],
+        })
+        tasks = [asyncio.ensure_future(run_order(index, order)) for index, order in enumerate(orders)]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                index, body, status_code = await next_result
+                line = json.dumps({'index': index, 'status_code': status_code, 'body': body}) + "\n"
+                await send({"type": "http.response.body", "body": line.encode(), "more_body": True})
+        finally:
+            is_cancelled = True
+        await send({"type": "http.response.body", "body": b""})
+
+ROUTES = {
+    ("GET", "/health-check"): health,
+    ("GET", "/ready"): ready,
+    ("GET", "/metrics"): metrics,
+    ("GET", "/circuit-breakers"): circuit_breakers,
+    ("GET", "/debug/slow-sagas"): slow_sagas,
+    ("POST", "/saga/order"): saga_order,
+    ("POST", "/saga/orders:batch"): saga_orders_batch,
+}
+
+# Route dont le chemin se termine par un paramètre : GET /saga/order/<saga_id>
+SAGA_STATUS_PATH_PREFIX = "/saga/order/"
+
+def find_route(method, path):
+    """ Return the handler of a request, or None """
+    route = ROUTES.get((method, path))
+    if route is None and method == "GET" and path.startswith(SAGA_STATUS_PATH_PREFIX) and len(path) > len(SAGA_STATUS_PATH_PREFIX):
+        return saga_order_status
+    return route
+
+async def lifespan(scope, receive, send):
+    """ Prepare worker threads and recover interrupted sagas at startup. At shutdown, wait for the sagas in progress, then close pooled connections. """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=config.ASYNC_SAGA_SYNC_HANDLER_THREADS))
+            if config.SAGA_JOURNAL_ENABLED and config.SAGA_RECOVERY_ON_STARTUP:
+                # Compenser les sagas interrompues par un arrêt précédent avant d'accepter des requêtes
+                await loop.run_in_executor(None, recover_unfinished_sagas)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # uvicorn a déjà cessé d'accepter des connexions et attendu les requêtes en cours (dans la limite de son délai d'arrêt)
+            await asyncio.get_running_loop().run_in_executor(None, ServerLifecycle.get_instance().drain, config.SERVER_GRACEFUL_TIMEOUT_SECONDS)
+            await AsyncHttpClient.close_instance()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def saga_app(scope, receive, send):
+    """ Minimal ASGI application exposing the saga endpoints """
+    if scope["type"] == "lifespan":
+        return await lifespan(scope, receive, send)
+
+    route = find_route(scope["method"], scope["path"])
+    if route is None:
+        return await send_json(send, 404, {'error': 'Not found'})
+    try:
+        await route(scope, receive, send)
+    except Exception as e:
+        logger.error("Erreur lors du traitement de %s %s : %s", scope['method'], scope['path'], e)
+        await send_json(send, 500, {'error': str(e)})
+
+def create_app():
+    """
+    Return the ASGI application (gunicorn: "saga_asgi:create_app()"). Tracing is set up in the background (TRACING_ENABLED):
+    if it is disabled, the OpenTelemetry instrumentation is not imported and saga_app is returned as is.
+    """
+    if not setup_tracing():
+        return saga_app
+
+    # Instrumentation automatique
+    from opentelemetry.instrumentation.asgi import OpenTelemetryMiddleware
+    from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+    from opentelemetry.instrumentation.requests import RequestsInstrumentor
+    for instrumentor in (HTTPXClientInstrumentor(), RequestsInstrumentor()):
+        if not instrumentor.is_instrumented_by_opentelemetry:
+            instrumentor.instrument()
+    return OpenTelemetryMiddleware(saga_app)
+
+# Start ASGI app
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(create_app(), host='0.0.0.0', port=config.FLASK_PORT)
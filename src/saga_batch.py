@@ -0,0 +1,78 @@
+"""
+Saga batch runner
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import config
+from opentelemetry import context
+from logger import Logger
+from stock_bulk import StockDeltaCoalescer, stock_coalescing
+
+class SagaBatchRunner:
+    """
+    Run the orders of POST /saga/orders:batch on a pool of BATCH_CONCURRENCY threads shared by every batch (one concurrency budget per process).
+    Each batch keeps at most BATCH_CONCURRENCY orders submitted, so that concurrent batches progress together.
+    With STOCK_BULK_UPDATE_ENABLED and BATCH_COALESCE_STOCK, the stock decreases of the sagas running at the same time are merged (StockDeltaCoalescer).
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, concurrency=None):
+        """ Constructor method """
+        self.concurrency = config.BATCH_CONCURRENCY if concurrency is None else concurrency
+        self.logger = Logger.get_instance('SagaBatchRunner')
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="saga-batch")
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide runner, creating it on first use """
+        if SagaBatchRunner._instance is None:
+            with SagaBatchRunner._instance_lock:
+                if SagaBatchRunner._instance is None:
+                    SagaBatchRunner._instance = SagaBatchRunner()
+        return SagaBatchRunner._instance
+
+    def run(self, orders, run_order):
+        """
+        Call run_order(index, order) for every order, which returns (body, status code, headers). Yield (index, body, status code) as each order finishes.
+        If the caller stops iterating (ex. the client went away), the orders not yet submitted are not run.
+        """
+        coalescer = StockDeltaCoalescer.get_instance() if config.STOCK_BULK_UPDATE_ENABLED and config.BATCH_COALESCE_STOCK else None
+        # Les threads du pool ne partagent pas le contexte courant : on le transmet pour garder les spans imbriqués
+        parent_context = context.get_current()
+        remaining = iter(enumerate(orders))
+        pending = {}
+        try:
+            while True:
+                for index, order in remaining:
+                    pending[self.executor.submit(self._run_order, run_order, index, order, coalescer, parent_context)] = index
+                    if len(pending) >= self.concurrency:
+                        break
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    body, status_code = future.result()
+                    yield pending.pop(future), body, status_code
+        finally:
+            # Les sagas déjà commencées se terminent (ou sont compensées) normalement
+            for future in pending:
+                future.cancel()
+
+    def _run_order(self, run_order, index, order, coalescer, parent_context):
+        token = context.attach(parent_context)
+        try:
+            if coalescer is None:
+                body, status_code, _ = run_order(index, order)
+            else:
+                with stock_coalescing(coalescer):
+                    body, status_code, _ = run_order(index, order)
+            return body, status_code
+        except Exception as e:
+            self.logger.error("Une commande du lot a échoué : %s", e)
+            return {'error': str(e)}, 500
+        finally:
+            context.detach(token)
@@ -0,0 +1,127 @@
+"""
+Saga definition
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass(frozen=True)
+class SagaStep:
+    """
+    One step of a saga: the handler that performs it and the states it is journaled under.
+    Handlers keep their contract (run and rollback return a state): a step succeeded if run returned success_state.
+    If run fails but returns compensation_state, the step was partially applied and is compensated too.
+    compensation_dependencies lists the steps whose compensation must finish before this one starts.
+    None (default) keeps the strict reverse order: the step is compensated after every step that follows it.
+    """
+    name: str
+    state: object
+    success_state: object
+    handler_class: type
+    async_handler_class: Optional[type] = None
+    compensation_state: Optional[object] = None
+    compensation_dependencies: Optional[tuple] = None
+    # RetryPolicy appliquée aux requêtes du handler (aucune nouvelle tentative si None)
+    retry_policy: Optional[object] = None
+
+@dataclass(frozen=True)
+class SagaTransition:
+    """ Entry of the transition table: the stage started in a forward state, or the step rolled back in a compensation state """
+    stage: tuple = ()
+    next_state: Optional[object] = None
+    compensated_step: Optional[SagaStep] = None
+
+class SagaDefinition:
+    """
+    Declarative description of a saga: a list of stages run one after the other, each stage being one step or several independent steps run in parallel.
+    The transition table, the compensation dependency graph and the compensations to run after a crash are computed once, when the definition is built.
+    """
+
+    def __init__(self, name, stages, completed_state):
+        """ Constructor method """
+        self.name = name
+        self.stages = tuple(tuple(stage) if isinstance(stage, (list, tuple)) else (stage,) for stage in stages)
+        self.completed_state = completed_state
+        self.steps = tuple(step for stage in self.stages for step in stage)
+        self.initial_state = self.stages[0][0].state if self.stages else completed_state
+        self.transitions = {}
+        self.recovery_compensations = {}
+        self._reserved_states = set()
+
+        for index, stage in enumerate(self.stages):
+            next_state = self.stages[index + 1][0].state if index + 1 < len(self.stages) else completed_state
+            self._add_transition(stage[0].state, SagaTransition(stage=stage, next_state=next_state))
+            # Un étage parallèle est journalisé sous l'état de sa première étape : les états des autres étapes sont seulement réservés
+            for step in stage[1:]:
+                self._add_transition(step.state, None)
+            # Une saga arrêtée dans cet état a peut-être appliqué une partie de l'étage : ses étapes sont compensées avec les précédentes,
+            # à partir de ce que leurs handlers ont enregistré dans le contexte (leurs compensations ignorent ce qui n'y figure pas)
+            steps_to_compensate = tuple(step for started_stage in self.stages[:index + 1] for step in started_stage)
+            self.recovery_compensations[stage[0].state] = self._compensable(steps_to_compensate)
+
+        names = {step.name for step in self.steps}
+        self.compensation_dependencies = {}
+        for position, step in enumerate(self.steps):
+            if step.compensation_dependencies is None:
+                dependencies = frozenset(later_step.name for later_step in self.steps[position + 1:])
+            else:
+                dependencies = frozenset(step.compensation_dependencies)
+            if not dependencies <= names:
+                raise ValueError(f"Dépendances de compensation inconnues pour l'étape {step.name} : {sorted(dependencies - names)}")
+            self.compensation_dependencies[step.name] = dependencies
+
+        # Un cycle bloquerait la compensation : toutes les étapes doivent pouvoir être compensées en suivant le graphe
+        pending_steps = list(self._compensable(self.steps))
+        while pending_steps:
+            ready_steps = self.get_ready_compensations(pending_steps)
+            if not ready_steps:
+                raise ValueError(f"Cycle dans les dépendances de compensation de la saga {self.name} : {[step.name for step in pending_steps]}")
+            pending_steps = [step for step in pending_steps if step not in ready_steps]
+
+        for step in self.steps:
+            if step.compensation_state is not None:
+                self._add_transition(step.compensation_state, SagaTransition(compensated_step=step))
+                # Quand cette compensation commence, celles dont elle dépend (directement ou non) sont terminées : toutes les autres peuvent rester à faire
+                done_names = self._get_transitive_dependencies(step.name)
+                self.recovery_compensations[step.compensation_state] = tuple(
+                    other_step for other_step in self._compensable(self.steps) if other_step.name not in done_names
+                )
+
+    def _add_transition(self, state, transition):
+        if state in self._reserved_states or state == self.completed_state:
+            raise ValueError(f"L'état {state} est utilisé plusieurs fois dans la saga {self.name}")
+        if transition is not None:
+            self.transitions[state] = transition
+        self._reserved_states.add(state)
+
+    def _get_transitive_dependencies(self, name):
+        dependencies = set()
+        names_to_visit = list(self.compensation_dependencies[name])
+        while names_to_visit:
+            dependency = names_to_visit.pop()
+            if dependency not in dependencies:
+                dependencies.add(dependency)
+                names_to_visit.extend(self.compensation_dependencies[dependency])
+        return dependencies
+
+    @staticmethod
+    def _compensable(steps):
+        return tuple(step for step in steps if step.compensation_state is not None)
+
+    def is_compensating(self, state):
+        """ Return True if the saga is rolling back a step in this state """
+        transition = self.transitions.get(state)
+        return transition is not None and transition.compensated_step is not None
+
+    def get_ready_compensations(self, applied_steps):
+        """ Return the applied steps that can be compensated now, i.e. whose dependencies are already compensated. They can run in parallel. """
+        pending_names = {step.name for step in applied_steps}
+        return [step for step in applied_steps if not self.compensation_dependencies[step.name] & pending_names]
+
+    def get_step(self, name):
+        """ Return the step with this name """
+        for step in self.steps:
+            if step.name == name:
+                return step
+        raise KeyError(name)
@@ -0,0 +1,265 @@
+"""
+Saga journal
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+import config
+from logger import Logger
+
+def is_process_alive(pid):
+    """ Return True if a process with this pid runs on this host """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Le processus existe, mais appartient à un autre utilisateur
+        return True
+    return True
+
+class SagaJournal:
+    """
+    Append-only log of saga state transitions, stored in SQLite (WAL mode, synchronous=FULL).
+    Entries appended by all threads are written by a single writer thread: every entry waiting when a commit starts is part of that commit (group commit),
+    so one fsync is shared by many transitions under load.
+    The writer thread also renews the lease of this process (saga_owner table) every third of SAGA_JOURNAL_LEASE_SECONDS:
+    a saga is only recovered once its owner is proven dead, or its lease has expired.
+    Every SAGA_JOURNAL_COMPACT_INTERVAL_SECONDS, it deletes the sagas completed more than SAGA_JOURNAL_RETENTION_SECONDS ago, so the journal does not grow for the whole uptime.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path=None, max_batch=None, commit_delay=None, lease_seconds=None, compact_interval=None):
+        """ Constructor method """
+        self.path = config.SAGA_JOURNAL_PATH if path is None else path
+        self.max_batch = config.SAGA_JOURNAL_MAX_BATCH if max_batch is None else max_batch
+        self.commit_delay = config.SAGA_JOURNAL_COMMIT_DELAY_MS / 1000 if commit_delay is None else commit_delay
+        self.lease_seconds = config.SAGA_JOURNAL_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.compact_interval = config.SAGA_JOURNAL_COMPACT_INTERVAL_SECONDS if compact_interval is None else compact_interval
+        self.logger = Logger.get_instance('SagaJournal')
+        self._pending = []
+        self._condition = threading.Condition()
+        self._is_closing = False
+        # Chaque entrée porte son propriétaire (hôte:pid) et le démarrage de ce journal : la reprise ne touche pas aux sagas d'un processus vivant
+        self.hostname = socket.gethostname()
+        self.owner = f"{self.hostname}:{os.getpid()}"
+        self.started_at = time.time()
+
+        connection = self._connect()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS saga_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                saga_id TEXT NOT NULL,
+                state TEXT NOT NULL,
+                data TEXT,
+                created_at REAL NOT NULL,
+                owner TEXT,
+                owner_started_at REAL
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_saga_log_saga_id ON saga_log (saga_id, id)")
+        # Dernier signe de vie de chaque processus qui écrit dans le journal
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS saga_owner (
+                owner TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL,
+                PRIMARY KEY (owner, started_at)
+            )
+        """)
+        # Journal créé par une version précédente : ajouter le propriétaire des entrées
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(saga_log)")}
+        if "owner" not in columns:
+            connection.execute("ALTER TABLE saga_log ADD COLUMN owner TEXT")
+        if "owner_started_at" not in columns:
+            connection.execute("ALTER TABLE saga_log ADD COLUMN owner_started_at REAL")
+        connection.commit()
+        # Bail pris avant la première saga : un autre hôte ne reprend pas les sagas de ce processus
+        self._renew_lease(connection)
+        connection.close()
+        self._next_renewal = time.monotonic() + self.lease_seconds / 3
+        # Le compactage au démarrage est fait par saga_recovery.py : le premier passage du thread d'écriture vient un intervalle plus tard
+        self._next_compaction = time.monotonic() + self.compact_interval if self.compact_interval else float("inf")
+
+        self._writer = threading.Thread(target=self._write_loop, name="saga-journal-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide journal, creating it on first use """
+        if SagaJournal._instance is None:
+            with SagaJournal._instance_lock:
+                if SagaJournal._instance is None:
+                    SagaJournal._instance = SagaJournal()
+        return SagaJournal._instance
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # FULL : chaque commit est synchronisé sur disque (fsync) avant d'être confirmé
+        connection.execute("PRAGMA synchronous=FULL")
+        return connection
+
+    def append_nowait(self, saga_id, state, data=None):
+        """ Queue a transition and return a Future that is resolved once the entry is durable """
+        future = Future()
+        entry = (saga_id, state.name, json.dumps(data) if data is not None else None, time.time(), self.owner, self.started_at)
+        with self._condition:
+            if self._is_closing:
+                raise RuntimeError("Le journal des sagas est fermé")
+            self._pending.append((entry, future))
+            self._condition.notify()
+        return future
+
+    def append(self, saga_id, state, data=None):
+        """ Record a transition and wait until it is durable """
+        self.append_nowait(saga_id, state, data).result()
+
+    def _write_loop(self):
+        """ Commit pending entries in batches until the journal is closed. Between commits, renew the lease of this process and compact the journal on time. """
+        connection = self._connect()
+        while True:
+            with self._condition:
+                while not self._pending and not self._is_closing:
+                    delay = min(self._next_renewal, self._next_compaction) - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                if not self._pending and self._is_closing:
+                    break
+                has_pending = bool(self._pending)
+            if time.monotonic() >= self._next_renewal:
+                self._next_renewal = time.monotonic() + self.lease_seconds / 3
+                self._renew_lease(connection)
+            if time.monotonic() >= self._next_compaction:
+                self._next_compaction = time.monotonic() + self.compact_interval
+                self._compact_in_background(connection)
+            if not has_pending:
+                continue
+            if self.commit_delay:
+                # Laisser d'autres transitions rejoindre ce commit
+                time.sleep(self.commit_delay)
+            with self._condition:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT INTO saga_log (saga_id, state, data, created_at, owner, owner_started_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        [entry for entry, _ in batch]
+                    )
+                for _, future in batch:
+                    future.set_result(None)
+            except Exception as e:
+                self.logger.error("L'écriture de %s transition(s) dans le journal a échoué : %s", len(batch), e)
+                for _, future in batch:
+                    future.set_exception(e)
+        connection.close()
+
+    def _renew_lease(self, connection):
+        """ Record that this process is alive. An error is logged: the lease expires if the journal cannot be written for too long. """
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO saga_owner (owner, started_at, heartbeat_at) VALUES (?, ?, ?)",
+                    (self.owner, self.started_at, time.time())
+                )
+        except Exception as e:
+            self.logger.error("Le bail du processus %s dans le journal n'a pas pu être renouvelé : %s", self.owner, e)
+
+    def get_unfinished_sagas(self):
+        """
+        Return (saga_id, state name, data) for every orphaned saga: its last recorded state is not COMPLETED and the process that wrote it is gone.
+        The sagas still run by a live process (this one, or another process sharing the journal) are left alone.
+        """
+        connection = self._connect()
+        try:
+            rows = connection.execute("""
+                SELECT saga_log.saga_id, saga_log.state, saga_log.data, saga_log.created_at, saga_log.owner, saga_log.owner_started_at, saga_owner.heartbeat_at
+                FROM saga_log LEFT JOIN saga_owner ON saga_owner.owner = saga_log.owner AND saga_owner.started_at = saga_log.owner_started_at
+                WHERE saga_log.id IN (SELECT MAX(id) FROM saga_log GROUP BY saga_id) AND saga_log.state != 'COMPLETED'
+                ORDER BY saga_log.id
+            """).fetchall()
+        finally:
+            connection.close()
+        return [
+            (saga_id, state, json.loads(data) if data else {})
+            for saga_id, state, data, created_at, owner, owner_started_at, heartbeat_at in rows
+            if self._is_orphaned(created_at, owner, owner_started_at, heartbeat_at)
+        ]
+
+    def _is_orphaned(self, created_at, owner, owner_started_at, heartbeat_at):
+        """
+        Return True if the process that wrote this entry no longer runs the saga: it is proven dead on this host,
+        or it has not renewed its lease for SAGA_JOURNAL_LEASE_SECONDS (another host, an entry without owner, a reused pid, a hung process).
+        """
+        hostname, _, pid = (owner or "").rpartition(":")
+        if hostname == self.hostname and pid.isdigit():
+            if int(pid) == os.getpid():
+                # Ce processus, ou un processus précédent qui avait le même pid
+                return owner_started_at != self.started_at
+            if not is_process_alive(int(pid)):
+                return True
+        # Sinon, seul un bail expiré le prouve. Sans bail (ancienne entrée, arrêt avant le premier renouvellement), l'entrée elle-même est le dernier signe de vie
+        last_seen_at = max(heartbeat_at or 0.0, created_at)
+        return last_seen_at < time.time() - self.lease_seconds
+
+    def get_last_entry(self, saga_id):
+        """ Return (state name, data) of the last transition recorded for a saga, or None if the saga is unknown """
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT state, data FROM saga_log WHERE saga_id = ? ORDER BY id DESC LIMIT 1", (saga_id,)
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] else {}
+
+    def compact(self, retention_seconds=None):
+        """ Delete the entries of sagas that were completed more than retention_seconds ago. Return the number of deleted entries. """
+        connection = self._connect()
+        try:
+            return self._compact(connection, retention_seconds)
+        finally:
+            connection.close()
+
+    def _compact(self, connection, retention_seconds=None):
+        retention_seconds = config.SAGA_JOURNAL_RETENTION_SECONDS if retention_seconds is None else retention_seconds
+        expired_before = time.time() - retention_seconds
+        with connection:
+            cursor = connection.execute("""
+                DELETE FROM saga_log WHERE saga_id IN (
+                    SELECT saga_id FROM saga_log WHERE state = 'COMPLETED' AND created_at < ?
+                )
+            """, (expired_before,))
+            removed_count = cursor.rowcount
+            # Baux des processus arrêtés depuis longtemps : leurs sagas non terminées expirent alors sur leur propre date
+            connection.execute("DELETE FROM saga_owner WHERE heartbeat_at < ?", (min(expired_before, time.time() - self.lease_seconds),))
+        return removed_count
+
+    def _compact_in_background(self, connection):
+        """ Compact the journal from the writer thread. An error is logged: the next compaction will try again. """
+        try:
+            removed_count = self._compact(connection)
+            if removed_count:
+                self.logger.debug("%s entrée(s) de sagas terminées supprimée(s) du journal", removed_count)
+        except Exception as e:
+            self.logger.error("Le compactage du journal a échoué : %s", e)
+
+    def close(self):
+        """ Write the remaining entries and stop the writer thread """
+        with self._condition:
+            self._is_closing = True
+            self._condition.notify()
+        self._writer.join()
@@ -0,0 +1,105 @@
+"""
+Saga metrics
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import os
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily
+from prometheus_client.registry import Collector
+from logger import Logger
+
+# Bornes des histogrammes (secondes) : de quelques ms (un appel HTTP local) jusqu'au délai maximal d'une saga
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Bornes de l'âge des entrées du cache du catalogue (secondes), jusqu'au TTL par défaut des produits
+CACHE_AGE_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+SAGA_DURATION = Histogram("saga_duration_seconds", "Duration of sagas, by final outcome (completed, compensated, compensation_failed)",
+                          ["saga", "outcome"], buckets=LATENCY_BUCKETS)
+# livesum : avec plusieurs workers gunicorn, somme des processus encore vivants
+SAGAS_IN_FLIGHT = Gauge("sagas_in_flight", "Sagas being executed", ["saga"], multiprocess_mode="livesum")
+STEP_DURATION = Histogram("saga_step_duration_seconds", "Duration of the handler calls of each step, for run and rollback, by outcome",
+                          ["saga", "step", "action", "outcome"], buckets=LATENCY_BUCKETS)
+STATE_TRANSITIONS = Counter("saga_state_transitions_total", "Number of times a saga entered each state", ["saga", "state"])
+CACHE_LOOKUPS = Counter("catalog_cache_lookups_total", "Lookups in the catalog cache, by cache (product, stock) and result (hit, miss)", ["cache", "result"])
+CACHE_ENTRY_AGE = Histogram("catalog_cache_entry_age_seconds", "Age of the catalog cache entries returned on a hit (staleness)",
+                            ["cache"], buckets=CACHE_AGE_BUCKETS)
+ORDERS_REJECTED = Counter("orders_rejected_total", "Orders rejected before the saga starts, by reason", ["reason"])
+STOCK_RESERVATIONS = Counter("stock_reservations_total", "Stock reservations, by event (reserved, committed, abandoned, expired)", ["event"])
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Orders rejected by admission control, by reason (rate_limited, overloaded)", ["reason"])
+ADMISSION_LIMIT = Gauge("admission_concurrency_limit", "Current adaptive limit of sagas running at the same time", multiprocess_mode="livesum")
+STOCK_RESERVATIONS_HELD = Gauge("stock_reservations_held", "Stock reservations not committed nor expired yet", multiprocess_mode="livesum")
+
+class LogDropCollector(Collector):
+    """ Expose the number of log records dropped because the log queue was full (LOG_ASYNC) """
+
+    def collect(self):
+        yield CounterMetricFamily("log_records_dropped", "Log records dropped because the log queue was full", value=Logger.get_dropped_count())
+
+REGISTRY.register(LogDropCollector())
+
+# Séries déjà créées, par métrique et labels : évite le verrou de prometheus_client (labels()) à chaque mesure
+_children = {}
+
+def _get_child(metric, *label_values):
+    key = (metric, label_values)
+    child = _children.get(key)
+    if child is None:
+        child = _children.setdefault(key, metric.labels(*label_values))
+    return child
+
+def saga_started(saga_name):
+    """ Count a saga as in flight """
+    _get_child(SAGAS_IN_FLIGHT, saga_name).inc()
+
+def saga_finished(saga_name, outcome, duration):
+    """ Record the duration and the outcome of a saga, and remove it from the sagas in flight """
+    _get_child(SAGAS_IN_FLIGHT, saga_name).dec()
+    _get_child(SAGA_DURATION, saga_name, outcome).observe(duration)
+
+def record_state(saga_name, state_name):
+    """ Count a transition to a state """
+    _get_child(STATE_TRANSITIONS, saga_name, state_name).inc()
+
+def record_step(saga_name, step_name, action, is_success, duration):
+    """ Record the duration of a handler call (action: run or rollback) """
+    _get_child(STEP_DURATION, saga_name, step_name, action, "success" if is_success else "failure").observe(duration)
+
+def record_cache_lookup(cache_name, is_hit, age=None):
+    """ Count a lookup in the catalog cache and, on a hit, record the age of the entry returned """
+    _get_child(CACHE_LOOKUPS, cache_name, "hit" if is_hit else "miss").inc()
+    if is_hit:
+        _get_child(CACHE_ENTRY_AGE, cache_name).observe(age)
+
+def record_order_rejected(reason):
+    """ Count an order rejected before the saga (ex. unknown_product, insufficient_stock) """
+    _get_child(ORDERS_REJECTED, reason).inc()
+
+def record_admission_rejected(reason):
+    """ Count an order rejected by admission control (rate_limited or overloaded) """
+    _get_child(ADMISSION_REJECTED, reason).inc()
+
+def set_admission_limit(limit):
+    """ Publish the current adaptive concurrency limit """
+    ADMISSION_LIMIT.set(limit)
+
+# Effet de chaque événement sur le nombre de réservations détenues
+_RESERVATION_HELD_DELTAS = {"reserved": 1, "committed": -1, "expired": -1}
+
+def record_stock_reservation(event):
+    """ Count a stock reservation event and update the number of reservations held """
+    _get_child(STOCK_RESERVATIONS, event).inc()
+    held_delta = _RESERVATION_HELD_DELTAS.get(event, 0)
+    if held_delta:
+        STOCK_RESERVATIONS_HELD.inc(held_delta)
+
+def get_metrics():
+    """
+    Return the metrics in the Prometheus text format, and their content type.
+    With PROMETHEUS_MULTIPROC_DIR (set by gunicorn.conf.py), the metrics of every worker process are aggregated, except log_records_dropped.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -3,61 +3,265 @@ Saga Orchestrator
 SPDX - License - Identifier: LGPL - 3.0 - or -later
 Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
 """
+import json
+import math
+import signal
+import sys
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import config
-from flask import Flask, jsonify, request
+from admission_control import AdmissionController
+from catalog_cache import CatalogCache
+from circuit_breaker import CircuitBreakerRegistry
+from flask import Blueprint, Flask, Response, jsonify, request, stream_with_context
+from controllers.message_order_saga_controller import MessageOrderSagaController
 from controllers.order_saga_controller import OrderSagaController
+from http_client import HttpClient
+from idempotency_store import IdempotencyStore
+from order_request import normalize_order_request
+from saga_batch import SagaBatchRunner
+from saga_metrics import get_metrics
+from saga_profiler import get_slow_sagas
+from saga_recovery import recover_unfinished_sagas
+from saga_status import get_saga_status
+from saga_worker_pool import SagaWorkerPool
+from server_lifecycle import ServerLifecycle
 
-# Configuration OpenTelemetry pour Jaeger
 from opentelemetry import trace
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
-
-app = Flask(__name__)
-
-# Configuration du tracing
-resource = Resource.create({
-   "service.name": "saga-orchestrator",
-   "service.version": "1.0.0"
-})
-
-trace.set_tracer_provider(TracerProvider(resource=resource))
-tracer = trace.get_tracer(__name__)
-
-# Configuration de l'exportateur Jaeger
-otlp_exporter = OTLPSpanExporter(
-   endpoint="http://jaeger:4317",
-   insecure=True
-)
-span_processor = BatchSpanProcessor(otlp_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
-
-# Instrumentation automatique
-FlaskInstrumentor().instrument_app(app)
-RequestsInstrumentor().instrument()
-
-@app.get('/health-check')
+from tracing import setup_tracing
+
+blueprint = Blueprint('saga_orchestrator', __name__)
+
+def create_app():
+    """
+    Return the Flask application (gunicorn: "saga_orchestrator:create_app()"). Tracing is set up in the background (TRACING_ENABLED),
+    the OpenTelemetry instrumentors being imported only if it is enabled. The interrupted sagas are recovered before the application is returned.
+    """
+    app = Flask(__name__)
+    app.register_blueprint(blueprint)
+
+    # Instrumentation automatique
+    if setup_tracing():
+        from opentelemetry.instrumentation.flask import FlaskInstrumentor
+        from opentelemetry.instrumentation.requests import RequestsInstrumentor
+        FlaskInstrumentor().instrument_app(app)
+        requests_instrumentor = RequestsInstrumentor()
+        if not requests_instrumentor.is_instrumented_by_opentelemetry:
+            requests_instrumentor.instrument()
+
+    # Compenser les sagas interrompues par un arrêt précédent avant d'accepter des requêtes
+    if config.SAGA_JOURNAL_ENABLED and config.SAGA_RECOVERY_ON_STARTUP:
+        recover_unfinished_sagas()
+    return app
+
+@blueprint.get('/health-check')
 def health():
     """ Return OK if app is up and running """
     return jsonify({'status': 'ok'})
 
-@app.post('/saga/order')
+@blueprint.get('/ready')
+def ready():
+    """ Return 200 if this process accepts new sagas, 503 while it is shutting down or when its worker pool is full """
+    is_ready, details = ServerLifecycle.get_instance().get_readiness()
+    return jsonify({'status': 'ready' if is_ready else 'unavailable', **details}), 200 if is_ready else 503
+
+@blueprint.get('/http-pool/stats')
+def http_pool_stats():
+    """ Return connection pool counters of the shared HTTP client (hits, misses, wait time) """
+    return jsonify(HttpClient.get_instance().get_stats())
+
+@blueprint.get('/metrics')
+def metrics():
+    """ Return saga metrics (durations, step latencies, transitions, sagas in flight) in the Prometheus text format """
+    body, content_type = get_metrics()
+    return Response(body, content_type=content_type)
+
+@blueprint.get('/circuit-breakers')
+def circuit_breakers():
+    """ Return the state of the circuit breakers of the downstream services """
+    return jsonify(CircuitBreakerRegistry.get_instance().get_stats())
+
+@blueprint.get('/debug/slow-sagas')
+def slow_sagas():
+    """ Return the timeline of the slowest sagas (SAGA_PROFILER_ENABLED), slowest first. Optional query parameter: limit. """
+    return jsonify(get_slow_sagas(request.args.get('limit', type=int)))
+
+def start_saga(payload, respond_async, on_finished=None):
+    """
+    Run the saga (or submit it to the worker pool if respond_async is True). Return (body, status code, headers).
+    With a 202, the saga goes on in the background: on_finished, if given, is called once it is finished. It is not called for any other response.
+    The payload is validated and normalized first (400 if it is invalid).
+    If a critical circuit breaker is open, return 503 right away: the saga would fail, after creating an order that must then be cancelled.
+    With CATALOG_VALIDATION_ENABLED, unknown products and quantities above the cached stock are rejected (400) for the same reason.
+    """
+    lifecycle = ServerLifecycle.get_instance()
+    if lifecycle.is_draining():
+        return {'error': "Le serveur s'arrête, veuillez réessayer plus tard"}, 503, {'Retry-After': str(config.SAGA_QUEUE_RETRY_AFTER_SECONDS)}
+
+    payload, error = normalize_order_request(payload)
+    if error is not None:
+        return {'error': "Requête invalide", 'details': [error]}, 400, {}
+
+    retry_after = CircuitBreakerRegistry.get_instance().get_critical_retry_after()
+    if retry_after > 0:
+        return {'error': "Un service requis par la saga est indisponible, veuillez réessayer plus tard"}, 503, {'Retry-After': str(math.ceil(retry_after))}
+
+    if config.CATALOG_VALIDATION_ENABLED:
+        errors = CatalogCache.get_instance().validate_order(payload['items'])
+        if errors:
+            return {'error': "Commande invalide", 'details': errors}, 400, {}
+
+    if respond_async:
+        saga_id = SagaWorkerPool.get_instance().submit(payload, on_finished)
+        if saga_id is None and lifecycle.is_draining():
+            return {'error': "Le serveur s'arrête, veuillez réessayer plus tard"}, 503, {'Retry-After': str(config.SAGA_QUEUE_RETRY_AFTER_SECONDS)}
+        if saga_id is None:
+            return {'error': "Trop de sagas en cours, veuillez réessayer plus tard"}, 429, {'Retry-After': str(config.SAGA_QUEUE_RETRY_AFTER_SECONDS)}
+        status_url = f"/saga/order/{saga_id}"
+        return {'saga_id': saga_id, 'status': 'ACCEPTED', 'status_url': status_url}, 202, {'Location': status_url}
+
+    if config.SAGA_TRANSPORT == "messaging":
+        order_saga_controller = MessageOrderSagaController()
+        with lifecycle.track_saga():
+            result = order_saga_controller.run(payload, config.MESSAGE_REPLY_TIMEOUT_SECONDS)
+        if result is None:
+            # La saga continue sans le client : son état reste lisible avec GET /saga/order/<saga_id>
+            if on_finished is not None:
+                order_saga_controller.result.add_done_callback(lambda _: on_finished())
+            status_url = f"/saga/order/{order_saga_controller.saga_id}"
+            return {'saga_id': order_saga_controller.saga_id, 'status': 'RUNNING', 'status_url': status_url}, 202, {'Location': status_url}
+    else:
+        order_saga_controller = OrderSagaController()
+        with lifecycle.track_saga():
+            result = order_saga_controller.run(payload)
+
+    if result["status"] == "OK":
+        return result, 200, {}
+    else:
+        return result, 500, {}
+
+def start_admitted_saga(payload, respond_async):
+    """
+    Run start_saga if admission control lets the order in (otherwise 429 or 503), and release its slot once the saga is finished:
+    when start_saga answers, or later for a saga that goes on in the background (202).
+    """
+    admission = AdmissionController.get_instance()
+    if admission is None:
+        return start_saga(payload, respond_async)
+    user_id = payload.get('user_id') if isinstance(payload, dict) else None
+    rejection = admission.try_admit(user_id)
+    if rejection is not None:
+        trace.get_current_span().set_attribute("admission_rejected", True)
+        return rejection
+
+    try:
+        response = start_saga(payload, respond_async, admission.release)
+    except BaseException:
+        admission.release()
+        raise
+    # Avec 202, la saga continue en arrière-plan et rend elle-même son créneau quand elle se termine
+    if response[1] != 202:
+        admission.release()
+    return response
+
+def start_saga_once(idempotency_key, payload, respond_async):
+    """
+    Start the saga only for the first request with this Idempotency-Key. Duplicates wait for, then replay, the first response:
+    they are looked up before admission control, so they take neither a rate limit token nor a concurrency slot.
+    """
+    store = IdempotencyStore.get_instance()
+    entry, is_first = store.begin(idempotency_key, payload)
+
+    if not is_first:
+        if entry.fingerprint != store.fingerprint(payload):
+            return {'error': "Cette Idempotency-Key a déjà été utilisée avec une autre requête"}, 422, {}
+        try:
+            body, status_code, headers = entry.future.result(timeout=config.IDEMPOTENCY_WAIT_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            return {'error': "Une requête avec cette Idempotency-Key est encore en cours"}, 409, {'Retry-After': str(config.SAGA_QUEUE_RETRY_AFTER_SECONDS)}
+        return body, status_code, {**headers, 'Idempotent-Replayed': 'true'}
+
+    try:
+        response = start_admitted_saga(payload, respond_async)
+    except Exception:
+        store.discard(idempotency_key, entry, ({'error': "La requête originale a échoué, veuillez réessayer"}, 500, {}))
+        raise
+
+    # Un refus temporaire ne doit pas empêcher une nouvelle tentative avec la même clé
+    store.finish(idempotency_key, entry, response)
+    return response
+
+def start_batch_order(batch_idempotency_key, index, order):
+    """
+    Start the saga of one order of a batch, through admission control like POST /saga/order. If the batch has an Idempotency-Key,
+    each order has its own key ("<key>:<index>"): a batch sent again replays the response of its orders instead of starting new sagas.
+    """
+    if batch_idempotency_key:
+        return start_saga_once(f"{batch_idempotency_key}:{index}", order, False)
+    return start_admitted_saga(order, False)
+
+@blueprint.post('/saga/order')
 def saga_order():
-    """ Start order saga """
+    """ 
+    Start order saga. In async mode (SAGA_ASYNC_SUBMISSION or header 'Prefer: respond-async'), return 202 right away and run the saga in the background.
+    Requests sent again with the same Idempotency-Key header do not start a new saga.
+    """
     tracer = trace.get_tracer(__name__)
     
-    with tracer.start_as_current_span("saga_order"):
-        order_saga_controller = OrderSagaController()
-        result = order_saga_controller.run(request)
+    with tracer.start_as_current_span("saga_order") as span:
+        payload = request.get_json() or {}
+        respond_async = config.SAGA_ASYNC_SUBMISSION or "respond-async" in request.headers.get("Prefer", "")
+        idempotency_key = request.headers.get("Idempotency-Key")
 
-        if result["status"] == "OK":
-            return jsonify(result), 200
+        if idempotency_key:
+            span.set_attribute("idempotency_key", idempotency_key)
+            body, status_code, headers = start_saga_once(idempotency_key, payload, respond_async)
         else:
-            return jsonify(result), 500
+            body, status_code, headers = start_admitted_saga(payload, respond_async)
+        return jsonify(body), status_code, headers
+
+@blueprint.post('/saga/orders:batch')
+def saga_orders_batch():
+    """
+    Start one order saga per element of "orders", BATCH_CONCURRENCY at a time. The response is streamed as NDJSON:
+    one line {"index", "status_code", "body"} per order, written as soon as its saga finishes (so not in the order of the request).
+    Each order goes through admission control and, if the batch has an Idempotency-Key header, through the idempotency store (see start_batch_order).
+    """
+    payload = request.get_json(silent=True)
+    idempotency_key = request.headers.get("Idempotency-Key")
+    orders = payload.get('orders') if isinstance(payload, dict) else None
+    if not isinstance(orders, list) or not orders:
+        return jsonify({'error': "Le corps doit contenir une liste non vide « orders »"}), 400
+    if len(orders) > config.BATCH_MAX_ORDERS:
+        return jsonify({'error': f"Un lot contient au plus {config.BATCH_MAX_ORDERS} commandes"}), 413
+    if ServerLifecycle.get_instance().is_draining():
+        return jsonify({'error': "Le serveur s'arrête, veuillez réessayer plus tard"}), 503, {'Retry-After': str(config.SAGA_QUEUE_RETRY_AFTER_SECONDS)}
+
+    def generate():
+        tracer = trace.get_tracer(__name__)
+        with tracer.start_as_current_span("saga_orders_batch") as span:
+            span.set_attribute("orders_count", len(orders))
+            if idempotency_key:
+                span.set_attribute("idempotency_key", idempotency_key)
+            run_order = lambda index, order: start_batch_order(idempotency_key, index, order)
+            for index, body, status_code in SagaBatchRunner.get_instance().run(orders, run_order):
+                yield json.dumps({'index': index, 'status_code': status_code, 'body': body}) + "\n"
+
+    return Response(stream_with_context(generate()), content_type="application/x-ndjson")
+
+@blueprint.get('/saga/order/<saga_id>')
+def saga_order_status(saga_id):
+    """ Return the current state of a saga submitted in async mode, or still running after a 202 of the message transport """
+    status = get_saga_status(saga_id)
+    if status is None:
+        return jsonify({'error': f"Saga {saga_id} introuvable"}), 404
+    return jsonify(status), 200
+
+def handle_sigterm(signum, frame):
+    """ Finish the sagas in progress before stopping the development server """
+    ServerLifecycle.get_instance().drain(config.SERVER_GRACEFUL_TIMEOUT_SECONDS)
+    sys.exit(0)
 
-# Start Flask app
+# Start Flask app (serveur de développement, un seul processus : en production, utiliser gunicorn -c gunicorn.conf.py)
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=config.FLASK_PORT)
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    create_app().run(host='0.0.0.0', port=config.FLASK_PORT)
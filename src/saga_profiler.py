@@ -0,0 +1,265 @@
+"""
+Saga profiler
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import config
+from opentelemetry import context as otel_context
+
+# Lu une seule fois : désactivé, chaque point de mesure ne coûte qu'un test de ce booléen
+ENABLED = config.SAGA_PROFILER_ENABLED
+
+# Clé du contexte OpenTelemetry qui porte le profil de la saga : le contexte est déjà transmis aux threads des étapes parallèles
+SAGA_PROFILE_CONTEXT_KEY = otel_context.create_key("saga_profile")
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class SagaProfile:
+    """
+    Compact timeline of one saga: state transitions, handler calls, HTTP requests and retries, with their offset from the start of the saga.
+    Network time is the time spent waiting for responses; the requests of parallel steps overlap, so it can exceed the duration of the saga.
+    """
+
+    def __init__(self, saga_name, saga_id, max_events):
+        """ Constructor method """
+        self.saga_name = saga_name
+        self.saga_id = saga_id
+        self.max_events = max_events
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.outcome = "unfinished"
+        self.events = []
+        self.dropped_events = 0
+        self.step_seconds = {}
+        self.network_seconds = 0.0
+        self.backoff_seconds = 0.0
+        self.request_count = 0
+        self.retry_count = 0
+        # Pile d'appels échantillonnée -> nombre d'échantillons (SAGA_PROFILER_SAMPLE_INTERVAL_MS)
+        self.samples = Counter()
+        self._lock = threading.Lock()
+
+    def _add_event(self, event):
+        """ Append an event to the timeline, unless it already holds max_events """
+        if len(self.events) < self.max_events:
+            self.events.append(event)
+        else:
+            self.dropped_events += 1
+
+    def _get_offset_ms(self, timestamp=None):
+        return round(((timestamp or time.perf_counter()) - self.start) * 1000, 3)
+
+    def record_state(self, state_name):
+        """ Record a transition to a state """
+        with self._lock:
+            self._add_event({"at_ms": self._get_offset_ms(), "event": "state", "state": state_name})
+
+    def record_step(self, step_name, action, is_success, duration):
+        """ Record a handler call (action: run or rollback) that just finished """
+        now = time.perf_counter()
+        key = f"{step_name}.{action}"
+        with self._lock:
+            self.step_seconds[key] = self.step_seconds.get(key, 0.0) + duration
+            self._add_event({"at_ms": self._get_offset_ms(now - duration), "event": "step", "step": step_name, "action": action,
+                             "duration_ms": round(duration * 1000, 3), "success": is_success})
+
+    def record_request(self, method, url, start, duration, status_code):
+        """ Record one HTTP request (one attempt); status_code is None if no response was received """
+        with self._lock:
+            self.network_seconds += duration
+            self.request_count += 1
+            self._add_event({"at_ms": self._get_offset_ms(start), "event": "request", "method": method, "path": urlsplit(url).path,
+                             "duration_ms": round(duration * 1000, 3), "status_code": status_code})
+
+    def record_retry(self, attempt, delay, reason):
+        """ Record the backoff before an attempt is sent again """
+        with self._lock:
+            self.backoff_seconds += delay
+            self.retry_count += 1
+            self._add_event({"at_ms": self._get_offset_ms(), "event": "retry", "attempt": attempt,
+                             "backoff_ms": round(delay * 1000, 3), "reason": reason})
+
+    def record_sample(self, frame):
+        """ Count a stack sample of the thread running the saga """
+        with self._lock:
+            self.samples[frame] += 1
+
+    def finish(self):
+        """ Stop the clock of the saga """
+        self.duration = time.perf_counter() - self.start
+
+    def to_dict(self):
+        """ Return the profile as a JSON-serializable dict """
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.start
+        with self._lock:
+            return {
+                "saga_id": self.saga_id,
+                "saga": self.saga_name,
+                "started_at": self.started_at,
+                "duration_ms": round(duration * 1000, 3),
+                "outcome": self.outcome,
+                "network_ms": round(self.network_seconds * 1000, 3),
+                "backoff_ms": round(self.backoff_seconds * 1000, 3),
+                # Temps passé dans l'orchestrateur (sérialisation, journal, attente d'un thread...) : ni réseau, ni attente entre deux tentatives
+                "local_ms": round(max(0.0, duration - self.network_seconds - self.backoff_seconds) * 1000, 3),
+                "requests": self.request_count,
+                "retries": self.retry_count,
+                "steps_ms": {key: round(seconds * 1000, 3) for key, seconds in self.step_seconds.items()},
+                "timeline": list(self.events),
+                "dropped_events": self.dropped_events,
+                "samples": [{"frame": frame, "count": count} for frame, count in self.samples.most_common(10)],
+            }
+
+class SlowSagaRecorder:
+    """
+    Keep the SAGA_PROFILER_SLOWEST slowest sagas seen by this process (min-heap on the duration: a faster saga is dropped without taking the lock).
+    With SAGA_PROFILER_SAMPLE_INTERVAL_MS, a thread also samples the stack of the threads running sagas (sync engine only: async sagas share one thread).
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, capacity=None, sample_interval_ms=None):
+        """ Constructor method """
+        self.capacity = config.SAGA_PROFILER_SLOWEST if capacity is None else capacity
+        self.sample_interval = (config.SAGA_PROFILER_SAMPLE_INTERVAL_MS if sample_interval_ms is None else sample_interval_ms) / 1000
+        self._slowest = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        # Identifiant de thread -> profil de la saga qu'il exécute
+        self._sampled_threads = {}
+        if self.sample_interval > 0:
+            threading.Thread(target=self._sample_loop, name="saga-profiler", daemon=True).start()
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide recorder, creating it on first use """
+        if SlowSagaRecorder._instance is None:
+            with SlowSagaRecorder._instance_lock:
+                if SlowSagaRecorder._instance is None:
+                    SlowSagaRecorder._instance = SlowSagaRecorder()
+        return SlowSagaRecorder._instance
+
+    def offer(self, profile):
+        """ Keep a finished profile if it is among the slowest """
+        if len(self._slowest) >= self.capacity and profile.duration <= self._slowest[0][0]:
+            return
+        with self._lock:
+            entry = (profile.duration, next(self._sequence), profile)
+            if len(self._slowest) < self.capacity:
+                heapq.heappush(self._slowest, entry)
+            elif profile.duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def get_slowest(self, limit=None):
+        """ Return the slowest sagas kept, slowest first """
+        with self._lock:
+            entries = sorted(self._slowest, reverse=True)
+        return [profile.to_dict() for _, _, profile in entries[:limit]]
+
+    def clear(self):
+        """ Forget the sagas kept """
+        with self._lock:
+            self._slowest = []
+
+    @contextmanager
+    def sampling(self, profile):
+        """ Sample the stack of the current thread while it runs the saga """
+        if self.sample_interval <= 0:
+            yield
+            return
+        thread_id = threading.get_ident()
+        self._sampled_threads[thread_id] = profile
+        try:
+            yield
+        finally:
+            self._sampled_threads.pop(thread_id, None)
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.sample_interval)
+            if not self._sampled_threads:
+                continue
+            frames = sys._current_frames()
+            for thread_id, profile in list(self._sampled_threads.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.record_sample(self._describe(frame))
+
+    @staticmethod
+    def _describe(frame):
+        """ Describe a stack by its innermost frame and, if different, the innermost frame of the orchestrator code """
+        innermost = f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+        while frame is not None and not frame.f_code.co_filename.startswith(SRC_DIR):
+            frame = frame.f_back
+        if frame is None:
+            return innermost
+        own = f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+        return own if own == innermost else f"{own} > {innermost}"
+
+@contextmanager
+def profile_saga(saga_name, saga_id, is_sampled=True):
+    """ Profile the saga run in this block (including its parallel steps). Does nothing if SAGA_PROFILER_ENABLED is false. """
+    if not ENABLED:
+        yield
+        return
+    recorder = SlowSagaRecorder.get_instance()
+    profile = SagaProfile(saga_name, saga_id, config.SAGA_PROFILER_MAX_EVENTS)
+    token = otel_context.attach(otel_context.set_value(SAGA_PROFILE_CONTEXT_KEY, profile))
+    try:
+        if is_sampled:
+            with recorder.sampling(profile):
+                yield
+        else:
+            yield
+    finally:
+        otel_context.detach(token)
+        profile.finish()
+        recorder.offer(profile)
+
+def get_slow_sagas(limit=None):
+    """ Return the body of GET /debug/slow-sagas: the slowest sagas kept, slowest first (at most limit) """
+    if not ENABLED:
+        return {"enabled": False, "sagas": []}
+    recorder = SlowSagaRecorder.get_instance()
+    return {"enabled": True, "capacity": recorder.capacity, "sagas": recorder.get_slowest(limit)}
+
+def get_current_profile():
+    """ Return the profile of the saga being executed, or None """
+    if not ENABLED:
+        return None
+    return otel_context.get_value(SAGA_PROFILE_CONTEXT_KEY)
+
+def record_state(state_name):
+    """ Record a transition of the current saga """
+    profile = get_current_profile()
+    if profile is not None:
+        profile.record_state(state_name)
+
+def record_step(step_name, action, is_success, duration):
+    """ Record a handler call of the current saga """
+    profile = get_current_profile()
+    if profile is not None:
+        profile.record_step(step_name, action, is_success, duration)
+
+def record_retry(attempt, delay, reason):
+    """ Record a retry of a request of the current saga """
+    profile = get_current_profile()
+    if profile is not None:
+        profile.record_retry(attempt, delay, reason)
+
+def record_outcome(outcome):
+    """ Record the final outcome of the current saga (completed, compensated, compensation_failed) """
+    profile = get_current_profile()
+    if profile is not None:
+        profile.outcome = outcome
@@ -0,0 +1,35 @@
+"""
+Saga recovery
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from controllers.order_saga_controller import OrderSagaController
+from logger import Logger
+from saga_journal import SagaJournal
+
+def recover_unfinished_sagas(journal=None):
+    """ Compensate every saga whose last journal entry is not COMPLETED (ex. after a crash). Return the number of recovered sagas. """
+    logger = Logger.get_instance('SagaRecovery')
+    journal = journal or SagaJournal.get_instance()
+    unfinished_sagas = journal.get_unfinished_sagas()
+    if unfinished_sagas:
+        logger.warning("%s saga(s) non terminée(s) trouvée(s) dans le journal, compensation en cours", len(unfinished_sagas))
+
+    for saga_id, state_name, snapshot in unfinished_sagas:
+        try:
+            OrderSagaController(journal=journal).recover(saga_id, state_name, snapshot)
+            logger.info("Saga %s (%s) compensée : commande %s", saga_id, state_name, snapshot.get('order_id', 0))
+        except Exception as e:
+            logger.error("La reprise de la saga %s a échoué : %s", saga_id, e)
+
+    removed_count = journal.compact()
+    if removed_count:
+        logger.debug("%s entrée(s) de sagas terminées supprimée(s) du journal", removed_count)
+    return len(unfinished_sagas)
+
+if __name__ == '__main__':
+    # Reprise seule, dans un processus séparé (voir gunicorn.conf.py)
+    from tracing import flush_tracing, setup_tracing
+    setup_tracing(wait=True)
+    recover_unfinished_sagas()
+    flush_tracing()
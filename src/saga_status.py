@@ -0,0 +1,33 @@
+"""
+Saga status
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import config
+from messaging.saga_reply_dispatcher import SagaReplyDispatcher
+from saga_journal import SagaJournal
+from saga_worker_pool import SagaWorkerPool
+
+def get_saga_status(saga_id):
+    """
+    Return the current state of a saga (GET /saga/order/<saga_id>), or None if it is unknown.
+    The sagas run by this process (async submission, message transport) are looked up in memory, the others in the journal.
+    """
+    # Pool et dispatcher lus seulement s'ils existent : une lecture d'état ne démarre pas leurs threads
+    for source in (SagaWorkerPool._instance, SagaReplyDispatcher._instance):
+        status = source.get_status(saga_id) if source is not None else None
+        if status is not None:
+            return status
+
+    # Saga lancée par un autre processus ou oubliée de la mémoire : on consulte le journal
+    if config.SAGA_JOURNAL_ENABLED:
+        last_entry = SagaJournal.get_instance().get_last_entry(saga_id)
+        if last_entry is not None:
+            state_name, data = last_entry
+            return {
+                "saga_id": saga_id,
+                "status": "DONE" if state_name == "COMPLETED" else "RUNNING",
+                "state": state_name,
+                "order_id": data.get("order_id", 0),
+            }
+    return None
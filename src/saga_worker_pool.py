@@ -0,0 +1,124 @@
+"""
+Saga worker pool
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import config
+from controllers.order_saga_controller import OrderSagaController
+from logger import Logger
+
+class SagaWorkerPool:
+    """
+    Run accepted sagas in the background on a bounded number of threads.
+    The number of sagas waiting or running is limited (max_queue_depth): once reached, submit refuses new sagas instead of queuing them without limit.
+    The controllers of recent sagas are kept (max_tracked_sagas) to report their current state.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_workers=None, max_queue_depth=None, max_tracked_sagas=None):
+        """ Constructor method """
+        self.max_workers = config.SAGA_WORKERS if max_workers is None else max_workers
+        self.max_queue_depth = config.SAGA_QUEUE_MAX_DEPTH if max_queue_depth is None else max_queue_depth
+        self.max_tracked_sagas = config.SAGA_STATUS_MAX_ENTRIES if max_tracked_sagas is None else max_tracked_sagas
+        self.logger = Logger.get_instance('SagaWorkerPool')
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="saga-worker")
+        self.sagas = OrderedDict()
+        self.pending_count = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide pool, creating it on first use """
+        if SagaWorkerPool._instance is None:
+            with SagaWorkerPool._instance_lock:
+                if SagaWorkerPool._instance is None:
+                    SagaWorkerPool._instance = SagaWorkerPool()
+        return SagaWorkerPool._instance
+
+    def submit(self, payload, on_finished=None):
+        """
+        Accept a saga and run it in the background. Return its saga_id, or None if too many sagas are already waiting or running,
+        or if the pool does not accept sagas any more (shut down while the server drains).
+        on_finished is called once an accepted saga is finished (ex. to release its admission slot); it is not called for a refused saga.
+        """
+        controller = OrderSagaController()
+        with self._lock:
+            if self.pending_count >= self.max_queue_depth:
+                return None
+            self.pending_count += 1
+            self.sagas[controller.saga_id] = {"controller": controller, "status": "QUEUED", "result": None}
+            while len(self.sagas) > self.max_tracked_sagas:
+                self.sagas.popitem(last=False)
+
+        try:
+            self.executor.submit(self._run, controller, payload, on_finished)
+        except Exception as e:
+            # Saga jamais lancée : elle ne doit ni compter parmi les sagas en cours (wait_until_idle attendrait pour rien) ni être lisible comme QUEUED
+            self.logger.error("La saga %s n'a pas pu être soumise : %s", controller.saga_id, e)
+            with self._lock:
+                self.sagas.pop(controller.saga_id, None)
+                self._finish_one()
+            return None
+        return controller.saga_id
+
+    def _run(self, controller, payload, on_finished=None):
+        """ Execute one saga in a worker thread """
+        entry = self.sagas.get(controller.saga_id)
+        if entry is not None:
+            entry["status"] = "RUNNING"
+        try:
+            result = controller.run(payload)
+        except Exception as e:
+            self.logger.error("La saga %s a échoué : %s", controller.saga_id, e)
+            result = {"order_id": 0, "status": str(e)}
+        finally:
+            if on_finished is not None:
+                on_finished()
+            with self._lock:
+                self._finish_one()
+        if entry is not None:
+            entry["result"] = result
+            entry["status"] = "DONE"
+
+    def _finish_one(self):
+        """ Count one saga less as waiting or running (called with self._lock held) """
+        self.pending_count -= 1
+        if self.pending_count == 0:
+            self._idle.notify_all()
+
+    def get_status(self, saga_id):
+        """ Return the current state of a saga accepted by this pool, or None if it is unknown (see saga_status.get_saga_status) """
+        entry = self.sagas.get(saga_id)
+        if entry is not None:
+            status = {
+                "saga_id": saga_id,
+                "status": entry["status"],
+                "state": entry["controller"].current_saga_state.name,
+            }
+            if entry["result"] is not None:
+                status["result"] = entry["result"]
+            return status
+        return None
+
+    def get_stats(self):
+        """ Return the pool size and the number of sagas waiting or running """
+        return {
+            "workers": self.max_workers,
+            "max_queue_depth": self.max_queue_depth,
+            "pending": self.pending_count,
+        }
+
+    def wait_until_idle(self, timeout=None):
+        """ Wait until no saga is waiting or running. Return False if some are still pending after timeout seconds. """
+        with self._idle:
+            return self._idle.wait_for(lambda: self.pending_count == 0, timeout=timeout)
+
+    def shutdown(self, wait=True):
+        """ Stop accepting sagas and, if wait is True, let the accepted ones finish """
+        self.executor.shutdown(wait=wait)
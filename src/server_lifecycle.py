@@ -0,0 +1,96 @@
+"""
+Server lifecycle
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+import time
+from contextlib import contextmanager
+from logger import Logger
+from saga_worker_pool import SagaWorkerPool
+
+class ServerLifecycle:
+    """
+    Readiness and graceful shutdown of the current process.
+    Once draining has started (SIGTERM), the process is no longer ready (GET /ready answers 503) and refuses new sagas,
+    while drain() waits for the sagas already running (requests in progress and sagas accepted by the worker pool).
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        """ Constructor method """
+        self.logger = Logger.get_instance('ServerLifecycle')
+        self.in_flight_count = 0
+        self.draining_since = None
+        self._idle = threading.Condition()
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide lifecycle, creating it on first use """
+        if ServerLifecycle._instance is None:
+            with ServerLifecycle._instance_lock:
+                if ServerLifecycle._instance is None:
+                    ServerLifecycle._instance = ServerLifecycle()
+        return ServerLifecycle._instance
+
+    def is_draining(self):
+        """ Return True once the process has started shutting down """
+        return self.draining_since is not None
+
+    def get_draining_seconds(self):
+        """ Return the time elapsed since draining started (0 if it has not started) """
+        return time.monotonic() - self.draining_since if self.draining_since is not None else 0.0
+
+    def start_draining(self):
+        """ Stop accepting new sagas. Calling it more than once has no effect. """
+        with self._idle:
+            if self.draining_since is None:
+                self.draining_since = time.monotonic()
+                self.logger.info("Arrêt demandé : nouvelles sagas refusées, %s saga(s) en cours", self.in_flight_count)
+
+    @contextmanager
+    def track_saga(self):
+        """ Count a saga executed by the current request as in flight until the block exits """
+        with self._idle:
+            self.in_flight_count += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self.in_flight_count -= 1
+                if self.in_flight_count == 0:
+                    self._idle.notify_all()
+
+    def get_readiness(self):
+        """ Return (is_ready, details). The process is not ready while draining or when the worker pool cannot accept more sagas. """
+        details = {"draining": self.is_draining(), "in_flight": self.in_flight_count}
+        # Ne pas créer le pool s'il n'a jamais servi
+        pool = SagaWorkerPool._instance
+        if pool is not None:
+            details["worker_pool"] = pool.get_stats()
+            is_pool_full = pool.pending_count >= pool.max_queue_depth
+        else:
+            is_pool_full = False
+        return not details["draining"] and not is_pool_full, details
+
+    def drain(self, timeout):
+        """
+        Start draining, then wait (at most timeout seconds) for the sagas in flight and those accepted by the worker pool.
+        Return True if every saga has finished.
+        """
+        self.start_draining()
+        deadline = time.monotonic() + max(timeout, 0)
+        with self._idle:
+            is_idle = self._idle.wait_for(lambda: self.in_flight_count == 0, timeout=max(deadline - time.monotonic(), 0))
+
+        pool = SagaWorkerPool._instance
+        if pool is not None:
+            is_idle = pool.wait_until_idle(max(deadline - time.monotonic(), 0)) and is_idle
+
+        if is_idle:
+            self.logger.info("Toutes les sagas en cours sont terminées")
+        else:
+            self.logger.warning("Délai d'arrêt dépassé : des sagas sont encore en cours et seront compensées au prochain démarrage")
+        return is_idle
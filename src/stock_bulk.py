@@ -0,0 +1,260 @@
+"""
+Stock bulk updates
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+import config
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from http_client import HttpClient
+from http_response import get_error_text, is_request_sent, is_success
+from logger import Logger
+from retry_policy import RetryPolicy, idempotency_headers
+
+# Codes indiquant que l'API Gateway n'expose pas l'endpoint de mise à jour groupée.
+# Pas 404 : store-api le répond aussi pour un produit inconnu, ce qui désactiverait l'endpoint pour toutes les sagas ; c'est un refus comme un autre
+BULK_UNSUPPORTED_STATUS_CODES = (405, 501)
+
+# Clé du contexte OpenTelemetry qui porte le coalesceur : le contexte est déjà transmis aux threads des étapes parallèles
+STOCK_COALESCER_CONTEXT_KEY = otel_context.create_key("stock_coalescer")
+
+# Résultat d'une requête regroupée refusée : chaque saga doit renvoyer ses propres articles
+RETRY_ALONE = "retry_alone"
+
+# Résultats d'une requête groupée autres que True (appliquée), False (refusée par store-api) et None (endpoint indisponible) :
+# requête jamais partie (connexion impossible, disjoncteur ouvert, délai dépassé), rien n'a été appliqué
+BULK_NOT_SENT = "not_sent"
+# Requête partie sans réponse définitive (timeout de lecture, connexion perdue, 5xx) : les articles ont peut-être été appliqués
+BULK_OUTCOME_UNKNOWN = "unknown"
+
+def merge_stock_deltas(items):
+    """ Merge order lines that share a product_id, keeping the order in which products first appear """
+    merged = {}
+    for item in items:
+        product_id = item["product_id"]
+        if product_id in merged:
+            merged[product_id]["quantity"] += item["quantity"]
+        else:
+            merged[product_id] = {"product_id": product_id, "quantity": item["quantity"]}
+    return list(merged.values())
+
+def build_stock_bulk_request(items, sign, operation, idempotency_id):
+    """ Return the arguments of POST STOCK_BULK_UPDATE_PATH for the given deltas """
+    return {
+        "url": f'{config.API_GATEWAY_URL}{config.STOCK_BULK_UPDATE_PATH}',
+        "json": {
+            "items": [{"product_id": item["product_id"], "quantity": sign * item["quantity"]} for item in items]
+        },
+        "headers": {'Content-Type': 'application/json', **idempotency_headers(idempotency_id, f"{operation}_stock_bulk")},
+    }
+
+def handle_stock_bulk_response(bulk_span, response, operation, logger):
+    """ Return True if store-api applied the deltas, False if it refused them (4xx), None if the bulk endpoint is not available, BULK_OUTCOME_UNKNOWN for a 5xx """
+    if response.status_code in BULK_UNSUPPORTED_STATUS_CODES:
+        bulk_span.set_attribute("bulk_supported", False)
+        logger.warning("Endpoint %s indisponible (%s), retour aux mises à jour par article", config.STOCK_BULK_UPDATE_PATH, response.status_code)
+        return None
+
+    if not is_success(response):
+        text = get_error_text(response)
+        bulk_span.set_attribute("success", False)
+        bulk_span.set_attribute("error_code", response.status_code)
+        bulk_span.set_attribute("error_message", str(text))
+        logger.error("Erreur %s lors de la mise à jour groupée du stock (%s): %s", response.status_code, operation, text)
+        # Une erreur de la gateway ou de store-api ne dit pas si les articles ont été appliqués
+        return BULK_OUTCOME_UNKNOWN if response.status_code >= 500 else False
+
+    bulk_span.set_attribute("success", True)
+    return True
+
+def handle_stock_bulk_error(bulk_span, error, operation, logger, attempt=1):
+    """ Return the result of a bulk request that raised an exception: BULK_OUTCOME_UNKNOWN if it may have reached store-api, otherwise BULK_NOT_SENT """
+    bulk_span.set_attribute("success", False)
+    bulk_span.set_attribute("error_message", str(error))
+    logger.error("La mise à jour groupée du stock (%s) a échoué : %s", operation, error)
+    # Un nouvel envoi qui ne part pas ne dit rien de l'envoi précédent, dont l'issue reste inconnue
+    return BULK_OUTCOME_UNKNOWN if is_request_sent(error) or attempt > 1 else BULK_NOT_SENT
+
+def get_stock_bulk_resend_delay(attempt, request, result, deadline=None):
+    """
+    Return the time to wait before sending a bulk request again, or None if its result is final.
+    Only a request whose outcome is unknown is sent again, at most STOCK_BULK_UNKNOWN_RETRIES times, and only with its Idempotency-Key:
+    store-api then answers with the outcome of the first request instead of applying the deltas twice.
+    """
+    if result is not BULK_OUTCOME_UNKNOWN or attempt > config.STOCK_BULK_UNKNOWN_RETRIES:
+        return None
+    if "Idempotency-Key" not in request["headers"]:
+        return None
+    delay = RetryPolicy().get_backoff(attempt)
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+def post_stock_bulk(http_client, items, sign, operation, idempotency_id, logger, links=None):
+    """
+    Call StoreManager once for all items. Return True (applied), False (refused), None (bulk endpoint not available),
+    BULK_NOT_SENT or BULK_OUTCOME_UNKNOWN. A request whose outcome is unknown is sent again with the same Idempotency-Key.
+    """
+    tracer = trace.get_tracer(__name__)
+    request = build_stock_bulk_request(items, sign, operation, idempotency_id)
+
+    with tracer.start_as_current_span(f"store_api_{operation}_stock_bulk", links=links) as bulk_span:
+        bulk_span.set_attribute("items_count", len(items))
+        attempt = 1
+        while True:
+            try:
+                result = handle_stock_bulk_response(bulk_span, http_client.post(**request), operation, logger)
+            except Exception as e:
+                result = handle_stock_bulk_error(bulk_span, e, operation, logger, attempt)
+            delay = get_stock_bulk_resend_delay(attempt, request, result, getattr(http_client, "deadline", None))
+            if delay is None:
+                bulk_span.set_attribute("attempts", attempt)
+                return result
+            time.sleep(delay)
+            attempt += 1
+
+@contextmanager
+def stock_coalescing(coalescer):
+    """ Send the stock decreases of the sagas run in this block (including their parallel steps) through the coalescer """
+    token = otel_context.attach(otel_context.set_value(STOCK_COALESCER_CONTEXT_KEY, coalescer))
+    try:
+        yield
+    finally:
+        otel_context.detach(token)
+
+def get_stock_coalescer():
+    """ Return the coalescer of the current saga, or None """
+    return otel_context.get_value(STOCK_COALESCER_CONTEXT_KEY)
+
+class StockDeltaCoalescer:
+    """
+    Merge the stock decreases of concurrent sagas into one bulk request.
+    A single sender thread sends the requests: the decreases submitted while a request is in flight are merged into the next one (group commit),
+    so no delay is added when sagas do not overlap. The bulk endpoint applies all the deltas or none of them:
+    when store-api refuses a merged request (ex. one product is out of stock), every saga is told to send its own items again (RETRY_ALONE).
+    Any other failure is returned to every saga of the batch, which compensates its items if the outcome is unknown.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, http_client=None, max_items=None):
+        """ Constructor method """
+        self.http_client = http_client or HttpClient.get_instance()
+        self.max_items = config.STOCK_COALESCE_MAX_ITEMS if max_items is None else max_items
+        self.logger = Logger.get_instance('StockDeltaCoalescer')
+        self._pending = []
+        self._condition = threading.Condition()
+        self._sender = threading.Thread(target=self._send_loop, name="stock-coalescer", daemon=True)
+        self._sender.start()
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide coalescer, creating it on first use """
+        if StockDeltaCoalescer._instance is None:
+            with StockDeltaCoalescer._instance_lock:
+                if StockDeltaCoalescer._instance is None:
+                    StockDeltaCoalescer._instance = StockDeltaCoalescer()
+        return StockDeltaCoalescer._instance
+
+    def submit(self, items, idempotency_id=None):
+        """ Queue the stock decrease of one saga. Return a Future resolved with a result of post_stock_bulk, or RETRY_ALONE. """
+        future = Future()
+        # Lien vers le span de la saga : la requête regroupée est envoyée par le thread du coalesceur, dans sa propre trace
+        span_context = trace.get_current_span().get_span_context()
+        with self._condition:
+            self._pending.append((items, idempotency_id or uuid.uuid4().hex, span_context, future))
+            self._condition.notify()
+        return future
+
+    def decrease(self, items, idempotency_id=None, deadline=None):
+        """
+        Submit the stock decrease of one saga and wait for its result, at most until the deadline (time.monotonic()).
+        Without an answer in time, the decrease is withdrawn if it is still queued (BULK_NOT_SENT), otherwise its outcome is unknown.
+        """
+        future = self.submit(items, idempotency_id)
+        try:
+            return future.result(timeout=self._get_wait_timeout(deadline))
+        except FutureTimeoutError:
+            return self._withdraw(future, items)
+        except Exception as e:
+            self.logger.error("La sortie du stock regroupée a échoué : %s", e)
+            return BULK_OUTCOME_UNKNOWN
+
+    async def decrease_async(self, items, idempotency_id=None, deadline=None):
+        """ Non-blocking version of decrease, for the sagas of the ASGI engine: the request is still sent by the sender thread """
+        future = self.submit(items, idempotency_id)
+        try:
+            # shield : le délai dépassé ne doit pas annuler le Future, que _withdraw n'annule que s'il est encore en file
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self._get_wait_timeout(deadline))
+        except asyncio.TimeoutError:
+            return self._withdraw(future, items)
+        except Exception as e:
+            self.logger.error("La sortie du stock regroupée a échoué : %s", e)
+            return BULK_OUTCOME_UNKNOWN
+
+    def _withdraw(self, future, items):
+        """ Withdraw a decrease whose saga does not wait any longer: BULK_NOT_SENT if it was still queued, otherwise its outcome is unknown """
+        if future.cancel():
+            return BULK_NOT_SENT
+        self.logger.error("Pas de réponse du coalesceur à temps : issue inconnue de la sortie du stock de %s article(s)", len(items))
+        return BULK_OUTCOME_UNKNOWN
+
+    def _get_wait_timeout(self, deadline):
+        if deadline is not None:
+            return max(0.0, deadline - time.monotonic())
+        # Sans délai de saga : le temps d'envoyer la requête en cours puis la nôtre, avec leurs nouveaux envois
+        return 2 * (config.STOCK_BULK_UNKNOWN_RETRIES + 1) * (config.HTTP_CONNECT_TIMEOUT + config.HTTP_READ_TIMEOUT)
+
+    def _send_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                batch = [self._pending.pop(0)]
+                item_count = len(batch[0][0])
+                while self._pending and item_count + len(self._pending[0][0]) <= self.max_items:
+                    item_count += len(self._pending[0][0])
+                    batch.append(self._pending.pop(0))
+            # Les sorties retirées par une saga qui n'attend plus (Future annulé) ne sont pas envoyées
+            batch = [entry for entry in batch if entry[3].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._send(batch)
+            except Exception as e:
+                # Le thread d'envoi doit survivre : chaque saga du lot reçoit l'erreur au lieu d'attendre indéfiniment
+                self.logger.error("L'envoi de la sortie du stock regroupée a échoué : %s", e)
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _send(self, batch):
+        """ Send one bulk request for the whole batch and resolve the futures of its sagas """
+        if len(batch) == 1:
+            items, idempotency_id, span_context, future = batch[0]
+            result = post_stock_bulk(self.http_client, items, -1, "decrease", idempotency_id, self.logger,
+                                     links=[trace.Link(span_context)] if span_context.is_valid else None)
+            future.set_result(result)
+            return
+
+        merged_items = merge_stock_deltas([item for items, _, _, _ in batch for item in items])
+        links = [trace.Link(span_context) for _, _, span_context, _ in batch if span_context.is_valid]
+        # Clé stable du lot : les nouveaux envois d'une requête d'issue inconnue portent la même
+        merged_id = hashlib.sha256(",".join(sorted(idempotency_id for _, idempotency_id, _, _ in batch)).encode()).hexdigest()[:32]
+        result = post_stock_bulk(self.http_client, merged_items, -1, "decrease", merged_id, self.logger, links=links)
+        # Seul un refus de store-api (4xx) garantit que rien n'a été appliqué et permet de renvoyer chaque saga seule.
+        # Issue inconnue : chaque saga compense ses articles ; requête non partie : les sagas échouent
+        if result is False:
+            self.logger.debug("La sortie du stock regroupée de %s sagas a été refusée, chaque saga renvoie ses articles", len(batch))
+            result = RETRY_ALONE
+        for _, _, _, future in batch:
+            future.set_result(result)
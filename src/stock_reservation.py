@@ -0,0 +1,129 @@
+"""
+Stock reservations
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+import config
+import saga_metrics
+from logger import Logger
+
+# Réponses de store-api à la confirmation d'une réservation qui n'existe plus (expirée ou inconnue)
+RESERVATION_GONE_STATUS_CODES = (404, 409, 410)
+
+@dataclass
+class StockReservation:
+    """ Stock held by store-api for one saga until expires_at (time.time()), unless it is committed before """
+    reservation_id: str
+    saga_id: str
+    items: list
+    expires_at: float
+    # La saga a été compensée : la réservation n'est pas annulée, on la laisse expirer
+    is_abandoned: bool = False
+
+class ReservationIndex:
+    """
+    Local view of the stock reservations held by the sagas of this process. store-api expires them on its own:
+    the index does not call it, it only forgets the reservations that have expired (sweeper thread, every STOCK_RESERVATION_SWEEP_SECONDS),
+    so that a saga does not try to commit an expired reservation and the metrics show how much stock is on hold.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, sweep_seconds=None):
+        """ Constructor method """
+        self.sweep_seconds = config.STOCK_RESERVATION_SWEEP_SECONDS if sweep_seconds is None else sweep_seconds
+        self.logger = Logger.get_instance('ReservationIndex')
+        self.reservations = {}
+        # (expires_at, reservation_id), la plus proche expiration en premier
+        self._expirations = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="reservation-sweeper", daemon=True)
+        self._sweeper.start()
+
+    @staticmethod
+    def get_instance():
+        """ Return the process-wide index, creating it on first use """
+        if ReservationIndex._instance is None:
+            with ReservationIndex._instance_lock:
+                if ReservationIndex._instance is None:
+                    ReservationIndex._instance = ReservationIndex()
+        return ReservationIndex._instance
+
+    def add(self, reservation):
+        """ Record a reservation accepted by store-api """
+        with self._lock:
+            is_new = reservation.reservation_id not in self.reservations
+            self.reservations[reservation.reservation_id] = reservation
+            heapq.heappush(self._expirations, (reservation.expires_at, reservation.reservation_id))
+        if is_new:
+            saga_metrics.record_stock_reservation("reserved")
+
+    def is_live(self, reservation_id, expires_at=None):
+        """
+        Return True if the reservation has not expired. A reservation missing from the index (ex. saga recovered after a restart)
+        is checked against expires_at, as recorded in the saga context.
+        """
+        now = time.time()
+        with self._lock:
+            reservation = self.reservations.get(reservation_id)
+        if reservation is not None:
+            return reservation.expires_at > now
+        return expires_at is not None and expires_at > now
+
+    def commit(self, reservation_id):
+        """ Forget a reservation committed by store-api """
+        with self._lock:
+            reservation = self.reservations.pop(reservation_id, None)
+        if reservation is not None:
+            saga_metrics.record_stock_reservation("committed")
+
+    def abandon(self, reservation_id):
+        """ Mark the reservation of a compensated saga: it stays in the index, as the stock stays on hold, until it expires """
+        with self._lock:
+            reservation = self.reservations.get(reservation_id)
+            if reservation is None or reservation.is_abandoned:
+                return
+            reservation.is_abandoned = True
+        saga_metrics.record_stock_reservation("abandoned")
+
+    def sweep(self, now=None):
+        """ Forget the reservations that have expired and return them """
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            while self._expirations and self._expirations[0][0] <= now:
+                expires_at, reservation_id = heapq.heappop(self._expirations)
+                reservation = self.reservations.get(reservation_id)
+                # Entrée périmée du tas : réservation confirmée, ou renouvelée avec une autre échéance
+                if reservation is not None and reservation.expires_at == expires_at:
+                    del self.reservations[reservation_id]
+                    expired.append(reservation)
+
+        for reservation in expired:
+            saga_metrics.record_stock_reservation("expired")
+            if not reservation.is_abandoned:
+                self.logger.warning("La réservation %s de la saga %s a expiré avant d'être confirmée", reservation.reservation_id, reservation.saga_id)
+        return expired
+
+    def get_stats(self):
+        """ Return the number of reservations held, and how many of them belong to compensated sagas """
+        with self._lock:
+            abandoned_count = sum(1 for reservation in self.reservations.values() if reservation.is_abandoned)
+            return {"held": len(self.reservations), "abandoned": abandoned_count}
+
+    def stop(self):
+        """ Stop the sweeper thread """
+        self._stop_event.set()
+
+    def _sweep_loop(self):
+        while not self._stop_event.wait(self.sweep_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                self.logger.error("Le nettoyage des réservations expirées a échoué : %s", e)
@@ -0,0 +1,103 @@
+"""
+Tracing setup
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import config
+from logger import Logger
+from opentelemetry import context as otel_context, trace
+
+_is_initialized = False
+# Signalé quand la configuration du tracing est terminée (fournisseur installé, ou tracing abandonné)
+_setup_done = threading.Event()
+
+def setup_tracing(wait=False):
+    """
+    Set up tracing once per process and return True, or return False if TRACING_ENABLED is false and tracing stays a no-op.
+    The SDK and the OTLP exporter are imported in a background thread, once the collector (TRACING_OTLP_ENDPOINT) accepts connections:
+    a missing Jaeger neither slows down nor fails the startup. Until then, the tracers are proxies and their spans are not recorded.
+    With wait=True, return only once the collector has been probed (short-lived processes).
+    """
+    global _is_initialized
+    if not config.TRACING_ENABLED:
+        return False
+    if not _is_initialized:
+        _is_initialized = True
+        threading.Thread(target=_install_when_reachable, name="tracing-setup", daemon=True).start()
+    if wait:
+        _setup_done.wait(config.TRACING_CONNECT_TIMEOUT_SECONDS + 5)
+    return True
+
+def _is_collector_reachable():
+    endpoint = urlsplit(config.TRACING_OTLP_ENDPOINT)
+    try:
+        with socket.create_connection((endpoint.hostname, endpoint.port or 4317), timeout=config.TRACING_CONNECT_TIMEOUT_SECONDS):
+            return True
+    except OSError:
+        return False
+
+def _install_when_reachable():
+    logger = Logger.get_instance('Tracing')
+    while not _is_collector_reachable():
+        if config.TRACING_PROBE_INTERVAL_SECONDS <= 0:
+            logger.warning("Collecteur de traces injoignable (%s) : tracing désactivé", config.TRACING_OTLP_ENDPOINT)
+            _setup_done.set()
+            return
+        if not _setup_done.is_set():
+            logger.warning("Collecteur de traces injoignable (%s), nouvel essai toutes les %s s", config.TRACING_OTLP_ENDPOINT, config.TRACING_PROBE_INTERVAL_SECONDS)
+            _setup_done.set()
+        time.sleep(config.TRACING_PROBE_INTERVAL_SECONDS)
+
+    try:
+        # Importé seulement ici : le SDK et l'exportateur gRPC représentent l'essentiel du temps d'import de l'application
+        from tracing_sdk import create_tracer_provider
+        trace.set_tracer_provider(create_tracer_provider())
+        logger.debug("Tracing actif, export vers %s", config.TRACING_OTLP_ENDPOINT)
+    except Exception as e:
+        logger.error("Impossible de configurer le tracing : %s", e)
+    finally:
+        _setup_done.set()
+
+def flush_tracing(timeout_millis=1000):
+    """ Export the spans still buffered, if a tracer provider is installed """
+    force_flush = getattr(trace.get_tracer_provider(), "force_flush", None)
+    if force_flush is not None:
+        force_flush(timeout_millis)
+
+def set_item_attributes(span, items):
+    """
+    Describe the items of an order on a span: product_{idx}_id / product_{idx}_quantity for the first TRACING_MAX_ITEM_ATTRIBUTES items only,
+    plus aggregate attributes for all of them, so that the size of the span does not grow with the order.
+    """
+    if not span.is_recording():
+        return
+    for idx, item in enumerate(items[:config.TRACING_MAX_ITEM_ATTRIBUTES]):
+        span.set_attribute(f"product_{idx}_id", item.get("product_id", "unknown"))
+        span.set_attribute(f"product_{idx}_quantity", item.get("quantity", 0))
+    quantities = [item.get("quantity") for item in items]
+    span.set_attribute("items_total_quantity", sum(quantity for quantity in quantities if isinstance(quantity, (int, float))))
+    if len(items) > config.TRACING_MAX_ITEM_ATTRIBUTES:
+        span.set_attribute("items_attributes_truncated", True)
+
+@contextmanager
+def start_item_span(tracer, name, index, parent_context=None):
+    """
+    Start the span of the order item at this index, as the current span. Past TRACING_MAX_ITEM_SPANS items, no span is created:
+    a non-recording span is yielded instead and the requests of the item are traced under the parent span.
+    """
+    if index < config.TRACING_MAX_ITEM_SPANS:
+        with tracer.start_as_current_span(name, context=parent_context) as span:
+            yield span
+        return
+
+    token = otel_context.attach(parent_context) if parent_context is not None else None
+    try:
+        yield trace.INVALID_SPAN
+    finally:
+        if token is not None:
+            otel_context.detach(token)
@@ -0,0 +1,163 @@
+"""
+Tracing SDK
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import queue
+import threading
+import time
+from collections import OrderedDict
+import config
+from logger import Logger
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ALWAYS_OFF, ALWAYS_ON, Decision, ParentBased, Sampler, SamplingResult, TraceIdRatioBased
+from opentelemetry.trace import StatusCode
+
+class RecordUnsampledSampler(Sampler):
+    """
+    Head sampler keeping a ratio of the traces (TraceIdRatioBased). The other traces are still recorded, but not sampled:
+    the BatchSpanProcessor ignores them, and ErrorTraceProcessor exports them only if they contain an error.
+    """
+
+    def __init__(self, ratio):
+        """ Constructor method """
+        self.ratio_sampler = TraceIdRatioBased(ratio)
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None):
+        """ Return RECORD_AND_SAMPLE for the traces kept by the ratio, RECORD_ONLY for the others """
+        result = self.ratio_sampler.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+        if result.decision == Decision.DROP:
+            return SamplingResult(Decision.RECORD_ONLY, attributes, result.trace_state)
+        return result
+
+    def get_description(self):
+        """ Return the name of the sampler """
+        return f"RecordUnsampledSampler{{{self.ratio_sampler.rate}}}"
+
+def is_error_span(span):
+    """ Return True if the span reports an error: ERROR status, success=False or error_occurred=True """
+    if span.status.status_code == StatusCode.ERROR:
+        return True
+    attributes = span.attributes or {}
+    return attributes.get("success") is False or attributes.get("error_occurred") is True
+
+class ErrorTraceProcessor(SpanProcessor):
+    """
+    Tail sampling of the traces not kept by the head sampler: their spans are buffered until the local root span ends,
+    then exported if one of them is an error (see is_error_span), dropped otherwise.
+    At most max_traces traces are buffered (the oldest is dropped), with at most max_spans_per_trace spans each. Exports run in a background thread.
+    """
+
+    def __init__(self, exporter, max_traces=None, max_spans_per_trace=None):
+        """ Constructor method """
+        self.exporter = exporter
+        self.max_traces = config.TRACING_ERROR_MAX_TRACES if max_traces is None else max_traces
+        self.max_spans_per_trace = config.TRACING_ERROR_MAX_SPANS_PER_TRACE if max_spans_per_trace is None else max_spans_per_trace
+        self.logger = Logger.get_instance('ErrorTraceProcessor')
+        # Traces en attente, par trace_id : [spans terminés, contient une erreur]
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+        self._export_queue = queue.Queue(maxsize=self.max_traces)
+        self.dropped_traces = 0
+        self._worker = threading.Thread(target=self._export_loop, name="error-trace-export", daemon=True)
+        self._worker.start()
+
+    def on_end(self, span):
+        """ Buffer a span of an unsampled trace, and decide whether to export the trace when its local root ends """
+        if span.context.trace_flags.sampled:
+            return
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            pending = self._traces.get(trace_id)
+            if pending is None:
+                if len(self._traces) >= self.max_traces:
+                    self._traces.popitem(last=False)
+                    self.dropped_traces += 1
+                pending = self._traces[trace_id] = [[], False]
+            if len(pending[0]) < self.max_spans_per_trace:
+                pending[0].append(span)
+            pending[1] = pending[1] or is_error_span(span)
+            if not is_local_root:
+                return
+            spans, has_error = self._traces.pop(trace_id)
+
+        if has_error:
+            try:
+                self._export_queue.put_nowait(spans)
+            except queue.Full:
+                with self._lock:
+                    self.dropped_traces += 1
+
+    def _export_loop(self):
+        while True:
+            spans = self._export_queue.get()
+            if spans is None:
+                return
+            try:
+                self.exporter.export(spans)
+            except Exception as e:
+                self.logger.error("Impossible d'exporter une trace en erreur : %s", e)
+            finally:
+                self._export_queue.task_done()
+
+    def force_flush(self, timeout_millis=30000):
+        """ Wait until the traces already selected are exported, then flush the exporter, within timeout_millis. Return False if it took longer. """
+        deadline = time.monotonic() + timeout_millis / 1000
+        # Queue.join() n'a pas de délai : on attend sur sa condition, pour ne pas retarder l'arrêt du worker au-delà du délai de grâce
+        with self._export_queue.all_tasks_done:
+            while self._export_queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.logger.warning("Traces en erreur encore en attente d'export après %s ms", timeout_millis)
+                    return False
+                self._export_queue.all_tasks_done.wait(remaining)
+        return self.exporter.force_flush(max(0, int((deadline - time.monotonic()) * 1000)))
+
+    def shutdown(self):
+        """ Stop the export thread and the exporter """
+        self._export_queue.put(None)
+        self._worker.join(timeout=5)
+        self.exporter.shutdown()
+
+def build_sampler():
+    """ Return the sampler configured by TRACING_SAMPLE_RATIO and TRACING_ALWAYS_SAMPLE_ERRORS. Child spans follow the decision of their parent. """
+    if config.TRACING_ALWAYS_SAMPLE_ERRORS and config.TRACING_SAMPLE_RATIO < 1.0:
+        root_sampler = RecordUnsampledSampler(config.TRACING_SAMPLE_RATIO)
+        # Un span local dont le parent n'est pas échantillonné reste enregistré, pour l'échantillonnage sur erreur
+        return ParentBased(root_sampler, local_parent_not_sampled=root_sampler)
+    if config.TRACING_SAMPLE_RATIO >= 1.0:
+        return ParentBased(ALWAYS_ON)
+    if config.TRACING_SAMPLE_RATIO <= 0.0:
+        return ParentBased(ALWAYS_OFF)
+    return ParentBased(TraceIdRatioBased(config.TRACING_SAMPLE_RATIO))
+
+def create_tracer_provider():
+    """ Return a tracer provider exporting to the OTLP collector of TRACING_OTLP_ENDPOINT (Jaeger), with the sampler and processors configured """
+    resource = Resource.create({
+       "service.name": config.TRACING_SERVICE_NAME,
+       "service.version": "1.0.0"
+    })
+    tracer_provider = TracerProvider(resource=resource, sampler=build_sampler())
+
+    # Configuration de l'exportateur Jaeger
+    otlp_exporter = OTLPSpanExporter(
+       endpoint=config.TRACING_OTLP_ENDPOINT,
+       insecure=True
+    )
+    span_processor = BatchSpanProcessor(otlp_exporter,
+        max_queue_size=config.TRACING_MAX_QUEUE_SIZE,
+        schedule_delay_millis=config.TRACING_SCHEDULE_DELAY_MS,
+        max_export_batch_size=config.TRACING_MAX_EXPORT_BATCH_SIZE,
+        export_timeout_millis=config.TRACING_EXPORT_TIMEOUT_MS
+    )
+    tracer_provider.add_span_processor(span_processor)
+
+    if config.TRACING_ALWAYS_SAMPLE_ERRORS and config.TRACING_SAMPLE_RATIO < 1.0:
+        # Exportateur séparé : celui du BatchSpanProcessor est utilisé par son propre thread
+        error_exporter = OTLPSpanExporter(endpoint=config.TRACING_OTLP_ENDPOINT, insecure=True)
+        tracer_provider.add_span_processor(ErrorTraceProcessor(error_exporter))
+    return tracer_provider
@@ -0,0 +1,22 @@
+"""
+Test configuration
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import os
+import sys
+
+# Les modules de src s'importent entre eux par leur nom, comme quand l'application est lancée depuis src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+# Lus par config.py à son import : pas de tracing ni de journal, logs synchrones et silencieux, attentes courtes entre les tentatives
+os.environ.update({
+    "LOG_LEVEL": "CRITICAL",
+    "LOG_ASYNC": "false",
+    "OTEL_SDK_DISABLED": "true",
+    "TRACING_ENABLED": "false",
+    "SAGA_JOURNAL_ENABLED": "false",
+    "HTTP_SEND_IDEMPOTENCY_KEYS": "true",
+    "RETRY_BACKOFF_BASE_MS": "1",
+    "RETRY_BACKOFF_MAX_MS": "5",
+})
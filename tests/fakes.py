@@ -0,0 +1,72 @@
+"""
+Test doubles of the HTTP clients
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import json
+import threading
+
+class FakeResponse:
+    """ Response with the attributes read by the handlers (requests and httpx agree on them) """
+
+    def __init__(self, status_code, body=b"{}"):
+        """ Constructor method """
+        self.status_code = status_code
+        self.content = body
+        self.text = body.decode()
+
+    def json(self):
+        """ Decode the body, raising ValueError if it is not JSON (ex. HTML error page of a proxy) """
+        return json.loads(self.content)
+
+class FakeClient:
+    """
+    Client returning (or raising) the given outcomes in order, the last one being repeated. Every request is recorded in sent.
+    outcomes can also be a function called with (method, url, kwargs) that returns the outcome of each request.
+    With a gate, the first request waits until the gate is set, so that other requests can be queued behind it.
+    """
+
+    def __init__(self, outcomes, gate=None):
+        """ Constructor method """
+        self.outcomes = outcomes if callable(outcomes) else list(outcomes)
+        self.gate = gate
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        """ Record the request and return its outcome """
+        with self._lock:
+            is_first = not self.sent
+            self.sent.append((method, url, kwargs))
+            if callable(self.outcomes):
+                outcome = self.outcomes(method, url, kwargs)
+            else:
+                outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if is_first and self.gate is not None:
+            self.gate.wait(5)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def get(self, url, **kwargs):
+        """ Send a GET request """
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """ Send a POST request """
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        """ Send a DELETE request """
+        return self.request("DELETE", url, **kwargs)
+
+    def get_idempotency_keys(self):
+        """ Return the Idempotency-Key header of every request sent """
+        return [kwargs.get("headers", {}).get("Idempotency-Key") for _, _, kwargs in self.sent]
+
+class FakeAsyncClient(FakeClient):
+    """ Non-blocking version of FakeClient """
+
+    async def request(self, method, url, **kwargs):
+        """ Record the request and return its outcome """
+        return FakeClient.request(self, method, url, **kwargs)
@@ -0,0 +1,68 @@
+"""
+Tests: admission control
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import time
+import pytest
+import config
+from admission_control import AdaptiveConcurrencyLimiter, AdmissionController, UserRateLimiter
+
+@pytest.fixture
+def admission(monkeypatch):
+    monkeypatch.setattr(config, "ADMISSION_CONTROL_ENABLED", True)
+    monkeypatch.setattr(config, "ADMISSION_INITIAL_LIMIT", 4)
+    monkeypatch.setattr(config, "ADMISSION_USER_RATE_PER_SECOND", 0.001)
+    monkeypatch.setattr(config, "ADMISSION_USER_BURST", 1)
+    monkeypatch.setattr(AdmissionController, "_instance", None)
+    return AdmissionController.get_instance()
+
+def test_token_bucket_allows_a_burst_then_refills_at_its_rate():
+    limiter = UserRateLimiter(rate=20, burst=2, max_entries=10)
+
+    assert limiter.try_take(1) == 0 and limiter.try_take(1) == 0
+    assert limiter.try_take(1) == pytest.approx(0.05, abs=0.01)
+    # Les autres utilisateurs ont leur propre seau
+    assert limiter.try_take(2) == 0
+    time.sleep(0.06)
+    assert limiter.try_take(1) == 0
+
+def test_least_recently_seen_users_are_forgotten():
+    limiter = UserRateLimiter(rate=0.001, burst=1, max_entries=2)
+    for user_id in (1, 2, 3):
+        limiter.try_take(user_id)
+
+    assert list(limiter.buckets) == [2, 3]
+    # Utilisateur oublié : il retrouve un seau plein
+    assert limiter.try_take(1) == 0
+
+def test_concurrency_limit_rejects_beyond_its_slots():
+    limiter = AdaptiveConcurrencyLimiter(2, 1, 8, latency_target=0.5, decrease_factor=0.5)
+
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release()
+    assert limiter.try_acquire()
+
+def test_concurrency_limit_decreases_once_per_burst_of_slow_requests():
+    limiter = AdaptiveConcurrencyLimiter(8, 1, 8, latency_target=60, decrease_factor=0.5)
+
+    limiter.record_request(61, 200)
+    limiter.record_request(0.1, 503)
+    limiter.record_request(0.1, None)
+    assert limiter.limit == 4
+
+def test_concurrency_limit_increases_only_while_it_is_used():
+    limiter = AdaptiveConcurrencyLimiter(4, 1, 8, latency_target=0.5, decrease_factor=0.5)
+
+    limiter.record_request(0.1, 200)
+    assert limiter.limit == 4
+    limiter.try_acquire()
+    limiter.try_acquire()
+    limiter.record_request(0.1, 200)
+    assert limiter.limit == pytest.approx(4.25)
+
+def test_float_user_id_shares_the_bucket_of_the_integer(admission):
+    assert admission.try_admit(1) is None
+    body, status_code, headers = admission.try_admit(1.0)
+    assert status_code == 429 and int(headers["Retry-After"]) > 0
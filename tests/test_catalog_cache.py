@@ -0,0 +1,88 @@
+"""
+Tests: catalog cache
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+import time
+from catalog_cache import MISSING, ReadThroughCache
+
+def build_cache(loader, **kwargs):
+    return ReadThroughCache("test", loader, **{"ttl_seconds": 60, "negative_ttl_seconds": 0.05, "max_entries": 10, **kwargs})
+
+def test_concurrent_misses_share_one_load():
+    gate = threading.Event()
+    loaded_keys = []
+
+    def load(key):
+        loaded_keys.append(key)
+        gate.wait(5)
+        return {"id": key}
+    cache = build_cache(load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(1))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while not cache._loading:
+        time.sleep(0.005)
+    time.sleep(0.02)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert loaded_keys == [1]
+    assert results == [{"id": 1}] * 5
+
+def test_unknown_key_is_cached_for_the_negative_ttl():
+    loaded_keys = []
+    cache = build_cache(lambda key: loaded_keys.append(key) or MISSING)
+
+    assert cache.get(1) is MISSING and cache.get(1) is MISSING
+    assert loaded_keys == [1]
+    time.sleep(0.06)
+    assert cache.get(1) is MISSING
+    assert loaded_keys == [1, 1]
+
+def test_failed_load_is_not_cached():
+    loaded_keys = []
+    cache = build_cache(lambda key: loaded_keys.append(key))
+
+    assert cache.get(1) is None and cache.get(1) is None
+    assert loaded_keys == [1, 1]
+
+def test_failed_load_wakes_up_the_waiting_callers():
+    gate = threading.Event()
+
+    def load(key):
+        gate.wait(5)
+        raise RuntimeError("store-api indisponible")
+    cache = build_cache(load)
+    errors = []
+
+    def get():
+        try:
+            cache.get(1)
+        except RuntimeError as e:
+            errors.append(e)
+    loader = threading.Thread(target=get)
+    loader.start()
+    while not cache._loading:
+        time.sleep(0.005)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(cache.get(1)))
+    waiter.start()
+    gate.set()
+    loader.join(5)
+    waiter.join(5)
+
+    assert len(errors) == 1 and results == [None]
+    assert not cache._loading
+
+def test_least_recently_used_key_is_evicted():
+    cache = build_cache(lambda key: {"id": key}, max_entries=2)
+    cache.get(1)
+    cache.get(2)
+    cache.get(1)
+    cache.get(3)
+
+    assert list(cache.entries) == [1, 3]
@@ -0,0 +1,72 @@
+"""
+Tests: circuit breakers
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import time
+from circuit_breaker import CircuitBreaker, is_failure_status
+
+def build_breaker(**kwargs):
+    return CircuitBreaker("store-api", **{"window_seconds": 10, "min_requests": 4, "failure_rate_threshold": 0.5,
+                                          "open_seconds": 0.05, "half_open_max_calls": 2, **kwargs})
+
+def open_breaker(breaker):
+    for _ in range(breaker.min_requests):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_failures_below_the_minimum_of_requests_do_not_open_it():
+    breaker = build_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+
+def test_failure_rate_threshold_opens_it():
+    breaker = build_breaker()
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request() and breaker.get_retry_after() > 0
+    assert breaker.get_stats()["rejected"] == 1
+
+def test_successful_probes_close_it():
+    breaker = build_breaker()
+    open_breaker(breaker)
+    time.sleep(0.06)
+
+    assert breaker.allow_request() and breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Pas plus de half_open_max_calls sondes à la fois
+    assert not breaker.allow_request()
+    breaker.record_success()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.get_stats()["window_failures"] == 0
+
+def test_failed_probe_opens_it_again():
+    breaker = build_breaker()
+    open_breaker(breaker)
+    time.sleep(0.06)
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.times_opened == 2
+
+def test_lost_probes_do_not_keep_it_half_open():
+    breaker = build_breaker(half_open_max_calls=1)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # La sonde n'a jamais donné de résultat : une nouvelle est permise après open_seconds
+    time.sleep(0.06)
+    assert breaker.allow_request()
+
+def test_overload_and_server_errors_are_failures():
+    assert [is_failure_status(status_code) for status_code in (200, 404, 429, 500, 503)] == [False, False, True, True, True]
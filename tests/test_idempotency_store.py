@@ -0,0 +1,83 @@
+"""
+Tests: idempotency store
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import threading
+import time
+import pytest
+import config
+import saga_orchestrator
+from idempotency_store import IdempotencyStore
+
+PAYLOAD = {"user_id": 1, "items": [{"product_id": 1, "quantity": 1}]}
+OK = ({'status': 'OK'}, 200, {})
+
+@pytest.fixture
+def store(monkeypatch):
+    store = IdempotencyStore(ttl_seconds=60, max_entries=2)
+    monkeypatch.setattr(IdempotencyStore, "_instance", store)
+    return store
+
+def complete(store, key, response=OK):
+    entry, is_first = store.begin(key, PAYLOAD)
+    assert is_first
+    store.finish(key, entry, response)
+
+def test_least_recently_used_response_is_evicted(store):
+    complete(store, "a")
+    complete(store, "b")
+    # "a" est relue : "b" devient la plus ancienne
+    assert store.begin("a", PAYLOAD)[1] is False
+    complete(store, "c")
+
+    assert list(store.entries) == ["a", "c"]
+
+def test_request_in_progress_is_not_evicted(store):
+    store.begin("en-cours", PAYLOAD)
+    complete(store, "b")
+    complete(store, "c")
+
+    assert "en-cours" in store.entries and len(store.entries) == 2
+
+def test_expired_response_is_not_replayed(store):
+    store.ttl_seconds = 0.05
+    complete(store, "a")
+    time.sleep(0.06)
+
+    assert store.begin("a", PAYLOAD)[1] is True
+
+def test_temporary_refusal_is_not_stored(store):
+    complete(store, "a", ({'error': "Trop de requêtes"}, 429, {}))
+
+    assert "a" not in store.entries
+
+def test_duplicate_replays_the_first_response(monkeypatch, store):
+    started = []
+    monkeypatch.setattr(saga_orchestrator, "start_admitted_saga", lambda payload, respond_async: started.append(payload) or OK)
+
+    assert saga_orchestrator.start_saga_once("a", PAYLOAD, False) == OK
+    body, status_code, headers = saga_orchestrator.start_saga_once("a", PAYLOAD, False)
+    assert (body, status_code, headers["Idempotent-Replayed"]) == (OK[0], 200, "true")
+    assert len(started) == 1
+
+def test_key_reused_for_another_request_is_refused(monkeypatch, store):
+    monkeypatch.setattr(saga_orchestrator, "start_admitted_saga", lambda payload, respond_async: OK)
+    saga_orchestrator.start_saga_once("a", PAYLOAD, False)
+
+    _, status_code, _ = saga_orchestrator.start_saga_once("a", {**PAYLOAD, "user_id": 2}, False)
+    assert status_code == 422
+
+def test_duplicate_of_a_request_still_in_progress_gets_409(monkeypatch, store):
+    monkeypatch.setattr(config, "IDEMPOTENCY_WAIT_TIMEOUT_SECONDS", 0.05)
+    gate = threading.Event()
+    monkeypatch.setattr(saga_orchestrator, "start_admitted_saga", lambda payload, respond_async: gate.wait(5) and OK)
+    first = threading.Thread(target=saga_orchestrator.start_saga_once, args=("a", PAYLOAD, False))
+    first.start()
+    while "a" not in store.entries:
+        time.sleep(0.005)
+
+    _, status_code, headers = saga_orchestrator.start_saga_once("a", PAYLOAD, False)
+    gate.set()
+    first.join(5)
+    assert status_code == 409 and "Retry-After" in headers
@@ -0,0 +1,123 @@
+"""
+Tests: message transport
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import time
+import pytest
+import config
+from controllers.message_saga_controller import MessageSagaController
+from messaging.in_memory_broker import InMemoryBroker
+from messaging.message_broker import COMMANDS_TOPIC, Message
+from messaging.saga_command_consumer import SagaCommandConsumer
+from messaging.saga_reply_dispatcher import SagaReplyDispatcher
+from messaging.sqlite_broker import DEAD_LETTER_SUFFIX, SqliteBroker
+from order_saga_context import OrderSagaContext
+from order_saga_definition import ORDER_SAGA_DEFINITION
+
+class RecordingBroker(InMemoryBroker):
+    """ In-memory broker keeping the messages acknowledged by each publish """
+
+    def __init__(self):
+        super().__init__()
+        self.acked = []
+
+    def publish(self, messages, acked=()):
+        self.acked.extend(acked)
+        super().publish(messages, acked)
+
+class FakeDispatcher:
+    reply_topic = "saga.replies.test"
+
+@pytest.fixture
+def broker(tmp_path):
+    broker = SqliteBroker(path=str(tmp_path / "messages.db"), visibility_timeout=0.1, max_deliveries=2, poll_interval=0.01)
+    yield broker
+    broker.close()
+
+def build_controller():
+    context = OrderSagaContext.from_payload({"user_id": 1, "items": [{"product_id": 1, "quantity": 1}]})
+    return MessageSagaController(ORDER_SAGA_DEFINITION, context, dispatcher=FakeDispatcher())
+
+def test_unacknowledged_message_is_delivered_again_then_dead_lettered(broker):
+    broker.publish([Message("topic", {"n": 1})])
+
+    assert [message.attempts for message in broker.receive("topic", timeout=0.1)] == [1]
+    assert broker.receive("topic", timeout=0) == []
+    time.sleep(0.15)
+    assert [message.attempts for message in broker.receive("topic", timeout=0.1)] == [2]
+    time.sleep(0.15)
+    assert broker.receive("topic", timeout=0) == []
+    assert [message.body for message in broker.receive("topic" + DEAD_LETTER_SUFFIX, timeout=0)] == [{"n": 1}]
+
+def test_extended_message_is_not_delivered_again(broker):
+    broker.publish([Message("topic", {"n": 1})])
+    messages = broker.receive("topic", timeout=0.1)
+
+    for _ in range(3):
+        time.sleep(0.06)
+        broker.extend_visibility(messages)
+    assert broker.receive("topic", timeout=0) == []
+
+    broker.publish([], acked=messages)
+    time.sleep(0.15)
+    assert broker.receive("topic", timeout=0) == []
+
+def test_consumer_skips_a_step_received_after_its_deadline():
+    consumer = SagaCommandConsumer(ORDER_SAGA_DEFINITION, OrderSagaContext, broker=InMemoryBroker(), concurrency=0)
+    command = build_controller().advance()[0]
+    command.body["deadline_at"] = time.time() - 1
+
+    reply = consumer.handle(command)
+    assert reply.body["state"] is None
+    assert reply.body["error"]
+
+def test_overdue_reply_fails_the_step_and_compensates_it(monkeypatch):
+    monkeypatch.setattr(config, "MESSAGE_COMMAND_TIMEOUT_SECONDS", 10.0)
+    controller = build_controller()
+    command = controller.advance()[0]
+
+    assert controller.get_overdue_replies(time.monotonic()) == []
+    overdue_replies = controller.get_overdue_replies(time.monotonic() + 11)
+    assert [reply["step"] for reply in overdue_replies] == [command.body["step"]]
+
+    # Le consommateur a pu créer la commande avant de perdre sa réponse : elle est compensée
+    rollback_commands = controller.on_reply(overdue_replies[0])
+    assert [(rollback.body["step"], rollback.body["action"]) for rollback in rollback_commands] == [(command.body["step"], "rollback")]
+    # La vraie réponse, arrivée trop tard, est ignorée
+    assert controller.on_reply({**overdue_replies[0], "state": "CREATING_PAYMENT"}) == []
+
+    rollback = rollback_commands[0].body
+    assert controller.on_reply({**rollback, "state": None, "error": None, "duration": 0.0}) == []
+    assert controller.is_finished() and controller.is_error_occurred
+
+def test_unreadable_reply_keeps_its_command_pending():
+    controller = build_controller()
+    command = controller.advance()[0]
+    reply = {**command.body, "state": "ETAT_INCONNU", "error": None, "duration": 0.0}
+
+    with pytest.raises(KeyError):
+        controller.on_reply(reply)
+    assert command.body["step"] in controller.pending_commands
+
+def test_dispatcher_does_not_acknowledge_a_reply_that_failed():
+    broker = RecordingBroker()
+    dispatcher = SagaReplyDispatcher(broker=broker)
+    try:
+        controller = build_controller()
+        command = controller.advance()[0]
+        dispatcher.sagas[controller.saga_id] = controller
+        bad_reply = Message(dispatcher.reply_topic, {**command.body, "state": "ETAT_INCONNU", "error": None, "duration": 0.0})
+        unknown_reply = Message(dispatcher.reply_topic, {**command.body, "saga_id": "saga-inconnue", "state": None, "error": None, "duration": 0.0})
+
+        dispatcher.dispatch([bad_reply, unknown_reply])
+        assert broker.acked == [unknown_reply]
+    finally:
+        dispatcher.stop(2)
+
+def test_reply_topic_is_named_after_the_instance():
+    dispatcher = SagaReplyDispatcher(broker=InMemoryBroker())
+    try:
+        assert dispatcher.reply_topic.endswith("." + config.MESSAGE_INSTANCE_ID)
+    finally:
+        dispatcher.stop(2)
@@ -0,0 +1,44 @@
+"""
+Tests: order request validation
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import pytest
+import config
+from order_request import normalize_order_request
+
+def test_lines_are_merged_sorted_and_converted_to_int():
+    payload, error = normalize_order_request({"user_id": 1.0, "items": [
+        {"product_id": 3, "quantity": 1}, {"product_id": 1.0, "quantity": 2.0}, {"product_id": 3, "quantity": 4},
+    ]})
+
+    assert error is None
+    assert payload == {"user_id": 1, "items": [{"product_id": 1, "quantity": 2}, {"product_id": 3, "quantity": 5}]}
+    assert all(type(value) is int for item in payload["items"] for value in item.values())
+
+def test_extra_item_fields_are_accepted_then_dropped():
+    payload, error = normalize_order_request({"user_id": 1, "items": [{"product_id": 1, "quantity": 2, "name": "Clavier", "price": 30.0}]})
+
+    assert error is None
+    assert payload["items"] == [{"product_id": 1, "quantity": 2}]
+
+@pytest.mark.parametrize("payload, field", [
+    ({"items": [{"product_id": 1, "quantity": 1}]}, "data"),
+    ({"user_id": 1, "items": []}, "data.items"),
+    ({"user_id": 1, "items": [{"product_id": 1}]}, "data.items[0]"),
+    ({"user_id": 1, "items": [{"product_id": 1, "quantity": 0}]}, "data.items[0].quantity"),
+    ({"user_id": 1, "items": [{"product_id": "1", "quantity": 1}]}, "data.items[0].product_id"),
+    ({"user_id": 1.5, "items": [{"product_id": 1, "quantity": 1}]}, "data.user_id"),
+])
+def test_invalid_request_names_its_field(payload, field):
+    normalized_payload, error = normalize_order_request(payload)
+
+    assert normalized_payload is None
+    assert error["field"] == field
+
+def test_merged_quantity_above_the_maximum_is_refused():
+    quantity = config.ORDER_MAX_QUANTITY // 2 + 1
+    payload, error = normalize_order_request({"user_id": 1, "items": [{"product_id": 1, "quantity": quantity}, {"product_id": 1, "quantity": quantity}]})
+
+    assert payload is None
+    assert error["field"] == "data.items"
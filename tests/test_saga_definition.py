@@ -0,0 +1,69 @@
+"""
+Tests: saga definition
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from enum import Enum
+import pytest
+from order_saga_definition import build_order_saga_definition
+from order_saga_state import OrderSagaState
+from saga_definition import SagaDefinition, SagaStep
+
+State = Enum("State", "A A_DONE UNDO_A B B_DONE UNDO_B C C_DONE UNDO_C COMPLETED")
+
+def step(name, compensation_dependencies=None, compensable=True):
+    upper_name = name.upper()
+    return SagaStep(name, State[upper_name], State[f"{upper_name}_DONE"], object,
+                    compensation_state=State[f"UNDO_{upper_name}"] if compensable else None, compensation_dependencies=compensation_dependencies)
+
+def names(steps):
+    return sorted(step.name for step in steps)
+
+def test_steps_are_compensated_in_reverse_order_by_default():
+    definition = SagaDefinition("test", [step("a"), step("b"), step("c")], State.COMPLETED)
+    applied_steps = list(definition.steps)
+
+    assert names(definition.get_ready_compensations(applied_steps)) == ["c"]
+    assert names(definition.get_ready_compensations(applied_steps[:2])) == ["b"]
+
+def test_independent_compensations_are_ready_together():
+    definition = SagaDefinition("test", [step("a", ("b", "c")), step("b", ()), step("c", ())], State.COMPLETED)
+
+    assert names(definition.get_ready_compensations(list(definition.steps))) == ["b", "c"]
+    assert names(definition.get_ready_compensations([definition.get_step("a"), definition.get_step("c")])) == ["c"]
+
+def test_parallel_stage_is_journaled_under_its_first_step():
+    definition = SagaDefinition("test", [step("a"), [step("b"), step("c")]], State.COMPLETED)
+
+    assert definition.transitions[State.A].next_state == State.B
+    assert names(definition.transitions[State.B].stage) == ["b", "c"]
+    assert State.C not in definition.transitions
+    assert definition.is_compensating(State.UNDO_C) and not definition.is_compensating(State.B)
+
+def test_recovery_compensates_the_interrupted_stage_and_the_previous_ones():
+    definition = SagaDefinition("test", [step("a"), step("b", compensable=False), [step("c")]], State.COMPLETED)
+
+    assert names(definition.recovery_compensations[State.A]) == ["a"]
+    assert names(definition.recovery_compensations[State.C]) == ["a", "c"]
+    # Arrêt pendant la compensation de c : celle de a reste à faire, et c est compensée de nouveau (les compensations sont idempotentes)
+    assert names(definition.recovery_compensations[State.UNDO_C]) == ["a", "c"]
+    assert names(definition.recovery_compensations[State.UNDO_A]) == ["a"]
+
+def test_cycle_in_the_compensation_graph_is_refused():
+    with pytest.raises(ValueError, match="Cycle"):
+        SagaDefinition("test", [step("a", ("b",)), step("b", ("a",))], State.COMPLETED)
+
+def test_unknown_compensation_dependency_is_refused():
+    with pytest.raises(ValueError, match="inconnues"):
+        SagaDefinition("test", [step("a", ("z",))], State.COMPLETED)
+
+def test_state_used_twice_is_refused():
+    with pytest.raises(ValueError, match="plusieurs fois"):
+        SagaDefinition("test", [step("a"), step("a")], State.COMPLETED)
+
+def test_payment_and_stock_compensations_run_in_parallel():
+    definition = build_order_saga_definition(parallel_stock_and_payment=True)
+    ready_steps = definition.get_ready_compensations(list(definition.steps))
+
+    assert len(ready_steps) == 2
+    assert OrderSagaState.CANCELLING_ORDER not in {ready_step.compensation_state for ready_step in ready_steps}
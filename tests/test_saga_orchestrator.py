@@ -0,0 +1,89 @@
+"""
+Tests: saga orchestrator routes
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import json
+import threading
+import pytest
+import config
+import saga_orchestrator
+import saga_worker_pool
+from admission_control import AdmissionController
+from idempotency_store import IdempotencyStore
+from saga_worker_pool import SagaWorkerPool
+
+ORDERS = [{"user_id": 1, "items": [{"product_id": 1, "quantity": 1}]}, {"user_id": 2, "items": [{"product_id": 2, "quantity": 1}]}]
+
+@pytest.fixture
+def started_orders(monkeypatch):
+    """ Replace the saga by a recorder of the orders it receives """
+    orders = []
+
+    def start_saga(payload, respond_async, on_finished=None):
+        orders.append(payload)
+        return {'status': 'OK'}, 200, {}
+    monkeypatch.setattr(saga_orchestrator, "start_saga", start_saga)
+    monkeypatch.setattr(IdempotencyStore, "_instance", IdempotencyStore())
+    return orders
+
+@pytest.fixture
+def client():
+    return saga_orchestrator.create_app().test_client()
+
+def post_batch(client, orders, headers=None):
+    response = client.post("/saga/orders:batch", json={"orders": orders}, headers=headers or {})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return {line["index"]: line["status_code"] for line in lines}
+
+def test_batch_orders_go_through_admission_control(monkeypatch, started_orders, client):
+    monkeypatch.setattr(config, "ADMISSION_CONTROL_ENABLED", True)
+    monkeypatch.setattr(config, "ADMISSION_USER_RATE_PER_SECOND", 0.001)
+    monkeypatch.setattr(config, "ADMISSION_USER_BURST", 1)
+    monkeypatch.setattr(AdmissionController, "_instance", None)
+
+    # Deux commandes du même utilisateur : la seconde dépasse son seau à jetons
+    assert post_batch(client, [ORDERS[0], ORDERS[0]]) in ({0: 200, 1: 429}, {0: 429, 1: 200})
+    assert len(started_orders) == 1
+
+def test_batch_sent_again_with_its_idempotency_key_does_not_start_new_sagas(started_orders, client):
+    assert post_batch(client, ORDERS, {"Idempotency-Key": "lot-1"}) == {0: 200, 1: 200}
+    assert post_batch(client, ORDERS, {"Idempotency-Key": "lot-1"}) == {0: 200, 1: 200}
+    assert len(started_orders) == 2
+
+    # Une autre clé lance de nouvelles sagas
+    assert post_batch(client, ORDERS, {"Idempotency-Key": "lot-2"}) == {0: 200, 1: 200}
+    assert len(started_orders) == 4
+
+def test_async_saga_keeps_its_admission_slot_until_it_finishes(monkeypatch):
+    monkeypatch.setattr(config, "ADMISSION_CONTROL_ENABLED", True)
+    monkeypatch.setattr(AdmissionController, "_instance", None)
+    pool = SagaWorkerPool(max_workers=1, max_queue_depth=1)
+    monkeypatch.setattr(SagaWorkerPool, "_instance", pool)
+    gate = threading.Event()
+
+    def run(controller, payload):
+        gate.wait(5)
+        return {"order_id": 7, "status": "OK"}
+    monkeypatch.setattr(saga_worker_pool.OrderSagaController, "run", run)
+    limiter = AdmissionController.get_instance().concurrency_limiter
+
+    _, status_code, _ = saga_orchestrator.start_admitted_saga(ORDERS[0], True)
+    assert status_code == 202
+    assert limiter.in_flight_count == 1
+
+    gate.set()
+    assert pool.wait_until_idle(5)
+    assert limiter.in_flight_count == 0
+
+def test_slot_of_a_saga_refused_by_the_pool_is_released(monkeypatch):
+    monkeypatch.setattr(config, "ADMISSION_CONTROL_ENABLED", True)
+    monkeypatch.setattr(AdmissionController, "_instance", None)
+    pool = SagaWorkerPool(max_workers=1, max_queue_depth=1)
+    pool.shutdown()
+    monkeypatch.setattr(SagaWorkerPool, "_instance", pool)
+
+    _, status_code, _ = saga_orchestrator.start_admitted_saga(ORDERS[0], True)
+    assert status_code == 429
+    assert AdmissionController.get_instance().concurrency_limiter.in_flight_count == 0
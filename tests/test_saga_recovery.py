@@ -0,0 +1,162 @@
+"""
+Tests: saga journal and recovery
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import pytest
+import config
+import http_client
+from controllers import order_saga_controller
+from controllers.order_saga_controller import OrderSagaController
+from fakes import FakeClient, FakeResponse
+from order_saga_definition import ORDER_SAGA_DEFINITION, build_order_saga_definition
+from order_saga_state import OrderSagaState
+from saga_journal import SagaJournal
+from saga_recovery import recover_unfinished_sagas
+
+PAYLOAD = {"user_id": 1, "items": [{"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 1}]}
+
+class ProcessStopped(BaseException):
+    """ Stops the saga like a crash would: the handlers only catch Exception """
+
+def store_api(stop_on=None):
+    """ Return the outcomes of a store-api that stops the process when it receives the request matching stop_on(method, url, json) """
+    def answer(method, url, kwargs):
+        if stop_on is not None and stop_on(method, url, kwargs.get("json")):
+            raise ProcessStopped()
+        if url.endswith("/store-api/orders"):
+            return FakeResponse(201, json.dumps({"order_id": 7, "total_amount": 30.0}).encode())
+        if url.endswith("/payments-api/payments"):
+            return FakeResponse(201, json.dumps({"payment_id": 9}).encode())
+        return FakeResponse(200, json.dumps({"order_id": 7}).encode())
+    return answer
+
+def use_client(monkeypatch, client):
+    monkeypatch.setattr(http_client.HttpClient, "get_instance", staticmethod(lambda: client))
+    return client
+
+def run_until_stopped(monkeypatch, journal, stop_on):
+    use_client(monkeypatch, FakeClient(store_api(stop_on)))
+    with pytest.raises(ProcessStopped):
+        OrderSagaController(journal=journal).run(PAYLOAD)
+
+def recover(monkeypatch, path):
+    """ Recover the journal from a new process (a new journal instance) and return the requests sent """
+    client = use_client(monkeypatch, FakeClient(store_api()))
+    journal = SagaJournal(path=path)
+    try:
+        assert recover_unfinished_sagas(journal) == 1
+        assert journal.get_unfinished_sagas() == []
+    finally:
+        journal.close()
+    return [(method, url.split("/", 3)[-1], kwargs.get("json")) for method, url, kwargs in client.sent]
+
+def write_entry(journal, saga_id, owner, owner_started_at, created_at, heartbeat_at=None):
+    """ Write the last entry of a saga, and the lease of its owner, as another process would """
+    connection = sqlite3.connect(journal.path)
+    with connection:
+        connection.execute(
+            "INSERT INTO saga_log (saga_id, state, data, created_at, owner, owner_started_at) VALUES (?, 'DECREASING_STOCK', '{}', ?, ?, ?)",
+            (saga_id, created_at, owner, owner_started_at)
+        )
+        if heartbeat_at is not None:
+            connection.execute("INSERT INTO saga_owner (owner, started_at, heartbeat_at) VALUES (?, ?, ?)", (owner, owner_started_at, heartbeat_at))
+    connection.close()
+
+def read_heartbeat(journal):
+    connection = sqlite3.connect(journal.path)
+    try:
+        return connection.execute("SELECT heartbeat_at FROM saga_owner WHERE owner = ? AND started_at = ?", (journal.owner, journal.started_at)).fetchone()[0]
+    finally:
+        connection.close()
+
+def dead_pid():
+    """ Return the pid of a process that has exited """
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "journal.db")
+
+def test_interrupted_stage_is_compensated_after_the_previous_ones():
+    recovered_steps = ORDER_SAGA_DEFINITION.recovery_compensations[OrderSagaState.DECREASING_STOCK]
+    assert [step.name for step in recovered_steps] == ["create_order", "decrease_stock"]
+
+def test_stock_taken_out_before_a_stop_is_put_back(monkeypatch, journal_path):
+    journal = SagaJournal(path=journal_path)
+    # Arrêt pendant la sortie du deuxième article : le premier est déjà sorti du stock
+    run_until_stopped(monkeypatch, journal, lambda method, url, body: url.endswith("/stocks") and body["product_id"] == 2)
+    journal.close()
+
+    # La remise en stock et la suppression de la commande sont indépendantes : elles partent en parallèle
+    assert sorted(recover(monkeypatch, journal_path), key=str) == [
+        ("DELETE", "store-api/orders/7", None),
+        ("POST", "store-api/stocks", {"product_id": 1, "quantity": 2}),
+    ]
+
+def test_payment_created_before_a_stop_is_deleted(monkeypatch, journal_path):
+    # Paiement et sortie du stock en parallèle : le paiement est créé pendant que la sortie du stock s'arrête
+    monkeypatch.setattr(order_saga_controller, "ORDER_SAGA_DEFINITION", build_order_saga_definition(parallel_stock_and_payment=True))
+    journal = SagaJournal(path=journal_path)
+    run_until_stopped(monkeypatch, journal, lambda method, url, body: url.endswith("/stocks") and body["product_id"] == 2)
+    journal.close()
+
+    assert sorted(recover(monkeypatch, journal_path), key=str) == [
+        ("DELETE", "payments-api/payments/9", None),
+        ("DELETE", "store-api/orders/7", None),
+        ("POST", "store-api/stocks", {"product_id": 1, "quantity": 2}),
+    ]
+
+def test_order_not_journaled_is_not_deleted(monkeypatch, journal_path):
+    journal = SagaJournal(path=journal_path)
+    run_until_stopped(monkeypatch, journal, lambda method, url, body: url.endswith("/orders"))
+    journal.close()
+
+    assert recover(monkeypatch, journal_path) == []
+
+def test_only_sagas_of_dead_or_expired_owners_are_orphaned(journal_path):
+    journal = SagaJournal(path=journal_path, lease_seconds=60)
+    now = time.time()
+    try:
+        write_entry(journal, "autre-hote-vivant", "autre-hote:12", now - 3600, now - 600, heartbeat_at=now - 5)
+        write_entry(journal, "autre-hote-expire", "autre-hote:13", now - 3600, now - 600, heartbeat_at=now - 120)
+        write_entry(journal, "sans-proprietaire-recent", None, None, now - 5)
+        write_entry(journal, "sans-proprietaire-ancien", None, None, now - 120)
+        write_entry(journal, "processus-arrete", f"{journal.hostname}:{dead_pid()}", now - 5, now - 5, heartbeat_at=now - 5)
+        write_entry(journal, "autre-worker", f"{journal.hostname}:{os.getppid()}", now - 5, now - 5, heartbeat_at=now - 5)
+
+        orphaned_ids = {saga_id for saga_id, _, _ in journal.get_unfinished_sagas()}
+        assert orphaned_ids == {"autre-hote-expire", "sans-proprietaire-ancien", "processus-arrete"}
+    finally:
+        journal.close()
+
+def test_lease_is_renewed_by_the_writer_thread(journal_path):
+    journal = SagaJournal(path=journal_path, lease_seconds=1.5)
+    try:
+        first_heartbeat_at = read_heartbeat(journal)
+        time.sleep(0.7)
+        assert read_heartbeat(journal) > first_heartbeat_at
+    finally:
+        journal.close()
+
+def test_completed_sagas_are_compacted_by_the_writer_thread(monkeypatch, journal_path):
+    monkeypatch.setattr(config, "SAGA_JOURNAL_RETENTION_SECONDS", 0)
+    journal = SagaJournal(path=journal_path, compact_interval=0.2)
+    try:
+        journal.append("terminee", OrderSagaState.COMPLETED, {})
+        time.sleep(0.6)
+        connection = sqlite3.connect(journal_path)
+        try:
+            assert connection.execute("SELECT COUNT(*) FROM saga_log WHERE saga_id = 'terminee'").fetchone()[0] == 0
+        finally:
+            connection.close()
+    finally:
+        journal.close()
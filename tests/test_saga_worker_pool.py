@@ -0,0 +1,17 @@
+"""
+Tests: saga worker pool
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+from saga_worker_pool import SagaWorkerPool
+
+PAYLOAD = {"user_id": 1, "items": [{"product_id": 1, "quantity": 1}]}
+
+def test_saga_refused_by_a_shut_down_pool_is_not_counted():
+    pool = SagaWorkerPool(max_workers=1, max_queue_depth=1)
+    pool.shutdown()
+
+    assert pool.submit(PAYLOAD) is None
+    assert pool.get_stats()["pending"] == 0
+    assert pool.sagas == {}
+    assert pool.wait_until_idle(timeout=0)
@@ -0,0 +1,145 @@
+"""
+Tests: stock bulk updates and coalescer
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+import threading
+import time
+import requests
+import stock_bulk
+from fakes import FakeClient, FakeResponse
+from handlers.decrease_stock_handler import DecreaseStockHandler, DecreaseStockMixin
+from logger import Logger
+from order_saga_context import OrderSagaContext
+from order_saga_state import OrderSagaState
+from stock_bulk import BULK_NOT_SENT, BULK_OUTCOME_UNKNOWN, RETRY_ALONE, StockDeltaCoalescer, post_stock_bulk
+
+ITEMS = [{"product_id": 1, "quantity": 1}]
+logger = Logger.get_instance('test_stock_bulk')
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition jamais remplie"
+        time.sleep(0.005)
+
+def run_merged_batch(outcomes):
+    """ Send a first decrease, hold it until two others are queued behind it, and return the results of the two merged ones with the client """
+    gate = threading.Event()
+    client = FakeClient([FakeResponse(200)] + outcomes, gate=gate)
+    coalescer = StockDeltaCoalescer(client)
+    results = {}
+
+    def decrease(product_id):
+        results[product_id] = coalescer.decrease([{"product_id": product_id, "quantity": 1}], f"saga-{product_id}")
+
+    threads = [threading.Thread(target=decrease, args=(1,))]
+    threads[0].start()
+    wait_until(lambda: client.sent)
+    threads += [threading.Thread(target=decrease, args=(product_id,)) for product_id in (2, 3)]
+    for thread in threads[1:]:
+        thread.start()
+    wait_until(lambda: len(coalescer._pending) == 2)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    return results, client
+
+def test_non_json_server_error_is_resent_with_the_same_key():
+    client = FakeClient([FakeResponse(500, b"<html>Bad gateway</html>"), FakeResponse(200)])
+
+    assert post_stock_bulk(client, ITEMS, -1, "decrease", "saga-1", logger) is True
+    keys = client.get_idempotency_keys()
+    assert len(keys) == 2 and keys[0] == keys[1] is not None
+
+def test_unknown_outcome_without_idempotency_key_is_not_resent():
+    client = FakeClient([requests.ReadTimeout("lecture")])
+
+    assert post_stock_bulk(client, ITEMS, -1, "decrease", None, logger) == BULK_OUTCOME_UNKNOWN
+    assert client.get_idempotency_keys() == [None]
+
+def test_connection_never_established_is_not_sent():
+    client = FakeClient([requests.ConnectTimeout("connexion")])
+
+    assert post_stock_bulk(client, ITEMS, -1, "decrease", "saga-1", logger) == BULK_NOT_SENT
+    assert len(client.sent) == 1
+
+def test_read_timeout_is_resent_then_reported_unknown():
+    client = FakeClient([requests.ReadTimeout("lecture")])
+
+    assert post_stock_bulk(client, ITEMS, -1, "decrease", "saga-1", logger) == BULK_OUTCOME_UNKNOWN
+    assert len(set(client.get_idempotency_keys())) == 1 and len(client.sent) > 1
+
+def test_coalescer_resolves_a_non_json_server_error():
+    client = FakeClient([FakeResponse(500, b"<html>Bad gateway</html>"), FakeResponse(200)])
+
+    assert StockDeltaCoalescer(client).decrease(ITEMS, "saga-1") is True
+
+def test_coalescer_sender_survives_an_exception(monkeypatch):
+    coalescer = StockDeltaCoalescer(FakeClient([FakeResponse(200)]))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("erreur inattendue")
+    monkeypatch.setattr(stock_bulk, "post_stock_bulk", fail)
+    assert coalescer.decrease(ITEMS, "saga-1") == BULK_OUTCOME_UNKNOWN
+
+    monkeypatch.undo()
+    assert coalescer._sender.is_alive()
+    assert coalescer.decrease(ITEMS, "saga-2") is True
+
+def test_coalescer_withdraws_a_queued_decrease_at_the_deadline():
+    gate = threading.Event()
+    client = FakeClient([FakeResponse(200)], gate=gate)
+    coalescer = StockDeltaCoalescer(client)
+    first = threading.Thread(target=coalescer.decrease, args=(ITEMS, "saga-1"))
+    first.start()
+    wait_until(lambda: client.sent)
+
+    assert coalescer.decrease(ITEMS, "saga-2", time.monotonic() + 0.05) == BULK_NOT_SENT
+    gate.set()
+    first.join(5)
+    time.sleep(0.05)
+    assert len(client.sent) == 1
+
+def test_refused_merged_request_is_retried_alone():
+    results, _ = run_merged_batch([FakeResponse(409, b'{"error": "stock insuffisant"}')])
+
+    assert results == {1: True, 2: RETRY_ALONE, 3: RETRY_ALONE}
+
+def test_ambiguous_merged_request_is_resent_with_the_same_key():
+    results, client = run_merged_batch([requests.ReadTimeout("lecture"), FakeResponse(200)])
+
+    assert results == {1: True, 2: True, 3: True}
+    merged_keys = client.get_idempotency_keys()[1:]
+    assert len(merged_keys) == 2 and merged_keys[0] == merged_keys[1]
+
+def test_merged_request_not_sent_is_not_retried_alone():
+    results, _ = run_merged_batch([requests.ConnectTimeout("connexion")])
+
+    assert results == {1: True, 2: BULK_NOT_SENT, 3: BULK_NOT_SENT}
+
+def test_unknown_product_does_not_disable_the_bulk_endpoint(monkeypatch):
+    monkeypatch.setattr(DecreaseStockMixin, "bulk_unsupported_until", 0.0)
+    context = OrderSagaContext.from_payload({"user_id": 1, "items": [{"product_id": 1, "quantity": 1}, {"product_id": 99, "quantity": 1}]})
+    handler = DecreaseStockHandler(context, use_bulk=True)
+    handler.http_client = client = FakeClient([FakeResponse(404, b'{"error": "Produit 99 introuvable"}')])
+
+    assert handler.run() == OrderSagaState.CANCELLING_ORDER
+    assert len(client.sent) == 1 and DecreaseStockMixin.bulk_unsupported_until == 0.0
+
+def test_missing_bulk_endpoint_falls_back_to_per_item_updates():
+    assert post_stock_bulk(FakeClient([FakeResponse(405)]), ITEMS, -1, "decrease", "saga-1", logger) is None
+
+def test_coalescer_async_decrease_is_withdrawn_at_the_deadline():
+    gate = threading.Event()
+    client = FakeClient([FakeResponse(200)], gate=gate)
+    coalescer = StockDeltaCoalescer(client)
+    first = threading.Thread(target=coalescer.decrease, args=(ITEMS, "saga-1"))
+    first.start()
+    wait_until(lambda: client.sent)
+
+    assert asyncio.run(coalescer.decrease_async(ITEMS, "saga-2", time.monotonic() + 0.05)) == BULK_NOT_SENT
+    gate.set()
+    first.join(5)
+    assert asyncio.run(coalescer.decrease_async(ITEMS, "saga-3")) is True
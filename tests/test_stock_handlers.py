@@ -0,0 +1,111 @@
+"""
+Tests: stock handlers
+SPDX - License - Identifier: LGPL - 3.0 - or -later
+Auteurs : Gabriel C. Ullmann, Fabio Petrillo, 2025
+"""
+import asyncio
+import time
+import pytest
+import requests
+import config
+from fakes import FakeAsyncClient, FakeClient, FakeResponse
+from handlers.async_commit_stock_handler import AsyncCommitStockHandler
+from handlers.commit_stock_handler import CommitStockHandler
+from handlers.decrease_stock_handler import DecreaseStockHandler
+from order_saga_context import OrderSagaContext
+from order_saga_state import OrderSagaState
+from retry_policy import RetryingClient
+
+class LiveReservations:
+    """ Reservation index in which every reservation is still live """
+
+    def is_live(self, *args):
+        return True
+
+    def commit(self, *args):
+        pass
+
+def build_context(product_ids=(1,)):
+    context = OrderSagaContext.from_payload({"user_id": 1, "items": [{"product_id": product_id, "quantity": 1} for product_id in product_ids]})
+    context.saga_id = "saga-1"
+    return context
+
+def build_reserved_context():
+    context = build_context()
+    context.stock_reservation_id = "reservation-1"
+    context.stock_reservation_expires_at = time.time() + 60
+    return context
+
+def test_item_that_raises_is_counted_failed_without_losing_applied_ones():
+    context = build_context((1, 2, 3))
+    handler = DecreaseStockHandler(context, concurrency=3, use_bulk=False)
+
+    def update_item_stock(i, item, sign, operation, parent_context=None):
+        if item["product_id"] == 2:
+            raise ValueError("erreur inattendue")
+        return True
+    handler._update_item_stock = update_item_stock
+
+    assert handler.run() == OrderSagaState.INCREASING_STOCK
+    assert context.applied_stock_deltas == [{"product_id": 1, "quantity": 1}, {"product_id": 3, "quantity": 1}]
+
+def test_bulk_decrease_with_unknown_outcome_is_compensated_without_per_item_requests():
+    context = build_context((1, 2))
+    handler = DecreaseStockHandler(context, use_bulk=True)
+    handler.http_client = client = FakeClient([requests.ReadTimeout("lecture")])
+
+    assert handler.run() == OrderSagaState.INCREASING_STOCK
+    # Les articles ont peut-être été appliqués : ils seront remis en stock
+    assert context.applied_stock_deltas == context.items
+    assert all(url.endswith(config.STOCK_BULK_UPDATE_PATH) for _, url, _ in client.sent)
+
+@pytest.mark.parametrize("outcomes, expected_state, expected_requests", [
+    ([requests.ReadTimeout("lecture"), FakeResponse(502, b"<html>Bad gateway</html>"), FakeResponse(200)], OrderSagaState.COMPLETED, 3),
+    ([FakeResponse(500), FakeResponse(410)], OrderSagaState.CANCELLING_PAYMENT, 2),
+    ([FakeResponse(409, b"<html>Conflict</html>")], OrderSagaState.CANCELLING_PAYMENT, 1),
+])
+def test_commit_is_resent_until_a_definite_answer(outcomes, expected_state, expected_requests):
+    client = FakeClient(outcomes)
+    handler = CommitStockHandler(build_reserved_context(), LiveReservations())
+    handler.http_client = RetryingClient(client)
+    assert handler.run() == expected_state
+    assert len(client.sent) == expected_requests
+
+    async_client = FakeAsyncClient(outcomes)
+    async_handler = AsyncCommitStockHandler(build_reserved_context(), LiveReservations())
+    async_handler.http_client = RetryingClient(async_client)
+    assert asyncio.run(async_handler.run()) == expected_state
+    assert len(async_client.sent) == expected_requests
+
+def test_commit_without_answer_stops_after_the_reservation_expires(monkeypatch):
+    monkeypatch.setattr(config, "STOCK_COMMIT_RETRY_GRACE_SECONDS", 0.1)
+    context = build_reserved_context()
+    context.stock_reservation_expires_at = time.time() + 0.1
+    client = FakeClient([requests.ReadTimeout("lecture")])
+    handler = CommitStockHandler(context, LiveReservations())
+    handler.http_client = RetryingClient(client)
+
+    assert handler.run() == OrderSagaState.CANCELLING_PAYMENT
+    assert len(client.sent) > 1
+
+@pytest.mark.parametrize("error, expected_applied_ids", [
+    (requests.ReadTimeout("lecture"), [1, 2]),
+    (requests.ConnectTimeout("connexion"), [1]),
+])
+def test_item_sent_without_answer_is_compensated(error, expected_applied_ids):
+    context = build_context((1, 2))
+    handler = DecreaseStockHandler(context, concurrency=1, use_bulk=False)
+    handler.http_client = FakeClient([FakeResponse(200), error])
+
+    assert handler.run() == OrderSagaState.INCREASING_STOCK
+    # Un article dont la requête est partie a peut-être été sorti du stock : il est remis en stock
+    assert [item["product_id"] for item in context.applied_stock_deltas] == expected_applied_ids
+
+def test_item_with_unknown_outcome_is_kept_for_a_later_increase():
+    context = build_context((1, 2))
+    context.applied_stock_deltas = list(context.items)
+    handler = DecreaseStockHandler(context, concurrency=2, use_bulk=False)
+    handler.http_client = FakeClient([FakeResponse(200), FakeResponse(502, b"<html>Bad gateway</html>")])
+
+    handler.rollback()
+    assert len(context.applied_stock_deltas) == 1 and handler.rollback_error